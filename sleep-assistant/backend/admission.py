@@ -0,0 +1,208 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, Deque
+
+from fastapi import HTTPException
+
+from metrics import REGISTRY
+
+ADMISSION_WAIT = REGISTRY.histogram(
+    "sleep_assistant_admission_wait_seconds",
+    "Time requests waited for an upstream concurrency slot.",
+    ("upstream",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+ADMISSION_REJECTED = REGISTRY.counter(
+    "sleep_assistant_admission_rejected_total",
+    "Requests shed with 503 because an upstream was saturated, by reason (queue_full or timeout).",
+    ("upstream", "reason"),
+)
+
+
+class AdmissionRejected(HTTPException):
+    """Raised when an upstream is saturated; served as 503 with a Retry-After header."""
+
+    def __init__(self, upstream: str, reason: str, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail=f"The {upstream} service is busy, please retry in {retry_after}s",
+            headers={"Retry-After": str(retry_after)},
+        )
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """A held concurrency slot. Releasing is idempotent, and a dropped ticket releases itself."""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._acquired_at = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._controller._release(time.monotonic() - self._acquired_at)
+
+    def __del__(self):
+        # Safety net for streaming responses whose body iterator was never started
+        if not self.released:
+            self.release()
+
+
+class AdmissionController:
+    """
+    Bounded concurrency in front of one upstream.
+
+    At most max_concurrency calls run at once. Further callers wait in a
+    FIFO queue of at most max_queue entries for up to max_wait seconds;
+    anything beyond that is rejected straight away with AdmissionRejected,
+    whose Retry-After is estimated from the queue length and how long calls
+    have recently held their slot. Shedding early keeps latency predictable
+    for the requests that are admitted instead of letting every request slow
+    down until the upstream starts returning 429s.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._avg_hold = 1.0  # EWMA of seconds a slot is held
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    @property
+    def saturated(self) -> bool:
+        """Whether a new call would have to queue."""
+        return self.active >= self.max_concurrency
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free for a new caller."""
+        estimate = (self.queued + 1) * self._avg_hold / self.max_concurrency
+        return max(1, min(30, math.ceil(estimate)))
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        ADMISSION_REJECTED.inc(upstream=self.name, reason=reason)
+        raise AdmissionRejected(self.name, reason, self.retry_after())
+
+    async def acquire(self, max_wait: Optional[float] = None) -> AdmissionTicket:
+        """
+        Take a slot, waiting in the queue if necessary.
+
+        Raises:
+            AdmissionRejected: if the queue is full or no slot frees up within max_wait
+        """
+        start = time.monotonic()
+        if self.active < self.max_concurrency and not self.queued:
+            self.active += 1
+        else:
+            if self.queued >= self.max_queue:
+                self._reject("queue_full")
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                # Shield the waiter so a timeout can't race with a slot being handed over
+                await asyncio.wait_for(asyncio.shield(waiter), self.max_wait if max_wait is None else max_wait)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot arrived as we gave up; pass it on or keep it
+                    if isinstance(e, asyncio.CancelledError):
+                        self._release(None)
+                        raise
+                else:
+                    waiter.cancel()
+                    if isinstance(e, asyncio.CancelledError):
+                        raise
+                    self._reject("timeout")
+
+        self.admitted += 1
+        ADMISSION_WAIT.observe(time.monotonic() - start, upstream=self.name)
+        return AdmissionTicket(self)
+
+    def _release(self, held: Optional[float]):
+        if held is not None:
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+        # Hand the slot straight to the next live waiter, keeping FIFO order
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, max_wait: Optional[float] = None):
+        """Hold a slot for the duration of a block."""
+        ticket = await self.acquire(max_wait)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+            "avg_hold_seconds": round(self._avg_hold, 3),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+# Limits are for the whole server; with several worker processes each gets its share
+_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+def _per_worker(total: int) -> int:
+    return max(1, math.ceil(total / _WORKERS))
+
+def _controller(name: str, prefix: str, concurrency: int, queue: int, wait: float) -> AdmissionController:
+    return AdmissionController(
+        name,
+        max_concurrency=_per_worker(int(os.getenv(f"{prefix}_MAX_CONCURRENCY", str(concurrency)))),
+        max_queue=_per_worker(int(os.getenv(f"{prefix}_MAX_QUEUE", str(queue)))),
+        max_wait=float(os.getenv(f"{prefix}_MAX_WAIT_SECONDS", str(wait))),
+    )
+
+
+# One controller per upstream, sized below the connection pools in http_client
+_controllers: Dict[str, AdmissionController] = {
+    "unreal": _controller("unreal", "UNREAL", 16, 64, 5.0),
+    "openai": _controller("openai", "OPENAI", 16, 64, 10.0),
+    "assemblyai": _controller("assemblyai", "ASSEMBLYAI", 4, 16, 5.0),
+}
+
+def get_admission(name: str) -> AdmissionController:
+    """Get the admission controller for an upstream ("unreal", "openai" or "assemblyai")."""
+    return _controllers[name]
+
+def admission_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: controller.stats() for name, controller in _controllers.items()}
+
+
+def _admission_samples(field: str):
+    for name, controller in _controllers.items():
+        yield {"upstream": name}, getattr(controller, field)
+
+REGISTRY.collector("sleep_assistant_admission_active",
+                   "Upstream calls currently holding a concurrency slot.", "gauge",
+                   lambda: _admission_samples("active"))
+REGISTRY.collector("sleep_assistant_admission_queue_depth",
+                   "Requests waiting for an upstream concurrency slot.", "gauge",
+                   lambda: _admission_samples("queued"))
@@ -0,0 +1,128 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any
+
+from audio_store import TieredAudioStore
+from metrics import AUDIO_BYTES
+
+
+class TTSAudioCache:
+    """
+    Content-addressed cache for synthesized TTS clips.
+
+    Clips are keyed by a hash of the normalized Unreal Speech payload, so the
+    same (text, voice, bitrate, pitch, speed) always maps to the same audio_id.
+    The index is an LRU bounded by the total bytes this node keeps locally;
+    the least recently used clips are evicted from the local tiers once the
+    budget is exceeded. Clips pinned in the store don't count against the
+    budget and are never evicted.
+    """
+
+    def __init__(self, store: TieredAudioStore, max_bytes: int):
+        self.store = store
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # audio_id -> size in bytes
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Collapse whitespace so cosmetic differences share a cache entry."""
+        return " ".join(text.split())
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """Hash a normalized Unreal Speech payload into a stable audio_id."""
+        normalized = {
+            "text": TTSAudioCache.normalize_text(payload["Text"]),
+            "voice": payload["VoiceId"],
+            "bitrate": str(payload["Bitrate"]).lower(),
+            "pitch": round(float(payload["Pitch"]), 3),
+            "speed": round(float(payload["Speed"]), 3),
+        }
+        encoded = json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()[:32]
+
+    def contains(self, audio_id: str) -> bool:
+        with self._lock:
+            return audio_id in self._entries
+
+    def lookup(self, audio_id: str, record_miss: bool = True) -> bool:
+        """
+        Check whether a clip is cached and mark it as recently used.
+
+        Clips stored by a previous process (or, with a shared object store,
+        by another instance) are adopted into the index. Entries whose clip
+        has disappeared are dropped and counted as a miss, unless the caller
+        will fall through to a counted lookup anyway.
+        """
+        with self._lock:
+            if audio_id in self._entries and self.store.exists(audio_id):
+                self._entries.move_to_end(audio_id)
+                self.store.touch(audio_id)
+                self.hits += 1
+                return True
+
+        size = self.store.size(audio_id)
+        with self._lock:
+            if size is not None:
+                self._add_locked(audio_id, size)
+                self.hits += 1
+                return True
+
+            if audio_id in self._entries:
+                self.total_bytes -= self._entries.pop(audio_id)
+            if record_miss:
+                self.misses += 1
+            return False
+
+    def forget(self, audio_id: str):
+        """Drop an entry whose clip was removed by the store (for example on expiry)."""
+        with self._lock:
+            if audio_id in self._entries:
+                self.total_bytes -= self._entries.pop(audio_id)
+
+    def put(self, audio_id: str, audio_bytes: bytes) -> None:
+        """Store a clip under its content address and evict if over budget."""
+        self.store.put(audio_id, audio_bytes)
+        with self._lock:
+            self._add_locked(audio_id, len(audio_bytes))
+
+    def _add_locked(self, audio_id: str, size: int):
+        if audio_id in self._entries:
+            self.total_bytes -= self._entries.pop(audio_id)
+        if self.store.is_pinned(audio_id):
+            return
+        self._entries[audio_id] = size
+        self.total_bytes += size
+        self._evict_locked()
+
+    def _evict_locked(self):
+        # Always keep the most recent entry, even if it alone exceeds the budget
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            audio_id, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                if self.store.evict_local(audio_id):
+                    AUDIO_BYTES.inc(size, direction="cleaned")
+            except Exception as e:
+                print(f"❌ Failed to evict cached audio {audio_id}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
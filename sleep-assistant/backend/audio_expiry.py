@@ -0,0 +1,249 @@
+import heapq
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple, Iterable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from shared_state import SharedState
+
+
+class AudioExpiryIndex:
+    """
+    In-process index of when each stored clip expires.
+
+    A min-heap of (expires_at, audio_id) lets cleanup pop exactly the clips
+    that are due instead of scanning the disk. Re-touching a clip pushes a
+    new heap entry and leaves the old one to be skipped lazily. The index
+    also tracks total bytes, so when the disk cap is exceeded the clips
+    closest to expiry are removed first.
+    """
+
+    def __init__(self, default_ttl: float, max_bytes: int):
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self._heap: List[Tuple[float, str]] = []
+        self._entries: Dict[str, Tuple[float, int]] = {}  # audio_id -> (expires_at, size)
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.expired = 0
+        self.evicted_for_space = 0
+
+    def _set_locked(self, audio_id: str, expires_at: float, size: int):
+        previous = self._entries.get(audio_id)
+        if previous is not None:
+            self.total_bytes -= previous[1]
+        self._entries[audio_id] = (expires_at, size)
+        self.total_bytes += size
+        heapq.heappush(self._heap, (expires_at, audio_id))
+
+    def track(self, audio_id: str, size: int, ttl: Optional[float] = None, created_at: Optional[float] = None):
+        """Start (or restart) the expiry clock for a stored clip."""
+        created_at = time.time() if created_at is None else created_at
+        with self._lock:
+            self._set_locked(audio_id, created_at + (self.default_ttl if ttl is None else ttl), size)
+
+    def touch(self, audio_id: str, ttl: Optional[float] = None):
+        """Push back the expiry of a clip that was just used."""
+        with self._lock:
+            entry = self._entries.get(audio_id)
+            if entry is None:
+                return
+            expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+            if expires_at > entry[0]:
+                self._set_locked(audio_id, expires_at, entry[1])
+
+    def remove(self, audio_id: str):
+        """Stop tracking a clip that was deleted by other means."""
+        with self._lock:
+            entry = self._entries.pop(audio_id, None)
+            if entry is not None:
+                self.total_bytes -= entry[1]
+
+    def rebuild(self, entries: Iterable[Tuple[str, float, int]]) -> int:
+        """Seed the index from (audio_id, created_at, size) of clips already on disk."""
+        count = 0
+        for audio_id, created_at, size in entries:
+            self.track(audio_id, size, created_at=created_at)
+            count += 1
+        return count
+
+    def _pop_valid_locked(self) -> Optional[Tuple[float, str]]:
+        while self._heap:
+            expires_at, audio_id = heapq.heappop(self._heap)
+            entry = self._entries.get(audio_id)
+            if entry is not None and entry[0] == expires_at:
+                return expires_at, audio_id
+        return None
+
+    def _peek_valid_locked(self) -> Optional[float]:
+        while self._heap:
+            expires_at, audio_id = self._heap[0]
+            entry = self._entries.get(audio_id)
+            if entry is not None and entry[0] == expires_at:
+                return expires_at
+            heapq.heappop(self._heap)
+        return None
+
+    def due(self, limit: int, now: Optional[float] = None) -> List[str]:
+        """
+        Pop up to limit clips that have expired or must go to get under the disk cap.
+
+        Returned clips are no longer tracked; the caller deletes them.
+        """
+        now = time.time() if now is None else now
+        due: List[str] = []
+        with self._lock:
+            while len(due) < limit:
+                next_expiry = self._peek_valid_locked()
+                if next_expiry is None:
+                    break
+                over_cap = self.total_bytes > self.max_bytes
+                if next_expiry > now and not over_cap:
+                    break
+                _, audio_id = self._pop_valid_locked()
+                _, size = self._entries.pop(audio_id)
+                self.total_bytes -= size
+                if next_expiry <= now:
+                    self.expired += 1
+                else:
+                    self.evicted_for_space += 1
+                due.append(audio_id)
+        return due
+
+    def seconds_until_next(self) -> Optional[float]:
+        """Seconds until the next clip expires, or None if nothing is tracked."""
+        with self._lock:
+            next_expiry = self._peek_valid_locked()
+        return None if next_expiry is None else max(0.0, next_expiry - time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tracked": len(self._entries),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "default_ttl_seconds": self.default_ttl,
+                "expired": self.expired,
+                "evicted_for_space": self.evicted_for_space,
+            }
+
+
+class SharedAudioExpiryIndex:
+    """
+    Expiry index kept in the shared state database instead of process memory.
+
+    Same interface as AudioExpiryIndex, for when several workers share one
+    audio directory: a clip touched by any worker stays alive, the disk cap
+    counts every worker's clips, and due() claims clips in a transaction so
+    two workers never clean up the same one.
+
+    Touches happen on every cache hit, so they are only noted in memory
+    and written in one transaction at the start of the next due(), off
+    the event loop, instead of each taking the write lock.
+    """
+
+    def __init__(self, state: "SharedState", default_ttl: float, max_bytes: int):
+        self.state = state
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.expired = 0
+        self.evicted_for_space = 0
+        self._touched: Dict[str, float] = {}  # audio_id -> new expires_at, not yet written
+        self._touch_lock = threading.Lock()
+
+    @property
+    def total_bytes(self) -> int:
+        return self.state.connection().execute("SELECT COALESCE(SUM(size), 0) FROM audio_expiry").fetchone()[0]
+
+    def track(self, audio_id: str, size: int, ttl: Optional[float] = None, created_at: Optional[float] = None):
+        """Start (or restart) the expiry clock for a stored clip."""
+        created_at = time.time() if created_at is None else created_at
+        expires_at = created_at + (self.default_ttl if ttl is None else ttl)
+        self.state.connection().execute(
+            "INSERT OR REPLACE INTO audio_expiry (audio_id, expires_at, size) VALUES (?, ?, ?)",
+            (audio_id, expires_at, size)
+        )
+
+    def touch(self, audio_id: str, ttl: Optional[float] = None):
+        """Push back the expiry of a clip that was just used; written by the next flush()."""
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        with self._touch_lock:
+            if expires_at > self._touched.get(audio_id, 0.0):
+                self._touched[audio_id] = expires_at
+
+    def flush(self) -> int:
+        """Write pending touches in one transaction. Returns how many were written."""
+        with self._touch_lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return 0
+        with self.state.transaction() as conn:
+            conn.executemany(
+                "UPDATE audio_expiry SET expires_at = ? WHERE audio_id = ? AND expires_at < ?",
+                [(expires_at, audio_id, expires_at) for audio_id, expires_at in touched.items()]
+            )
+        return len(touched)
+
+    def remove(self, audio_id: str):
+        """Stop tracking a clip that was deleted by other means."""
+        with self._touch_lock:
+            self._touched.pop(audio_id, None)
+        self.state.connection().execute("DELETE FROM audio_expiry WHERE audio_id = ?", (audio_id,))
+
+    def rebuild(self, entries: Iterable[Tuple[str, float, int]]) -> int:
+        """
+        Seed the index from clips already on disk.
+
+        Clips another worker already tracks keep their (possibly touched) expiry.
+        """
+        rows = [(audio_id, created_at + self.default_ttl, size) for audio_id, created_at, size in entries]
+        with self.state.transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO audio_expiry (audio_id, expires_at, size) VALUES (?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def due(self, limit: int, now: Optional[float] = None) -> List[str]:
+        """
+        Claim up to limit clips that have expired or must go to get under the disk cap.
+
+        Returned clips are no longer tracked; the caller deletes them.
+        """
+        now = time.time() if now is None else now
+        due: List[str] = []
+        self.flush()
+        with self.state.transaction() as conn:
+            total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM audio_expiry").fetchone()[0]
+            rows = conn.execute(
+                "SELECT audio_id, expires_at, size FROM audio_expiry ORDER BY expires_at LIMIT ?", (limit,)
+            ).fetchall()
+            for audio_id, expires_at, size in rows:
+                if expires_at > now and total_bytes <= self.max_bytes:
+                    break
+                if expires_at <= now:
+                    self.expired += 1
+                else:
+                    self.evicted_for_space += 1
+                total_bytes -= size
+                due.append(audio_id)
+            conn.executemany("DELETE FROM audio_expiry WHERE audio_id = ?", [(audio_id,) for audio_id in due])
+        return due
+
+    def seconds_until_next(self) -> Optional[float]:
+        """Seconds until the next clip expires, or None if nothing is tracked."""
+        next_expiry = self.state.connection().execute("SELECT MIN(expires_at) FROM audio_expiry").fetchone()[0]
+        return None if next_expiry is None else max(0.0, next_expiry - time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        tracked, total_bytes = self.state.connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM audio_expiry"
+        ).fetchone()
+        return {
+            "tracked": tracked,
+            "total_bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "default_ttl_seconds": self.default_ttl,
+            "expired": self.expired,
+            "evicted_for_space": self.evicted_for_space,
+            "shared": True,
+        }
@@ -0,0 +1,82 @@
+import os
+from typing import Optional, Mapping, Tuple
+
+from metrics import REGISTRY
+
+# Unreal Speech bitrates by tier. Speech stays intelligible well below music
+# bitrates, so "high" is only worth its bytes on fast desktop connections.
+QUALITY_TIERS = {
+    "low": "32k",
+    "standard": "64k",
+    "high": "192k",
+}
+
+# Client hints that pick a tier when the request doesn't name one
+CLIENT_HINTS = ("Save-Data", "ECT", "Sec-CH-UA-Mobile")
+SLOW_CONNECTIONS = ("slow-2g", "2g", "3g")
+
+TTS_QUALITY_SELECTED = REGISTRY.counter(
+    "sleep_assistant_tts_quality_total",
+    "TTS requests by audio quality tier and what chose it (request, save_data, ect, mobile or default).",
+    ("quality", "source"),
+)
+
+
+def parse_quality(value: Optional[str]) -> Optional[str]:
+    """Map a tier name ("low") or bitrate ("32k") onto a tier name; None if it matches neither."""
+    if not value:
+        return None
+    candidate = value.strip().lower()
+    if candidate in QUALITY_TIERS:
+        return candidate
+    for tier, bitrate in QUALITY_TIERS.items():
+        if candidate == bitrate:
+            return tier
+    return None
+
+
+def _configured(name: str, default: str) -> str:
+    return parse_quality(os.getenv(name)) or default
+
+
+DEFAULT_QUALITY = _configured("TTS_DEFAULT_QUALITY", "standard")
+CONSTRAINED_QUALITY = _configured("TTS_MOBILE_QUALITY", "low")
+
+
+def negotiate_quality(requested: Optional[str], headers: Mapping[str, str]) -> Tuple[str, str]:
+    """
+    Choose the quality tier for a TTS request.
+
+    An explicit tier in the request wins. Otherwise Save-Data, a slow
+    effective connection type (ECT) or a mobile browser (Sec-CH-UA-Mobile)
+    selects TTS_MOBILE_QUALITY, and anything else gets TTS_DEFAULT_QUALITY.
+
+    Args:
+        requested: Tier name or bitrate from the request, if any
+        headers: Request headers carrying the client hints
+
+    Returns:
+        Tuple of (tier, source), where source says what picked the tier
+
+    Raises:
+        ValueError: if requested is set but is not a known tier or bitrate
+    """
+    if requested:
+        tier = parse_quality(requested)
+        if tier is None:
+            raise ValueError(f"Unknown quality {requested!r}, expected one of {', '.join(QUALITY_TIERS)}")
+        source = "request"
+    elif headers.get("save-data", "").strip().lower() == "on":
+        tier, source = CONSTRAINED_QUALITY, "save_data"
+    elif headers.get("ect", "").strip().lower() in SLOW_CONNECTIONS:
+        tier, source = CONSTRAINED_QUALITY, "ect"
+    elif headers.get("sec-ch-ua-mobile", "").strip() == "?1":
+        tier, source = CONSTRAINED_QUALITY, "mobile"
+    else:
+        tier, source = DEFAULT_QUALITY, "default"
+    return tier, source
+
+
+def bitrate_for(quality: Optional[str]) -> str:
+    """Unreal Speech Bitrate for a tier, using the default tier if none is given."""
+    return QUALITY_TIERS[parse_quality(quality) or DEFAULT_QUALITY]
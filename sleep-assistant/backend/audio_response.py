@@ -0,0 +1,131 @@
+import asyncio
+import os
+import re
+from typing import Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+from metrics import AUDIO_BYTES
+
+# audio_ids produced by TTSAudioCache.make_key; the same id always names the same clip
+CONTENT_ADDRESSED_ID = re.compile(r"^[0-9a-f]{32}$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested byte range lies outside the clip, or asks for several ranges."""
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches the clip's entity tag (weak comparison)."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single byte range.
+
+    Returns:
+        Inclusive (start, end) offsets, or None if the whole clip should be sent
+        (no header or a malformed header)
+
+    Raises:
+        RangeNotSatisfiable: if the range starts past the end of the clip, or
+            several ranges are asked for (multipart responses aren't supported)
+    """
+    if not header:
+        return None
+    header = header.strip()
+    if header.startswith("bytes=") and "," in header:
+        raise RangeNotSatisfiable()
+    match = _RANGE.match(header)
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def _read_slice(path: str, start: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(length)
+
+
+async def audio_response(request: Request, audio_id: str, etag: str,
+                         data: Optional[bytes] = None, path: Optional[str] = None) -> Response:
+    """
+    Build the response for a stored clip from memory (data) or disk (path).
+
+    Honours If-None-Match with 304 and single byte ranges (optionally guarded
+    by If-Range) with 206. Content-addressed clips are marked immutable so
+    browsers and CDNs can keep them indefinitely.
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if CONTENT_ADDRESSED_ID.match(audio_id) else REVALIDATE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    size = len(data) if data is not None else os.path.getsize(path)
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    headers["Content-Disposition"] = f'attachment; filename="tts_{audio_id}.mp3"'
+
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        if data is not None:
+            chunk = data[start:end + 1]
+        else:
+            chunk = await asyncio.to_thread(_read_slice, path, start, length)
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        AUDIO_BYTES.inc(len(chunk), direction="served")
+        return Response(content=chunk, status_code=206, media_type="audio/mpeg", headers=headers)
+
+    AUDIO_BYTES.inc(size, direction="served")
+    if data is None and request.headers.get("range") is not None:
+        # FileResponse would act on the Range header this response has chosen to ignore
+        data = await asyncio.to_thread(_read_slice, path, 0, size)
+    if data is not None:
+        return Response(content=data, media_type="audio/mpeg", headers=headers)
+    return FileResponse(path, media_type="audio/mpeg", headers=headers)
@@ -0,0 +1,454 @@
+import os
+import hashlib
+import tempfile
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Iterator, Tuple, Callable, List, Set, Union
+
+from audio_expiry import AudioExpiryIndex, SharedAudioExpiryIndex
+from mp3_utils import mp3_info
+from shared_state import SharedState, get_shared_state
+
+
+class AudioStore(ABC):
+    """Storage backend for generated audio clips, addressed by audio_id."""
+
+    @abstractmethod
+    def put(self, audio_id: str, data: bytes) -> None:
+        """Store a clip, replacing any existing clip with the same id."""
+
+    @abstractmethod
+    def get(self, audio_id: str) -> Optional[bytes]:
+        """Return the clip's bytes, or None if it is not stored here."""
+
+    @abstractmethod
+    def exists(self, audio_id: str) -> bool:
+        """Whether the clip is stored here."""
+
+    @abstractmethod
+    def delete(self, audio_id: str) -> bool:
+        """Remove the clip. Returns True if it existed."""
+
+    def local_path(self, audio_id: str) -> Optional[str]:
+        """Path of the clip on the local filesystem, if this backend has one."""
+        return None
+
+
+class MemoryAudioStore(AudioStore):
+    """
+    RAM tier bounded by total bytes.
+
+    Holds clips that are likely to be played (or replayed) soon. The least
+    recently used clips are dropped once max_bytes is exceeded, and clips
+    larger than max_item_bytes are never held in memory.
+    """
+
+    def __init__(self, max_bytes: int, max_item_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._clips: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+
+    def put(self, audio_id: str, data: bytes) -> None:
+        if len(data) > self.max_item_bytes:
+            return
+        with self._lock:
+            previous = self._clips.pop(audio_id, None)
+            if previous is not None:
+                self.total_bytes -= len(previous)
+            self._clips[audio_id] = data
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and self._clips:
+                _, evicted = self._clips.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def get(self, audio_id: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._clips.get(audio_id)
+            if data is not None:
+                self._clips.move_to_end(audio_id)
+            return data
+
+    def exists(self, audio_id: str) -> bool:
+        with self._lock:
+            return audio_id in self._clips
+
+    def delete(self, audio_id: str) -> bool:
+        with self._lock:
+            data = self._clips.pop(audio_id, None)
+            if data is None:
+                return False
+            self.total_bytes -= len(data)
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"clips": len(self._clips), "total_bytes": self.total_bytes, "max_bytes": self.max_bytes}
+
+
+class LocalDiskAudioStore(AudioStore):
+    """Clips stored as tts_<audio_id>.mp3 files in a local directory."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, audio_id: str) -> str:
+        return os.path.join(self.directory, f"tts_{audio_id}.mp3")
+
+    def put(self, audio_id: str, data: bytes) -> None:
+        path = self.path_for(audio_id)
+        # Write to a unique scratch file first so readers never see a partial clip
+        tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, audio_id: str) -> Optional[bytes]:
+        try:
+            with open(self.path_for(audio_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, audio_id: str) -> bool:
+        return os.path.exists(self.path_for(audio_id))
+
+    def delete(self, audio_id: str) -> bool:
+        try:
+            os.remove(self.path_for(audio_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def local_path(self, audio_id: str) -> Optional[str]:
+        path = self.path_for(audio_id)
+        return path if os.path.exists(path) else None
+
+    def size(self, audio_id: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self.path_for(audio_id))
+        except FileNotFoundError:
+            return None
+
+    def iter_entries(self) -> Iterator[Tuple[str, float, int]]:
+        """Yield (audio_id, created_at, size) for every clip in the directory."""
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                name = entry.name
+                if not (name.startswith("tts_") and name.endswith(".mp3")):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield name[len("tts_"):-len(".mp3")], stat.st_ctime, stat.st_size
+
+
+class ObjectDirectoryAudioStore(AudioStore):
+    """
+    Local directory standing in for an object storage bucket.
+
+    Clips are written once under audio/<prefix>/<audio_id>.mp3 and only ever
+    read back as whole objects, the same way a bucket would be used, so the
+    directory can be a shared mount today and swapped for a real object
+    store without touching callers.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(os.path.join(self.root, "audio"), exist_ok=True)
+
+    def _key(self, audio_id: str) -> str:
+        return os.path.join(self.root, "audio", audio_id[:2], f"{audio_id}.mp3")
+
+    def put(self, audio_id: str, data: bytes) -> None:
+        key = self._key(audio_id)
+        os.makedirs(os.path.dirname(key), exist_ok=True)
+        tmp_key = f"{key}.{uuid.uuid4().hex}.part"
+        with open(tmp_key, "wb") as f:
+            f.write(data)
+        os.replace(tmp_key, key)
+
+    def get(self, audio_id: str) -> Optional[bytes]:
+        try:
+            with open(self._key(audio_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, audio_id: str) -> bool:
+        return os.path.exists(self._key(audio_id))
+
+    def delete(self, audio_id: str) -> bool:
+        try:
+            os.remove(self._key(audio_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+class TieredAudioStore(AudioStore):
+    """
+    Memory, local disk and optional object storage tiers behind one interface.
+
+    Writes go through to every tier. Reads are served from the fastest tier
+    that has the clip, and clips found in a slower tier are promoted so the
+    next read is faster. Local copies are tracked in an expiry index and
+    removed by expire_due once their TTL passes or the disk cap is hit;
+    pinned clips are left out of the index and kept until unpinned.
+    With shared state, clip metadata is also published there so other
+    workers don't have to re-read and re-describe the clip, and pins are
+    recorded there so no worker tracks or cleans up a clip another pinned.
+    """
+
+    def __init__(self, memory: MemoryAudioStore, disk: LocalDiskAudioStore,
+                 objects: Optional[ObjectDirectoryAudioStore] = None,
+                 expiry: Optional[Union[AudioExpiryIndex, SharedAudioExpiryIndex]] = None,
+                 shared: Optional[SharedState] = None):
+        self.memory = memory
+        self.disk = disk
+        self.objects = objects
+        self.expiry = expiry or AudioExpiryIndex(default_ttl=3600, max_bytes=512 * 1024 * 1024)
+        self.shared = shared
+        self._expiry_listeners: List[Callable[[str], None]] = []
+        self._metadata: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._metadata_lock = threading.Lock()
+        self.max_metadata = 8192
+        self._pinned: Set[str] = set()
+
+    @staticmethod
+    def content_etag(data: bytes) -> str:
+        """Strong HTTP entity tag derived from the clip's bytes."""
+        return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+    @classmethod
+    def describe(cls, data: bytes) -> Dict[str, Any]:
+        """ETag plus duration, sample rate and bitrate read from the MP3 frame headers."""
+        return {"etag": cls.content_etag(data), **(mp3_info(data) or {})}
+
+    def _remember_metadata(self, audio_id: str, metadata: Dict[str, Any], publish: bool = True):
+        if publish and self.shared is not None:
+            self.shared.set("audio_metadata", audio_id, metadata)
+        with self._metadata_lock:
+            self._metadata[audio_id] = metadata
+            self._metadata.move_to_end(audio_id)
+            while len(self._metadata) > self.max_metadata:
+                self._metadata.popitem(last=False)
+
+    def _forget_metadata(self, audio_id: str):
+        if self.shared is not None:
+            self.shared.delete("audio_metadata", audio_id)
+        with self._metadata_lock:
+            self._metadata.pop(audio_id, None)
+
+    def metadata(self, audio_id: str) -> Optional[Dict[str, Any]]:
+        """
+        ETag and audio properties of a stored clip, or None if no tier has it.
+
+        Computed from the bytes on put; clips written by an earlier process
+        are read and described once on first request.
+        """
+        with self._metadata_lock:
+            metadata = self._metadata.get(audio_id)
+            if metadata is not None:
+                self._metadata.move_to_end(audio_id)
+                return metadata
+        if self.shared is not None:
+            metadata = self.shared.get("audio_metadata", audio_id)
+            if metadata is not None:
+                self._remember_metadata(audio_id, metadata, publish=False)
+                return metadata
+        data = self.get(audio_id)
+        if data is None:
+            return None
+        metadata = self.describe(data)
+        self._remember_metadata(audio_id, metadata)
+        return metadata
+
+    def etag(self, audio_id: str) -> Optional[str]:
+        """Entity tag of a stored clip, or None if no tier has it."""
+        metadata = self.metadata(audio_id)
+        return metadata["etag"] if metadata is not None else None
+
+    def put(self, audio_id: str, data: bytes, ttl: Optional[float] = None) -> None:
+        self._remember_metadata(audio_id, self.describe(data))
+        self.memory.put(audio_id, data)
+        self.disk.put(audio_id, data)
+        if not self.is_pinned(audio_id):
+            self.expiry.track(audio_id, len(data), ttl=ttl)
+        if self.objects is not None:
+            self.objects.put(audio_id, data)
+
+    def get(self, audio_id: str) -> Optional[bytes]:
+        data, path = self.locate(audio_id)
+        if data is not None or path is None:
+            return data
+        return self.disk.get(audio_id)
+
+    def locate(self, audio_id: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        Find a clip for serving.
+
+        Returns:
+            (bytes, None) if the clip is hot in memory, (None, path) if it is
+            on local disk, or (None, None) if no tier has it
+        """
+        data = self.memory.get(audio_id)
+        if data is not None:
+            return data, None
+
+        path = self.disk.local_path(audio_id)
+        if path is not None:
+            return None, path
+
+        if self.objects is not None:
+            data = self.objects.get(audio_id)
+            if data is not None:
+                self.disk.put(audio_id, data)
+                if not self.is_pinned(audio_id):
+                    self.expiry.track(audio_id, len(data))
+                self.memory.put(audio_id, data)
+                return data, None
+        return None, None
+
+    def exists(self, audio_id: str) -> bool:
+        return (
+            self.memory.exists(audio_id)
+            or self.disk.exists(audio_id)
+            or (self.objects is not None and self.objects.exists(audio_id))
+        )
+
+    def size(self, audio_id: str) -> Optional[int]:
+        """Size of the clip in the local tiers, promoting it from object storage if needed."""
+        size = self.disk.size(audio_id)
+        if size is None and self.objects is not None and self.locate(audio_id) != (None, None):
+            size = self.disk.size(audio_id)
+        return size
+
+    def touch(self, audio_id: str):
+        """Extend the local TTL of a clip that was just used."""
+        self.expiry.touch(audio_id)
+
+    def pin(self, audio_id: str) -> bool:
+        """
+        Keep a stored clip on local disk regardless of TTL, disk cap or cache eviction.
+
+        Returns:
+            False if no tier has the clip
+        """
+        if self.size(audio_id) is None:
+            return False
+        self._pinned.add(audio_id)
+        if self.shared is not None:
+            self.shared.set("audio_pins", audio_id, True)
+        self.expiry.remove(audio_id)
+        return True
+
+    def unpin(self, audio_id: str):
+        """Let a pinned clip expire normally again."""
+        if self.is_pinned(audio_id):
+            self._pinned.discard(audio_id)
+            if self.shared is not None:
+                self.shared.delete("audio_pins", audio_id)
+            size = self.disk.size(audio_id)
+            if size is not None:
+                self.expiry.track(audio_id, size)
+
+    def is_pinned(self, audio_id: str) -> bool:
+        """Whether this or any other worker sharing state pinned the clip."""
+        if audio_id in self._pinned:
+            return True
+        return self.shared is not None and self.shared.get("audio_pins", audio_id) is not None
+
+    def evict_local(self, audio_id: str) -> bool:
+        """Drop a clip from this node's memory and disk, keeping the shared copy. Pinned clips stay."""
+        if self.is_pinned(audio_id):
+            return False
+        self.expiry.remove(audio_id)
+        self._forget_metadata(audio_id)
+        in_memory = self.memory.delete(audio_id)
+        on_disk = self.disk.delete(audio_id)
+        return in_memory or on_disk
+
+    def add_expiry_listener(self, listener: Callable[[str], None]):
+        """Register a callback invoked with the audio_id of every clip removed by expire_due."""
+        self._expiry_listeners.append(listener)
+
+    def expire_due(self, limit: int) -> Tuple[int, int]:
+        """
+        Remove up to limit local clips that are past their TTL or over the disk cap.
+
+        Returns:
+            Tuple of (clips removed, bytes freed)
+        """
+        removed = 0
+        freed = 0
+        for audio_id in self.expiry.due(limit):
+            # Tracked by a worker before another one pinned it
+            if self.is_pinned(audio_id):
+                continue
+            size = self.disk.size(audio_id) or 0
+            self._forget_metadata(audio_id)
+            self.memory.delete(audio_id)
+            if self.disk.delete(audio_id):
+                removed += 1
+                freed += size
+            for listener in self._expiry_listeners:
+                listener(audio_id)
+        return removed, freed
+
+    def delete(self, audio_id: str) -> bool:
+        if self.is_pinned(audio_id):
+            return False
+        deleted = self.evict_local(audio_id)
+        if self.objects is not None:
+            deleted = self.objects.delete(audio_id) or deleted
+        return deleted
+
+    def local_path(self, audio_id: str) -> Optional[str]:
+        return self.disk.local_path(audio_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.stats(),
+            "disk_directory": self.disk.directory,
+            "expiry": self.expiry.stats(),
+            "pinned": self.shared.count("audio_pins") if self.shared is not None else len(self._pinned),
+            "object_store": self.objects.root if self.objects is not None else None,
+        }
+
+
+# Global audio store instance
+_audio_store = None
+
+def get_audio_store() -> TieredAudioStore:
+    """Get the global audio store, configured from the environment on first use."""
+    global _audio_store
+    if _audio_store is None:
+        memory = MemoryAudioStore(
+            max_bytes=int(os.getenv("AUDIO_MEMORY_MAX_BYTES", str(64 * 1024 * 1024))),
+            max_item_bytes=int(os.getenv("AUDIO_MEMORY_MAX_ITEM_BYTES", str(8 * 1024 * 1024)))
+        )
+        disk = LocalDiskAudioStore(
+            os.getenv("AUDIO_DISK_DIR", os.path.join(tempfile.gettempdir(), "sleep-assistant-audio"))
+        )
+        object_dir = os.getenv("AUDIO_OBJECT_STORE_DIR")
+        objects = ObjectDirectoryAudioStore(object_dir) if object_dir else None
+        default_ttl = float(os.getenv("AUDIO_TTL_SECONDS", "3600"))
+        max_bytes = int(os.getenv("AUDIO_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+        # Workers sharing the audio directory must also share its expiry index
+        shared = get_shared_state()
+        if shared is not None:
+            expiry = SharedAudioExpiryIndex(shared, default_ttl=default_ttl, max_bytes=max_bytes)
+        else:
+            expiry = AudioExpiryIndex(default_ttl=default_ttl, max_bytes=max_bytes)
+        # One scan of our own directory at startup; after that cleanup never lists the disk
+        restored = expiry.rebuild(disk.iter_entries())
+        if restored:
+            print(f"♻️ Restored expiry index for {restored} audio files")
+        _audio_store = TieredAudioStore(memory, disk, objects, expiry, shared)
+    return _audio_store
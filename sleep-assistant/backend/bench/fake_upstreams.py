@@ -0,0 +1,250 @@
+"""
+Local stand-ins for Unreal Speech, OpenAI and AssemblyAI.
+
+Serves the few upstream endpoints the backend uses, with configurable
+latency distributions, streaming pace and error rates, so load tests cost
+nothing and are repeatable. Point the backend at it with:
+
+    UNREAL_SPEECH_BASE_URL=http://127.0.0.1:9100
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1
+    ASSEMBLYAI_STREAMING_BASE_URL=http://127.0.0.1:9100
+
+Run from the backend directory:
+
+    python -m bench.fake_upstreams --port 9100 --unreal-latency lognormal:350:0.5
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Optional, Dict, Any
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# MPEG-1 Layer III bitrate indices and a 44.1 kHz frame of 1152 samples
+_BITRATE_INDEX = {32: 1, 64: 5, 96: 7, 128: 9, 160: 10, 192: 11, 256: 13, 320: 14}
+_SAMPLE_RATE = 44100
+_FRAME_SECONDS = 1152 / _SAMPLE_RATE
+# Roughly how fast the voices speak
+_CHARS_PER_SECOND = 15.0
+
+_REPLY = (
+    "Let's slow everything down together. Breathe in gently through your nose, "
+    "hold it for a moment, and let it drift out slowly. Notice how your shoulders "
+    "soften and your jaw relaxes. There is nothing you need to do right now but rest."
+)
+_ROUTINE_SENTENCE = (
+    "Feel the warmth of the blanket settling around you... each breath a little slower, "
+    "a little softer, carrying you further into calm. "
+)
+
+
+class LatencyModel:
+    """
+    Samples response delays from a named distribution.
+
+    Parsed from "dist:mean_ms[:spread]", where dist is constant, uniform
+    (mean ± spread·mean), exponential, or lognormal (spread is sigma).
+    """
+
+    def __init__(self, dist: str, mean_ms: float, spread: float):
+        if dist not in ("constant", "uniform", "exponential", "lognormal"):
+            raise ValueError(f"unknown latency distribution: {dist}")
+        self.dist = dist
+        self.mean = mean_ms / 1000.0
+        self.spread = spread
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        parts = spec.split(":")
+        dist = parts[0]
+        mean_ms = float(parts[1]) if len(parts) > 1 else 0.0
+        spread = float(parts[2]) if len(parts) > 2 else 0.5
+        return cls(dist, mean_ms, spread)
+
+    def sample(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.dist == "constant":
+            return self.mean
+        if self.dist == "uniform":
+            return max(0.0, random.uniform(self.mean * (1 - self.spread), self.mean * (1 + self.spread)))
+        if self.dist == "exponential":
+            return random.expovariate(1.0 / self.mean)
+        mu = math.log(self.mean) - self.spread ** 2 / 2
+        return random.lognormvariate(mu, self.spread)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"dist": self.dist, "mean_ms": self.mean * 1000, "spread": self.spread}
+
+
+def mp3_frame(bitrate_kbps: int) -> bytes:
+    """One silent-ish MPEG-1 Layer III frame that mp3 parsers accept."""
+    kbps = min(_BITRATE_INDEX, key=lambda b: abs(b - bitrate_kbps))
+    header = bytes([0xFF, 0xFB, _BITRATE_INDEX[kbps] << 4, 0x00])
+    frame_length = 144 * kbps * 1000 // _SAMPLE_RATE
+    return header + b"\x00" * (frame_length - len(header))
+
+
+def build_app(args: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="Fake upstreams")
+    latency = {
+        "unreal": LatencyModel.parse(args.unreal_latency),
+        "openai": LatencyModel.parse(args.openai_latency),
+        "assemblyai": LatencyModel.parse(args.assemblyai_latency),
+    }
+    error_rates = {
+        "unreal": args.unreal_error_rate,
+        "openai": args.openai_error_rate,
+        "assemblyai": args.assemblyai_error_rate,
+    }
+    requests = Counter()
+    errors = Counter()
+
+    async def admit(upstream: str) -> Optional[JSONResponse]:
+        """Count the request, wait out its latency, and maybe fail it."""
+        requests[upstream] += 1
+        await asyncio.sleep(latency[upstream].sample())
+        if random.random() < error_rates[upstream]:
+            errors[upstream] += 1
+            status = random.choice(args.error_statuses)
+            headers = {"Retry-After": "1"} if status in (429, 503) else None
+            return JSONResponse({"error": {"message": f"simulated {status}"}}, status_code=status, headers=headers)
+        return None
+
+    @app.post("/stream")
+    async def unreal_stream(request: Request):
+        failure = await admit("unreal")
+        if failure is not None:
+            return failure
+        payload = await request.json()
+        bitrate = int(str(payload.get("Bitrate", "192k")).rstrip("kK") or 192)
+        seconds = max(0.5, len(payload.get("Text", "")) / _CHARS_PER_SECOND)
+        frame = mp3_frame(bitrate)
+        frame_count = int(seconds / _FRAME_SECONDS)
+        frames_per_chunk = max(1, args.unreal_chunk_frames)
+
+        async def body():
+            sent = 0
+            while sent < frame_count:
+                n = min(frames_per_chunk, frame_count - sent)
+                yield frame * n
+                sent += n
+                if args.unreal_chunk_ms:
+                    await asyncio.sleep(args.unreal_chunk_ms / 1000.0)
+
+        return StreamingResponse(body(), media_type="audio/mpeg")
+
+    def completion_text(body: Dict[str, Any]) -> str:
+        # Routine requests ask for a long completion; chat replies are short
+        if (body.get("max_completion_tokens") or 0) >= 1000:
+            return _ROUTINE_SENTENCE * args.routine_sentences
+        return _REPLY
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        failure = await admit("openai")
+        if failure is not None:
+            return failure
+        body = await request.json()
+        text = completion_text(body)
+        words = text.split(" ")
+        model = body.get("model", "fake-model")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        usage = {"prompt_tokens": 100, "completion_tokens": len(words), "total_tokens": 100 + len(words)}
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra) -> bytes:
+            choices = [] if extra else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model, "choices": choices, **extra}
+            return f"data: {json.dumps(data)}\n\n".encode()
+
+        async def events():
+            for i, word in enumerate(words):
+                yield chunk({"content": word if i == 0 else " " + word})
+                if args.openai_token_ms:
+                    await asyncio.sleep(args.openai_token_ms / 1000.0)
+            yield chunk({}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk({}, usage=usage)
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/v1/models/{model}")
+    async def retrieve_model(model: str):
+        failure = await admit("openai")
+        if failure is not None:
+            return failure
+        return {"id": model, "object": "model", "created": 0, "owned_by": "fake"}
+
+    @app.get("/v3/token")
+    async def assemblyai_token(expires_in_seconds: int = 600):
+        failure = await admit("assemblyai")
+        if failure is not None:
+            return failure
+        return {"token": uuid.uuid4().hex, "expires_in_seconds": expires_in_seconds}
+
+    @app.get("/_stats")
+    async def stats():
+        return {
+            "requests": dict(requests),
+            "errors": dict(errors),
+            "latency": {name: model.describe() for name, model in latency.items()},
+            "error_rates": error_rates,
+        }
+
+    @app.post("/_reset")
+    async def reset():
+        requests.clear()
+        errors.clear()
+        return {"success": True}
+
+    return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve fake Unreal Speech, OpenAI and AssemblyAI endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--seed", type=int, default=None, help="Seed latency and error sampling")
+    parser.add_argument("--unreal-latency", default="lognormal:300:0.4",
+                        help="Time to first audio byte, as dist:mean_ms[:spread]")
+    parser.add_argument("--unreal-chunk-frames", type=int, default=40, help="MP3 frames per streamed chunk")
+    parser.add_argument("--unreal-chunk-ms", type=float, default=20.0, help="Delay between streamed audio chunks")
+    parser.add_argument("--openai-latency", default="lognormal:400:0.5",
+                        help="Time to first token, as dist:mean_ms[:spread]")
+    parser.add_argument("--openai-token-ms", type=float, default=15.0, help="Delay between streamed tokens")
+    parser.add_argument("--routine-sentences", type=int, default=20, help="Sentences in a generated routine")
+    parser.add_argument("--assemblyai-latency", default="constant:80", help="Token endpoint latency")
+    parser.add_argument("--unreal-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--assemblyai-error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", type=lambda s: [int(x) for x in s.split(",")], default=[429, 503],
+                        help="Comma-separated statuses returned for simulated errors")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    import uvicorn
+
+    args = parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+    uvicorn.run(build_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""
+Load driver for the Sleep Assistant API.
+
+Runs a weighted mix of /api/tts, /api/chat, /api/sleep-routine and
+/api/audio requests at one or more concurrency levels and writes latency
+percentiles, throughput, error counts and server resource use to a JSON
+file that can be compared against an earlier run.
+
+Typical offline run, from the backend directory:
+
+    python -m bench.fake_upstreams --port 9100 &
+    UNREAL_SPEECH_BASE_URL=http://127.0.0.1:9100 OPENAI_BASE_URL=http://127.0.0.1:9100/v1 \\
+    ASSEMBLYAI_STREAMING_BASE_URL=http://127.0.0.1:9100 RATE_LIMIT_ENABLED=false \\
+    OPENAI_API_KEY=bench UNREAL_API_KEY=bench ASSEMBLYAI_API_KEY=bench \\
+        uvicorn main:app --port 8000 &
+    python -m bench.load_driver --concurrency 1,8,32 --duration 20 --server-pid $! \\
+        --output bench-results.json --baseline bench-baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Optional, Dict, Any, List, Tuple
+
+import httpx
+
+DEFAULT_MIX = "tts=4,chat=2,routine=1,audio=3"
+
+_TTS_LINES = [
+    "Take a slow breath in, and let it go.",
+    "Let your shoulders drop and your jaw soften.",
+    "You are safe, warm and ready for rest.",
+    "Picture gentle rain falling on a quiet forest.",
+    "With every breath out, sink a little deeper into the bed.",
+    "There is nothing left to do today.",
+]
+_CHAT_MESSAGES = [
+    "I can't fall asleep, my mind keeps racing.",
+    "Can you help me relax before bed?",
+    "I keep waking up at 3am, what should I do?",
+    "Tell me a short breathing exercise.",
+]
+_PREFERENCES = [
+    "rain, forest, anxious",
+    "ocean waves and a calm story",
+    "body scan meditation",
+    "affirmations for stress",
+]
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Linearly interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, Any]:
+    values = sorted(latencies)
+    to_ms = lambda v: None if v is None else round(v * 1000, 2)
+    return {
+        "count": len(values),
+        "mean_ms": to_ms(sum(values) / len(values)) if values else None,
+        "p50_ms": to_ms(percentile(values, 0.50)),
+        "p95_ms": to_ms(percentile(values, 0.95)),
+        "p99_ms": to_ms(percentile(values, 0.99)),
+        "max_ms": to_ms(values[-1]) if values else None,
+    }
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("tts", "chat", "routine", "audio"):
+            raise ValueError(f"unknown endpoint in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class ProcessSampler:
+    """
+    Samples CPU time and resident memory of the server process.
+
+    Uses psutil when it is installed (including worker child processes)
+    and falls back to /proc on Linux; without either, nothing is reported.
+    """
+
+    def __init__(self, pid: Optional[int], interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.rss_samples: List[int] = []
+        self._process = None
+        if pid is not None:
+            try:
+                import psutil
+                self._process = psutil.Process(pid)
+            except Exception:
+                self._process = None
+
+    def _read(self) -> Optional[Tuple[float, int]]:
+        """Return (cpu seconds, rss bytes) for the process tree, or None."""
+        if self.pid is None:
+            return None
+        if self._process is not None:
+            try:
+                processes = [self._process] + self._process.children(recursive=True)
+                cpu = rss = 0
+                for process in processes:
+                    times = process.cpu_times()
+                    cpu += times.user + times.system
+                    rss += process.memory_info().rss
+                return cpu, rss
+            except Exception:
+                return None
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            ticks = os.sysconf("SC_CLK_TCK")
+            cpu = (int(fields[11]) + int(fields[12])) / ticks
+            rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+            return cpu, rss
+        except (OSError, IndexError, ValueError):
+            return None
+
+    async def run(self, stop: asyncio.Event):
+        while not stop.is_set():
+            sample = self._read()
+            if sample is not None:
+                self.rss_samples.append(sample[1])
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> Optional[Tuple[float, float]]:
+        self.rss_samples = []
+        sample = self._read()
+        return None if sample is None else (time.monotonic(), sample[0])
+
+    def report(self, started: Optional[Tuple[float, float]]) -> Optional[Dict[str, Any]]:
+        end = self._read()
+        if started is None or end is None:
+            return None
+        wall = time.monotonic() - started[0]
+        rss = self.rss_samples or [end[1]]
+        return {
+            "cpu_seconds": round(end[0] - started[1], 3),
+            "cpu_percent": round(100 * (end[0] - started[1]) / wall, 1) if wall > 0 else None,
+            "rss_mb_max": round(max(rss) / 2 ** 20, 1),
+            "rss_mb_mean": round(sum(rss) / len(rss) / 2 ** 20, 1),
+        }
+
+
+class LoadDriver:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.mix = parse_mix(args.mix)
+        self.random = random.Random(args.seed)
+        self.audio_ids: List[str] = []
+        self._unique = 0
+
+    def _text(self, pool: List[str]) -> str:
+        text = self.random.choice(pool)
+        if self.random.random() < self.args.unique_ratio:
+            # Force a cache miss with text nobody has asked for yet
+            self._unique += 1
+            text = f"{text} ({self._unique} {time.time_ns()})"
+        return text
+
+    def _pick(self) -> str:
+        names = list(self.mix)
+        name = self.random.choices(names, weights=[self.mix[n] for n in names])[0]
+        if name == "audio" and not self.audio_ids:
+            return "tts"
+        return name
+
+    async def _request(self, client: httpx.AsyncClient, name: str) -> Tuple[int, int]:
+        """Make one request of the given kind. Returns (status, response bytes)."""
+        if name == "tts":
+            resp = await client.post("/api/tts", json={"text": self._text(_TTS_LINES), "speaker_name": "Emily"})
+            if resp.status_code == 200:
+                audio_id = resp.json().get("audio_id")
+                if audio_id and audio_id not in self.audio_ids:
+                    self.audio_ids.append(audio_id)
+                    del self.audio_ids[:-500]
+        elif name == "chat":
+            resp = await client.post("/api/chat", json={"message": self._text(_CHAT_MESSAGES)})
+        elif name == "routine":
+            resp = await client.post("/api/sleep-routine", json={"preferences": self._text(_PREFERENCES)})
+        else:
+            resp = await client.get(f"/api/audio/{self.random.choice(self.audio_ids)}")
+        return resp.status_code, len(resp.content)
+
+    async def _worker(self, client: httpx.AsyncClient, deadline: float, record: bool,
+                      latencies: Dict[str, List[float]], statuses: Dict[str, Counter], received: Counter):
+        while time.monotonic() < deadline:
+            name = self._pick()
+            start = time.perf_counter()
+            try:
+                status, size = await self._request(client, name)
+            except httpx.HTTPError as e:
+                status, size = type(e).__name__, 0
+            elapsed = time.perf_counter() - start
+            if record:
+                latencies[name].append(elapsed)
+                statuses[name][str(status)] += 1
+                received[name] += size
+
+    async def run_level(self, client: httpx.AsyncClient, concurrency: int,
+                        sampler: ProcessSampler) -> Dict[str, Any]:
+        args = self.args
+        latencies: Dict[str, List[float]] = defaultdict(list)
+        statuses: Dict[str, Counter] = defaultdict(Counter)
+        received: Counter = Counter()
+
+        if args.warmup > 0:
+            deadline = time.monotonic() + args.warmup
+            await asyncio.gather(*(self._worker(client, deadline, False, latencies, statuses, received)
+                                   for _ in range(concurrency)))
+
+        stop = asyncio.Event()
+        started = sampler.start()
+        sampler_task = asyncio.create_task(sampler.run(stop))
+        start = time.monotonic()
+        deadline = start + args.duration
+        await asyncio.gather(*(self._worker(client, deadline, True, latencies, statuses, received)
+                               for _ in range(concurrency)))
+        elapsed = time.monotonic() - start
+        stop.set()
+        await sampler_task
+
+        all_latencies = [v for values in latencies.values() for v in values]
+        total = len(all_latencies)
+        errors = sum(count for counter in statuses.values()
+                     for status, count in counter.items() if not status.startswith("2") and status != "304")
+        return {
+            "concurrency": concurrency,
+            "duration_seconds": round(elapsed, 3),
+            "requests": total,
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "throughput_rps": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+            "latency": summarize_latencies(all_latencies),
+            "endpoints": {
+                name: {
+                    **summarize_latencies(values),
+                    "throughput_rps": round(len(values) / elapsed, 2) if elapsed > 0 else 0.0,
+                    "statuses": dict(statuses[name]),
+                    "bytes_received": received[name],
+                }
+                for name, values in sorted(latencies.items())
+            },
+            "server_resources": sampler.report(started),
+        }
+
+    async def _wait_ready(self, client: httpx.AsyncClient, timeout: float = 60.0):
+        """Wait for /health/ready so cold-start work isn't measured as request latency."""
+        deadline = time.monotonic() + timeout
+        while True:
+            resp = await client.get("/health/ready")
+            if resp.status_code == 200:
+                return
+            if time.monotonic() > deadline:
+                resp.raise_for_status()
+            await asyncio.sleep(0.5)
+
+    async def run(self) -> Dict[str, Any]:
+        args = self.args
+        levels = [int(c) for c in args.concurrency.split(",")]
+        limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+        timeout = httpx.Timeout(args.timeout)
+        sampler = ProcessSampler(args.server_pid)
+        driver_start = resource.getrusage(resource.RUSAGE_SELF)
+
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+            await self._wait_ready(client)
+            if "audio" in self.mix:
+                # Seed the pool of clips that audio requests replay
+                for _ in _TTS_LINES:
+                    await self._request(client, "tts")
+            runs = []
+            for concurrency in levels:
+                print(f"▶️ Running concurrency {concurrency} for {args.duration}s", file=sys.stderr)
+                result = await self.run_level(client, concurrency, sampler)
+                latency = result["latency"]
+                print(f"   {result['throughput_rps']} req/s, p50 {latency['p50_ms']} ms, "
+                      f"p95 {latency['p95_ms']} ms, p99 {latency['p99_ms']} ms, "
+                      f"errors {result['errors']}", file=sys.stderr)
+                runs.append(result)
+
+        driver_end = resource.getrusage(resource.RUSAGE_SELF)
+        return {
+            "meta": {
+                "label": args.label,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "git_commit": _git_commit(),
+                "base_url": args.base_url,
+                "mix": self.mix,
+                "unique_ratio": args.unique_ratio,
+                "duration_seconds": args.duration,
+                "warmup_seconds": args.warmup,
+                "seed": args.seed,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "driver_cpu_seconds": round((driver_end.ru_utime + driver_end.ru_stime)
+                                            - (driver_start.ru_utime + driver_start.ru_stime), 3),
+            },
+            "runs": runs,
+        }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """
+    List regressions against a baseline run: p95 latency up, or throughput
+    down, by more than max_regression (a fraction) at the same concurrency.
+    """
+    regressions = []
+    baseline_runs = {run["concurrency"]: run for run in baseline.get("runs", [])}
+    for run in current["runs"]:
+        base = baseline_runs.get(run["concurrency"])
+        if base is None:
+            continue
+        scopes = [("all", run["latency"], run, base["latency"], base)]
+        for name, stats in run["endpoints"].items():
+            base_stats = base.get("endpoints", {}).get(name)
+            if base_stats is not None:
+                scopes.append((name, stats, stats, base_stats, base_stats))
+        for name, latency, throughput, base_latency, base_throughput in scopes:
+            p95, base_p95 = latency.get("p95_ms"), base_latency.get("p95_ms")
+            if p95 is not None and base_p95 and p95 > base_p95 * (1 + max_regression):
+                regressions.append(f"c={run['concurrency']} {name}: p95 {base_p95} -> {p95} ms")
+            rps, base_rps = throughput.get("throughput_rps"), base_throughput.get("throughput_rps")
+            if rps is not None and base_rps and rps < base_rps * (1 - max_regression):
+                regressions.append(f"c={run['concurrency']} {name}: throughput {base_rps} -> {rps} req/s")
+    return regressions
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Drive a mixed load against the Sleep Assistant API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Endpoint weights, e.g. tts=4,chat=2,routine=1,audio=3")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each level")
+    parser.add_argument("--unique-ratio", type=float, default=0.2,
+                        help="Fraction of TTS, chat and routine requests with unique (uncacheable) text")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--server-pid", type=int, default=None, help="Sample CPU and memory of this process")
+    parser.add_argument("--label", default=None, help="Free-form name stored with the results")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--baseline", default=None, help="Earlier results to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="Allowed fractional p95/throughput regression before failing")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(LoadDriver(args).run())
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        for regression in regressions:
+            print(f"❌ Regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("✅ No regressions against baseline", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
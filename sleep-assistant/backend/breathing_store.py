@@ -0,0 +1,414 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from itertools import islice
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Deque, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_id TEXT NOT NULL,
+    technique_id TEXT NOT NULL,
+    technique_name TEXT NOT NULL,
+    cycles_completed INTEGER NOT NULL,
+    total_duration_seconds REAL NOT NULL,
+    session_date TEXT NOT NULL,
+    day TEXT NOT NULL,
+    logged_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_by_client ON sessions (client_id, id);
+CREATE TABLE IF NOT EXISTS technique_rollup (
+    client_id TEXT NOT NULL,
+    technique_id TEXT NOT NULL,
+    technique_name TEXT NOT NULL,
+    sessions INTEGER NOT NULL,
+    cycles INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    last_session_date TEXT NOT NULL,
+    PRIMARY KEY (client_id, technique_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily_rollup (
+    client_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    sessions INTEGER NOT NULL,
+    cycles INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (client_id, day)
+) WITHOUT ROWID;
+"""
+_SCHEMA_VERSION = 1
+
+# Before version 1 sessions weren't keyed by client. Those sessions are kept
+# under an empty client id no one can ask for, and the global rollups are dropped.
+_MIGRATIONS = {
+    1: """
+ALTER TABLE sessions ADD COLUMN client_id TEXT NOT NULL DEFAULT '';
+DROP TABLE IF EXISTS technique_rollup;
+DROP TABLE IF EXISTS daily_rollup;
+""",
+}
+
+_SESSION_COLUMNS = ("technique_id", "technique_name", "cycles_completed", "total_duration_seconds", "session_date")
+
+
+def session_day(session_date: str, logged_at: float) -> str:
+    """UTC calendar day (YYYY-MM-DD) of a session, from its ISO date or else when it was logged."""
+    try:
+        parsed = datetime.fromisoformat(session_date)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc)
+        return parsed.date().isoformat()
+    except (TypeError, ValueError):
+        return datetime.fromtimestamp(logged_at, timezone.utc).date().isoformat()
+
+
+class _PendingClient:
+    """One client's buffered sessions with their totals, kept up to date as sessions come and go."""
+
+    def __init__(self):
+        self.sessions: Deque[Dict[str, Any]] = deque()
+        self.techniques: Dict[str, Dict[str, Any]] = {}
+        self.days: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, record: Dict[str, Any]):
+        self.sessions.append(record)
+        technique = self.techniques.setdefault(record["technique_id"], {
+            "technique_id": record["technique_id"], "technique_name": record["technique_name"],
+            "sessions": 0, "cycles": 0, "seconds": 0.0, "last_session_date": record["session_date"],
+        })
+        technique["technique_name"] = record["technique_name"]
+        technique["sessions"] += 1
+        technique["cycles"] += record["cycles_completed"]
+        technique["seconds"] += record["total_duration_seconds"]
+        technique["last_session_date"] = max(technique["last_session_date"], record["session_date"])
+        day = self.days.setdefault(record["day"], {"day": record["day"], "sessions": 0, "cycles": 0, "seconds": 0.0})
+        day["sessions"] += 1
+        day["cycles"] += record["cycles_completed"]
+        day["seconds"] += record["total_duration_seconds"]
+
+    def remove_oldest(self, flushed: bool):
+        """
+        Take the oldest session out of the totals.
+
+        A flushed session's date is in the rollup rows, so a technique's last
+        date can stay; a dropped one's must be recomputed from what is left.
+        """
+        record = self.sessions.popleft()
+        technique = self.techniques[record["technique_id"]]
+        technique["sessions"] -= 1
+        technique["cycles"] -= record["cycles_completed"]
+        technique["seconds"] -= record["total_duration_seconds"]
+        if technique["sessions"] == 0:
+            del self.techniques[record["technique_id"]]
+        elif not flushed:
+            technique["last_session_date"] = max(
+                r["session_date"] for r in self.sessions if r["technique_id"] == record["technique_id"]
+            )
+        day = self.days[record["day"]]
+        day["sessions"] -= 1
+        day["cycles"] -= record["cycles_completed"]
+        day["seconds"] -= record["total_duration_seconds"]
+        if day["sessions"] == 0:
+            del self.days[record["day"]]
+
+
+class BreathingSessionStore:
+    """
+    Write-behind store for completed breathing sessions, kept per client.
+
+    log() only appends to an in-memory buffer, so recording a session never
+    waits on disk. A background flusher drains the buffer in batches, each
+    in one SQLite transaction that inserts the sessions and folds them into
+    per-technique and per-day rollup rows. Reads use those rollups and the
+    newest rows by primary key, so they cost the same with a hundred or
+    millions of sessions; sessions still in this process's buffer are
+    merged in so a client always sees what it just logged, from per-client
+    totals kept up to date by log() and flush() rather than a scan of the
+    whole buffer. Sessions and
+    rollups are keyed by the client id of the browser that logged them, and
+    every read is for one client.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, max_batch: int = 500,
+                 max_buffer: int = 100_000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_buffer = max_buffer
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._pending: Dict[str, _PendingClient] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_wanted: Optional[asyncio.Event] = None
+        self._local = threading.local()
+        self.logged = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.flush_errors = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            has_sessions = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sessions'"
+            ).fetchone() is not None
+            if has_sessions:
+                for target in range(version + 1, _SCHEMA_VERSION + 1):
+                    self._run_script(conn, _MIGRATIONS[target])
+            self._run_script(conn, _SCHEMA)
+            conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _run_script(conn: sqlite3.Connection, script: str):
+        for statement in script.strip().split(";"):
+            if statement.strip():
+                conn.execute(statement)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def log(self, client_id: str, session: Dict[str, Any]):
+        """Queue a client's completed session for the next flush. Never touches disk."""
+        logged_at = time.time()
+        record = {name: session[name] for name in _SESSION_COLUMNS}
+        record["client_id"] = client_id
+        record["day"] = session_day(record["session_date"], logged_at)
+        record["logged_at"] = logged_at
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                # The disk has been unavailable for a long time; shed the oldest
+                self._remove_pending(self._buffer.popleft(), flushed=False)
+                self.dropped += 1
+            self._buffer.append(record)
+            self._pending.setdefault(client_id, _PendingClient()).add(record)
+            self.logged += 1
+            full = len(self._buffer) >= self.max_batch
+        if full and self._flush_wanted is not None:
+            self._flush_wanted.set()
+
+    def _remove_pending(self, record: Dict[str, Any], flushed: bool):
+        # Call with _lock held. Records leave the buffer oldest first, so they are also a client's oldest
+        pending = self._pending[record["client_id"]]
+        pending.remove_oldest(flushed)
+        if not pending.sessions:
+            del self._pending[record["client_id"]]
+
+    def _pending_sessions(self, client_id: str, limit: int) -> List[Dict[str, Any]]:
+        """A client's newest limit unflushed sessions, oldest first."""
+        with self._lock:
+            pending = self._pending.get(client_id)
+            if pending is None:
+                return []
+            newest = list(islice(reversed(pending.sessions), limit))
+        newest.reverse()
+        return newest
+
+    def _pending_totals(self, client_id: str) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """Copies of a client's unflushed per-technique and per-day totals."""
+        with self._lock:
+            pending = self._pending.get(client_id)
+            if pending is None:
+                return {}, {}
+            return (
+                {tid: dict(t) for tid, t in pending.techniques.items()},
+                {day: dict(d) for day, d in pending.days.items()},
+            )
+
+    def flush(self) -> int:
+        """
+        Write buffered sessions to disk, max_batch per transaction.
+
+        Returns:
+            Number of sessions written
+        """
+        written = 0
+        while True:
+            # Readers take the same lock, so no one sees a batch both on disk and in the buffer
+            with self._flush_lock:
+                with self._lock:
+                    batch = [self._buffer[i] for i in range(min(self.max_batch, len(self._buffer)))]
+                if not batch:
+                    return written
+                try:
+                    self._write(batch)
+                except sqlite3.Error as e:
+                    self.flush_errors += 1
+                    print(f"❌ Breathing session flush failed, will retry: {e}")
+                    return written
+                with self._lock:
+                    # Only flushes remove from the front, so the batch is still there
+                    for _ in batch:
+                        self._remove_pending(self._buffer.popleft(), flushed=True)
+                    self.flushed += len(batch)
+            written += len(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        techniques: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        days: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for record in batch:
+            technique = techniques.setdefault((record["client_id"], record["technique_id"]), {
+                "technique_name": record["technique_name"], "sessions": 0, "cycles": 0, "seconds": 0.0,
+                "last_session_date": record["session_date"],
+            })
+            technique["technique_name"] = record["technique_name"]
+            technique["sessions"] += 1
+            technique["cycles"] += record["cycles_completed"]
+            technique["seconds"] += record["total_duration_seconds"]
+            technique["last_session_date"] = max(technique["last_session_date"], record["session_date"])
+            day = days.setdefault((record["client_id"], record["day"]), {"sessions": 0, "cycles": 0, "seconds": 0.0})
+            day["sessions"] += 1
+            day["cycles"] += record["cycles_completed"]
+            day["seconds"] += record["total_duration_seconds"]
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO sessions (client_id, technique_id, technique_name, cycles_completed, "
+                "total_duration_seconds, session_date, day, logged_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(record["client_id"],) + tuple(record[name] for name in _SESSION_COLUMNS)
+                 + (record["day"], record["logged_at"]) for record in batch]
+            )
+            conn.executemany(
+                "INSERT INTO technique_rollup (client_id, technique_id, technique_name, sessions, cycles, seconds, "
+                "last_session_date) VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (client_id, technique_id) DO UPDATE SET "
+                "technique_name = excluded.technique_name, sessions = sessions + excluded.sessions, "
+                "cycles = cycles + excluded.cycles, seconds = seconds + excluded.seconds, "
+                "last_session_date = MAX(last_session_date, excluded.last_session_date)",
+                [(cid, tid, t["technique_name"], t["sessions"], t["cycles"], t["seconds"], t["last_session_date"])
+                 for (cid, tid), t in techniques.items()]
+            )
+            conn.executemany(
+                "INSERT INTO daily_rollup (client_id, day, sessions, cycles, seconds) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (client_id, day) DO UPDATE SET sessions = sessions + excluded.sessions, "
+                "cycles = cycles + excluded.cycles, seconds = seconds + excluded.seconds",
+                [(cid, day, d["sessions"], d["cycles"], d["seconds"]) for (cid, day), d in days.items()]
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    async def run_flusher(self):
+        """Flush every flush_interval seconds, or sooner once a full batch is waiting."""
+        self._flush_wanted = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_wanted.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wanted.clear()
+            if self._buffer:
+                await asyncio.to_thread(self.flush)
+
+    def recent(self, client_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """A client's newest sessions, oldest first."""
+        with self._flush_lock:
+            pending = self._pending_sessions(client_id, limit)
+            rows = []
+            if len(pending) < limit:
+                cursor = self._conn().execute(
+                    "SELECT technique_id, technique_name, cycles_completed, total_duration_seconds, session_date "
+                    "FROM sessions WHERE client_id = ? ORDER BY id DESC LIMIT ?", (client_id, limit - len(pending))
+                )
+                rows = [dict(zip(_SESSION_COLUMNS, row)) for row in cursor.fetchall()]
+        rows.reverse()
+        return rows + [{name: record[name] for name in _SESSION_COLUMNS} for record in pending]
+
+    def _read_rollups(self, conn: sqlite3.Connection, client_id: str, since: str):
+        techniques = {
+            row[0]: {"technique_id": row[0], "technique_name": row[1], "sessions": row[2], "cycles": row[3],
+                     "seconds": row[4], "last_session_date": row[5]}
+            for row in conn.execute(
+                "SELECT technique_id, technique_name, sessions, cycles, seconds, last_session_date "
+                "FROM technique_rollup WHERE client_id = ?", (client_id,)
+            )
+        }
+        daily = {
+            row[0]: {"day": row[0], "sessions": row[1], "cycles": row[2], "seconds": row[3]}
+            for row in conn.execute(
+                "SELECT day, sessions, cycles, seconds FROM daily_rollup WHERE client_id = ? AND day >= ? ORDER BY day",
+                (client_id, since)
+            )
+        }
+        return techniques, daily, self._pending_totals(client_id)
+
+    def summary(self, client_id: str, days: int = 30) -> Dict[str, Any]:
+        """A client's totals, per-technique stats and last `days` days of daily stats, including unflushed sessions."""
+        conn = self._conn()
+        since = datetime.fromtimestamp(time.time() - (days - 1) * 86400, timezone.utc).date().isoformat()
+        with self._flush_lock:
+            techniques, daily, (pending_techniques, pending_days) = self._read_rollups(conn, client_id, since)
+
+        for technique_id, pending in pending_techniques.items():
+            technique = techniques.get(technique_id)
+            if technique is None:
+                techniques[technique_id] = pending
+                continue
+            technique["technique_name"] = pending["technique_name"]
+            technique["sessions"] += pending["sessions"]
+            technique["cycles"] += pending["cycles"]
+            technique["seconds"] += pending["seconds"]
+            technique["last_session_date"] = max(technique["last_session_date"], pending["last_session_date"])
+        for day, pending in pending_days.items():
+            if day < since:
+                continue
+            if day not in daily:
+                daily[day] = pending
+                continue
+            daily[day]["sessions"] += pending["sessions"]
+            daily[day]["cycles"] += pending["cycles"]
+            daily[day]["seconds"] += pending["seconds"]
+
+        return {
+            "total_sessions": sum(t["sessions"] for t in techniques.values()),
+            "total_cycles": sum(t["cycles"] for t in techniques.values()),
+            "total_seconds": sum(t["seconds"] for t in techniques.values()),
+            "techniques": sorted(techniques.values(), key=lambda t: t["sessions"], reverse=True),
+            "daily": [daily[day] for day in sorted(daily)],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            "path": self.path,
+            "buffered": buffered,
+            "logged": self.logged,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "flush_errors": self.flush_errors,
+        }
+
+
+# Kept with the app rather than in the temp directory, which is cleared on reboot
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Global breathing session store
+_breathing_store = None
+
+def get_breathing_store() -> BreathingSessionStore:
+    """Get the global breathing session store, configured from the environment on first use."""
+    global _breathing_store
+    if _breathing_store is None:
+        _breathing_store = BreathingSessionStore(
+            os.getenv("BREATHING_DB_PATH", os.path.join(DATA_DIR, "breathing.sqlite3")),
+            flush_interval=float(os.getenv("BREATHING_FLUSH_INTERVAL_SECONDS", "1.0")),
+            max_batch=int(os.getenv("BREATHING_FLUSH_BATCH", "500"))
+        )
+    return _breathing_store
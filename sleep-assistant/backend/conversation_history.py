@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Tuple, Callable, Awaitable, TYPE_CHECKING
+
+from text_chunker import split_sentences
+
+if TYPE_CHECKING:
+    from shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+# Exact token counts need tiktoken; without it we fall back to a character heuristic
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+# Per-message framing overhead of the chat format
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def count_tokens(text: str) -> int:
+    """Count (or, without tiktoken, estimate) the tokens in a piece of text."""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, len(text) // 4)
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Count the prompt tokens used by a list of chat messages."""
+    return sum(count_tokens(m.get("content", "")) + _MESSAGE_OVERHEAD_TOKENS for m in messages) + 2
+
+
+def _chain_hashes(messages: List[Dict[str, str]]) -> List[str]:
+    """Hash each prefix of the conversation, so prefix i+1 builds on prefix i."""
+    hashes = []
+    digest = b""
+    for message in messages:
+        digest = hashlib.sha256(
+            digest + message.get("role", "").encode("utf-8") + b"\0" + message.get("content", "").encode("utf-8")
+        ).digest()
+        hashes.append(digest.hex()[:32])
+    return hashes
+
+
+class ConversationHistoryManager:
+    """
+    Fits conversation history into a prompt-token budget.
+
+    The newest turns are kept verbatim for as long as they fit. Older turns
+    are replaced by a rolling summary: summaries are cached by a hash of the
+    conversation prefix they cover, so each request only has to fold in the
+    turns dropped since the last cached summary. Folding is done by an LLM
+    call in the background; until it lands, the new turns are compacted
+    extractively so the request never waits on summarization. With shared
+    state, summaries are also published there for the other workers.
+    """
+
+    def __init__(self, summarize: Callable[[str, List[Dict[str, str]]], Awaitable[str]],
+                 prompt_token_budget: int = 2000, summary_token_budget: int = 250,
+                 max_cached_summaries: int = 512, shared: Optional["SharedState"] = None,
+                 shared_summary_ttl: float = 24 * 3600):
+        self.summarize = summarize
+        self.prompt_token_budget = prompt_token_budget
+        self.summary_token_budget = summary_token_budget
+        self.max_cached_summaries = max_cached_summaries
+        self.shared = shared
+        self.shared_summary_ttl = shared_summary_ttl
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.summary_hits = 0
+        self.summary_misses = 0
+
+    def _get_summary(self, key: str) -> Optional[str]:
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+                return summary
+        if self.shared is not None:
+            summary = self.shared.get("summary", key)
+            if summary is not None:
+                self._put_summary(key, summary, publish=False)
+        return summary
+
+    def _put_summary(self, key: str, summary: str, publish: bool = True):
+        if publish and self.shared is not None:
+            self.shared.set("summary", key, summary, ttl=self.shared_summary_ttl)
+        with self._lock:
+            self._summaries[key] = summary
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self.max_cached_summaries:
+                self._summaries.popitem(last=False)
+
+    def _compact(self, previous_summary: str, messages: List[Dict[str, str]]) -> str:
+        """Cheap extractive summary: the first sentence of each dropped turn, newest kept first."""
+        lines = [previous_summary] if previous_summary else []
+        for message in messages:
+            sentences = split_sentences(message.get("content", ""))
+            if not sentences:
+                continue
+            speaker = "User" if message.get("role") == "user" else "Assistant"
+            lines.append(f"{speaker}: {sentences[0][:200]}")
+
+        while len(lines) > 1 and count_tokens(" ".join(lines)) > self.summary_token_budget:
+            lines.pop(0)
+        return " ".join(lines)
+
+    def _schedule_summary(self, key: str, previous_summary: str, messages: List[Dict[str, str]]):
+        if key in self._inflight:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Called outside the event loop; the extractive summary will have to do
+            return
+
+        async def run():
+            try:
+                summary = await self.summarize(previous_summary, messages)
+                # Publishing to shared state takes the database write lock
+                await asyncio.to_thread(self._put_summary, key, summary)
+            except Exception as e:
+                logger.warning(f"Conversation summary failed: {str(e)}")
+            finally:
+                self._inflight.pop(key, None)
+
+        self._inflight[key] = loop.create_task(run())
+
+    def _summarize_dropped(self, dropped: List[Dict[str, str]]) -> str:
+        hashes = _chain_hashes(dropped)
+        # Find the longest prefix of the dropped turns that already has a summary
+        covered = 0
+        previous_summary = ""
+        for i in range(len(hashes), 0, -1):
+            summary = self._get_summary(hashes[i - 1])
+            if summary is not None:
+                covered, previous_summary = i, summary
+                break
+
+        if covered == len(dropped):
+            self.summary_hits += 1
+            return previous_summary
+
+        self.summary_misses += 1
+        remaining = dropped[covered:]
+        self._schedule_summary(hashes[-1], previous_summary, remaining)
+        return self._compact(previous_summary, remaining)
+
+    def build_messages(self, system_prompt: str, history: Optional[List[Dict[str, str]]],
+                       user_message: str) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Build the messages for a chat request within the prompt-token budget.
+
+        Returns:
+            Tuple of (messages, prompt token count)
+        """
+        system = {"role": "system", "content": system_prompt}
+        user = {"role": "user", "content": user_message}
+        history = history or []
+
+        available = self.prompt_token_budget - count_message_tokens([system, user])
+        if len(history) > 0:
+            # Leave room for a summary in case anything has to be dropped
+            available -= self.summary_token_budget + _MESSAGE_OVERHEAD_TOKENS
+
+        recent: List[Dict[str, str]] = []
+        used = 0
+        for message in reversed(history):
+            cost = count_tokens(message.get("content", "")) + _MESSAGE_OVERHEAD_TOKENS
+            if used + cost > available:
+                break
+            recent.insert(0, message)
+            used += cost
+
+        messages = [system]
+        dropped = history[:len(history) - len(recent)]
+        if dropped:
+            summary = self._summarize_dropped(dropped)
+            if summary:
+                messages.append({
+                    "role": "system",
+                    "content": f"Summary of the earlier conversation: {summary}"
+                })
+        messages.extend(recent)
+        messages.append(user)
+        return messages, count_message_tokens(messages)
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+from audio_cache import TTSAudioCache
+from audio_quality import DEFAULT_QUALITY, CONSTRAINED_QUALITY, parse_quality
+from openai_service import FALLBACK_REPLIES, FALLBACK_ROUTINE
+from tts_service import SUPPORTED_VOICES, UnrealTTSService, get_tts_service
+
+ClipKey = Tuple[str, str, str]  # (normalized text, voice, quality tier)
+
+
+def fallback_voices(tts_service: UnrealTTSService) -> List[str]:
+    """
+    Voices to pre-synthesize fallbacks in, from FALLBACK_AUDIO_VOICES.
+
+    "default" (the default) covers the default voice, "all" every supported
+    voice, "off" none; anything else is a comma-separated list of voices.
+    """
+    setting = os.getenv("FALLBACK_AUDIO_VOICES", "default").strip()
+    if setting.lower() in ("", "off", "none", "false", "0"):
+        return []
+    if setting.lower() == "all":
+        return sorted(SUPPORTED_VOICES)
+    if setting.lower() == "default":
+        return [tts_service.default_voice]
+    return sorted({tts_service.resolve_voice(name) for name in setting.split(",") if name.strip()})
+
+
+class FallbackAudio:
+    """
+    Pinned speech for the canned replies served when OpenAI is unavailable.
+
+    Every fallback reply and the fallback routine is synthesized once per
+    voice and quality tier and pinned in the audio store, so it never
+    expires or gets evicted. When OpenAI fails, the endpoints attach the
+    matching audio_id to the fallback text from an in-memory index, and
+    degraded mode answers without calling any upstream, including Unreal
+    Speech.
+    """
+
+    def __init__(self, tts_service: UnrealTTSService):
+        self.tts_service = tts_service
+        self._clips: Dict[ClipKey, Dict[str, Any]] = {}  # audio_id and duration, so lookups stay in memory
+        self.failed = 0
+        self.prepared_in: Optional[float] = None
+
+    @staticmethod
+    def texts() -> List[str]:
+        return [*FALLBACK_REPLIES, FALLBACK_ROUTINE]
+
+    def _key(self, text: str, speaker_name: Optional[str], quality: Optional[str]) -> ClipKey:
+        return (
+            TTSAudioCache.normalize_text(text),
+            self.tts_service.resolve_voice(speaker_name),
+            parse_quality(quality) or DEFAULT_QUALITY,
+        )
+
+    async def prepare(self, voices: List[str], qualities: Optional[List[str]] = None,
+                      max_parallel: int = 2) -> Tuple[int, int]:
+        """
+        Synthesize (or find in the cache) and pin every fallback clip.
+
+        Args:
+            voices: Voices to cover
+            qualities: Tiers to cover; the default and mobile tiers if None
+            max_parallel: Maximum number of clips synthesized at once
+
+        Returns:
+            Tuple of (clips pinned, clips that failed)
+        """
+        qualities = qualities or sorted({DEFAULT_QUALITY, CONSTRAINED_QUALITY})
+        semaphore = asyncio.Semaphore(max_parallel)
+        store = self.tts_service.store
+        start = time.perf_counter()
+
+        async def prepare_clip(text: str, voice: str, quality: str) -> bool:
+            async with semaphore:
+                result = await self.tts_service.lookup_cached(text, voice, quality)
+                if result is None:
+                    result = await self.tts_service.synthesize(text, voice, quality)
+            if result is None or not await asyncio.to_thread(store.pin, result["audio_id"]):
+                return False
+            # Pinned clips live outside the cache's byte budget
+            self.tts_service.cache.forget(result["audio_id"])
+            self._clips[self._key(text, voice, quality)] = {
+                "audio_id": result["audio_id"],
+                "duration": result["duration"],
+            }
+            return True
+
+        jobs = [(text, voice, quality) for voice in voices for quality in qualities for text in self.texts()]
+        results = await asyncio.gather(*(prepare_clip(*job) for job in jobs), return_exceptions=True)
+        pinned = sum(1 for ok in results if ok is True)
+        self.failed = len(jobs) - pinned
+        self.prepared_in = time.perf_counter() - start
+        if self.failed:
+            print(f"⚠️ Pinned {pinned} fallback clips, {self.failed} failed")
+        else:
+            print(f"📌 Pinned {pinned} fallback clips in {self.prepared_in:.2f}s")
+        return pinned, self.failed
+
+    def lookup(self, text: str, speaker_name: Optional[str] = None,
+               quality: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Audio for a fallback text if it was pre-synthesized in this voice and tier, else None."""
+        clip = self._clips.get(self._key(text, speaker_name, quality))
+        if clip is None:
+            return None
+        return {
+            "audio_id": clip["audio_id"],
+            "audio_url": f"/api/audio/{clip['audio_id']}",
+            "duration": clip["duration"],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clips": len(self._clips),
+            "failed": self.failed,
+            "prepared_in_seconds": round(self.prepared_in, 3) if self.prepared_in is not None else None,
+        }
+
+
+# Global fallback audio index
+_fallback_audio = None
+
+def get_fallback_audio() -> FallbackAudio:
+    """Get the global fallback audio index, bound to the global TTS service."""
+    global _fallback_audio
+    if _fallback_audio is None:
+        _fallback_audio = FallbackAudio(get_tts_service())
+    return _fallback_audio
@@ -0,0 +1,136 @@
+import os
+import asyncio
+import time
+import certifi
+import httpx
+from typing import Dict, Any
+
+from metrics import InstrumentedTransport
+from resilience import BreakerTransport, get_breaker
+
+# HTTP/2 needs the optional h2 package (installed via httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Connection pool and timeout settings per upstream
+UPSTREAM_SETTINGS: Dict[str, Dict[str, Any]] = {
+    "unreal": {
+        "max_connections": int(os.getenv("UNREAL_MAX_CONNECTIONS", "20")),
+        "timeout": httpx.Timeout(float(os.getenv("UNREAL_TIMEOUT_SECONDS", "30")), connect=5.0),
+    },
+    "openai": {
+        "max_connections": int(os.getenv("OPENAI_MAX_CONNECTIONS", "20")),
+        "timeout": httpx.Timeout(float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60")), connect=5.0),
+    },
+    "assemblyai": {
+        "max_connections": int(os.getenv("ASSEMBLYAI_MAX_CONNECTIONS", "4")),
+        "timeout": httpx.Timeout(float(os.getenv("ASSEMBLYAI_TIMEOUT_SECONDS", "10")), connect=5.0),
+    },
+}
+
+
+class UpstreamClients:
+    """
+    One pooled httpx.AsyncClient per upstream, shared for the lifetime of the app.
+
+    Keeping a client per upstream gives each its own connection limit and
+    timeouts while reusing keep-alive (and HTTP/2 where available)
+    connections across requests. Every call's outcome feeds the upstream's
+    circuit breaker.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        settings = UPSTREAM_SETTINGS[name]
+        limits = httpx.Limits(
+            max_connections=settings["max_connections"],
+            max_keepalive_connections=settings["max_connections"],
+            keepalive_expiry=60.0,
+        )
+        transport = httpx.AsyncHTTPTransport(
+            http2=HTTP2_AVAILABLE,
+            limits=limits,
+            verify=certifi.where(),
+        )
+        return httpx.AsyncClient(
+            transport=InstrumentedTransport(name, BreakerTransport(get_breaker(name), transport)),
+            timeout=settings["timeout"],
+        )
+
+    def start(self):
+        """Create clients for every configured upstream."""
+        for name in UPSTREAM_SETTINGS:
+            self.get(name)
+        print(f"✅ Upstream HTTP clients ready (HTTP/2 {'enabled' if HTTP2_AVAILABLE else 'unavailable'})")
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Return the client for an upstream, creating it on first use."""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._create(name)
+            self._clients[name] = client
+        return client
+
+    async def prewarm(self, urls: Dict[str, str], connections: int = 2, timeout: float = 5.0) -> Dict[str, Dict[str, Any]]:
+        """
+        Open pooled connections before the first real request needs them.
+
+        Sends concurrent HEAD requests to each upstream's base URL so DNS,
+        TCP and TLS are paid for at startup; whatever status comes back, the
+        connection stays in the keep-alive pool. The requests are tagged like
+        health probes so they don't count as real traffic.
+
+        Returns:
+            Per upstream, the seconds taken and the status or error
+        """
+        async def warm(name: str, url: str) -> Dict[str, Any]:
+            client = self.get(name)
+            start = time.perf_counter()
+            results = await asyncio.gather(
+                *(client.head(url, timeout=timeout, extensions={"health_probe": True}) for _ in range(connections)), return_exceptions=True
+            )
+            errors = [r for r in results if isinstance(r, Exception)]
+            result: Dict[str, Any] = {"seconds": round(time.perf_counter() - start, 3), "ok": not errors}
+            if errors:
+                result["error"] = f"{type(errors[0]).__name__}: {errors[0]}"
+            else:
+                result["status"] = results[0].status_code
+            return result
+
+        names = [name for name in urls if name in UPSTREAM_SETTINGS]
+        results = await asyncio.gather(*(warm(name, urls[name]) for name in names))
+        return dict(zip(names, results))
+
+    async def close(self):
+        """Close all clients and their pooled connections."""
+        clients, self._clients = self._clients, {}
+        for name, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                print(f"❌ Failed to close {name} HTTP client: {e}")
+
+
+# Global client registry
+_upstream_clients = UpstreamClients()
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    """Get the shared HTTP client for an upstream ("unreal", "openai" or "assemblyai")."""
+    return _upstream_clients.get(name)
+
+def start_http_clients():
+    """Create the shared upstream clients."""
+    _upstream_clients.start()
+
+async def prewarm_http_clients(urls: Dict[str, str], connections: int = 2) -> Dict[str, Dict[str, Any]]:
+    """Pre-open pooled connections to each upstream's base URL."""
+    return await _upstream_clients.prewarm(urls, connections)
+
+async def close_http_clients():
+    """Close the shared upstream clients."""
+    await _upstream_clients.close()
@@ -1,30 +1,66 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+import time
+# Reported as the "imports" startup phase; the SDK imports below dominate cold start
+_imports_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+from pydantic import BaseModel, Field
 import os
-import tempfile
 import asyncio
-import requests
-import time
+import json
 from typing import Optional, Dict, Any, List
 import uvicorn
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
+from audio_store import get_audio_store
+from shared_state import get_shared_state, rate_limit_storage_uri
+from breathing_store import get_breathing_store
+from admission import get_admission
+from resilience import breaker_stats, get_breaker
+from upstream_health import get_upstream_health, http_probe, upstream_health
+from audio_response import audio_response
+from audio_quality import CLIENT_HINTS, DEFAULT_QUALITY, CONSTRAINED_QUALITY, TTS_QUALITY_SELECTED, negotiate_quality
+from metrics import (
+    REGISTRY, CONTENT_TYPE, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, RATE_LIMITED, AUDIO_BYTES,
+    InstrumentedThreadPoolExecutor
+)
+from http_client import get_http_client, start_http_clients, prewarm_http_clients, close_http_clients
 from tts_service import get_tts_service, initialize_tts_service
 from openai_service import get_openai_service, initialize_openai_service
+from speech_pipeline import stream_chat_speech, stream_batch_speech
+from fallback_audio import get_fallback_audio, fallback_voices
+from warmup import STARTUP, warm_phrases
 
 # Initialize Rate Limiter
-limiter = Limiter(key_func=get_remote_address)
+# RATE_LIMIT_ENABLED=false lets load tests drive the API from a single address
+# Counters live in the shared state database so every worker enforces the same limits.
+# The check runs on the event loop, so a locked database gives up quickly and the
+# limiter counts in process memory until the database is usable again.
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=rate_limit_storage_uri(),
+    storage_options={"busy_timeout": float(os.getenv("RATE_LIMIT_BUSY_TIMEOUT_SECONDS", "0.1"))},
+    in_memory_fallback_enabled=True,
+    enabled=os.getenv("RATE_LIMIT_ENABLED", "true").lower() not in ("0", "false", "no")
+)
 
 app = FastAPI(title="Sleep Assistant TTS API", version="1.0.0")
 
+# Default executor for asyncio.to_thread; made on startup, as the loop shuts it down when it closes
+thread_pool: Optional[InstrumentedThreadPoolExecutor] = None
+
 # Set up Rate Limiter
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+def _rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+    route = request.scope.get("route")
+    RATE_LIMITED.inc(route=getattr(route, "path", "unmatched"))
+    return _rate_limit_exceeded_handler(request, exc)
+
+app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded)
 
 # Enable CORS for frontend communication
 app.add_middleware(
@@ -36,6 +72,42 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Time every request by route template, so /api/audio/{audio_id} is one series."""
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status)
+        )
+
+@app.middleware("http")
+async def advertise_client_hints(request: Request, call_next):
+    """Ask browsers for the client hints used to pick an audio quality tier."""
+    response = await call_next(request)
+    response.headers["Accept-CH"] = ", ".join(CLIENT_HINTS)
+    return response
+
+def _negotiate_quality(request: Request, requested: Optional[str]) -> str:
+    """Pick the audio quality tier for a TTS request, rejecting unknown tiers with 400."""
+    try:
+        tier, source = negotiate_quality(requested, request.headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    TTS_QUALITY_SELECTED.inc(quality=tier, source=source)
+    return tier
+
 # Trust Forwarded headers from Render's load balancer
 # This is crucial for rate limiting (slowapi) to work correctly behind a proxy
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
@@ -45,6 +117,15 @@ app.add_middleware(ProxyHeadersMiddleware, trusted_hosts="*")
 class TTSRequest(BaseModel):
     text: str
     speaker_name: Optional[str] = "Speaker 1"
+    quality: Optional[str] = None  # "low", "standard" or "high"; negotiated from client hints if omitted
+
+class TTSStreamRequest(TTSRequest):
+    save: bool = True
+
+class TTSBatchRequest(BaseModel):
+    segments: List[str]
+    speaker_name: Optional[str] = "Speaker 1"
+    quality: Optional[str] = None
 
 # Add this to handle OPTIONS requests gracefully for Render/Vercel
 @app.options("/{path:path}")
@@ -62,12 +143,15 @@ class TTSResponse(BaseModel):
     duration: Optional[float] = None
     generation_time: Optional[float] = None
     real_time_factor: Optional[float] = None
+    quality: Optional[str] = None
+    cached: Optional[bool] = None
     error: Optional[str] = None
 
 class HealthResponse(BaseModel):
     status: str
     tts_initialized: bool
     openai_initialized: bool
+    ready: bool = False
     message: str
 
 # OpenAI request/response models
@@ -78,21 +162,38 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     conversation_history: Optional[List[ChatMessage]] = None
+    # Voice and tier of the pre-synthesized audio attached to fallback replies
+    speaker_name: Optional[str] = "Speaker 1"
+    quality: Optional[str] = None
+
+class ChatSpeechRequest(ChatRequest):
+    pass
 
 class ChatResponse(BaseModel):
     success: bool
     response: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    fallback: bool = False
+    audio_id: Optional[str] = None
+    audio_url: Optional[str] = None
     error: Optional[str] = None
 
 class SleepRoutineRequest(BaseModel):
     preferences: str
+    speaker_name: Optional[str] = "Speaker 1"
+    quality: Optional[str] = None
 
 class SleepRoutineResponse(BaseModel):
     success: bool
     routine: Optional[str] = None
+    fallback: bool = False
+    audio_id: Optional[str] = None
+    audio_url: Optional[str] = None
     error: Optional[str] = None
 
 class BreathingSessionRequest(BaseModel):
+    # Anonymous per-browser id; sessions and stats are kept separately for each one
+    client_id: str = Field(min_length=1, max_length=64)
     technique_id: str
     technique_name: str
     cycles_completed: int
@@ -108,55 +209,178 @@ class BreathingSessionResponse(BaseModel):
 tts_initialized = False
 openai_initialized = False
 
+AUDIO_CLEANUP_BATCH = int(os.getenv("AUDIO_CLEANUP_BATCH", "50"))
+AUDIO_CLEANUP_INTERVAL_SECONDS = float(os.getenv("AUDIO_CLEANUP_INTERVAL_SECONDS", "30"))
+SHARED_STATE_PURGE_INTERVAL_SECONDS = 300
+
 async def periodic_cleanup():
-    """Run cleanup task periodically."""
+    """Delete expired audio in small batches, waking up when the next clip is due."""
+    last_purge = time.monotonic()
     while True:
+        removed = 0
         try:
-            cleanup_old_audio_files()
+            removed = await asyncio.to_thread(cleanup_expired_audio, AUDIO_CLEANUP_BATCH)
+            shared = get_shared_state()
+            if shared is not None and time.monotonic() - last_purge >= SHARED_STATE_PURGE_INTERVAL_SECONDS:
+                last_purge = time.monotonic()
+                await asyncio.to_thread(shared.purge_expired)
         except Exception as e:
             print(f"❌ Cleanup task error: {e}")
-        # Run every hour
-        await asyncio.sleep(3600)
+
+        if removed >= AUDIO_CLEANUP_BATCH:
+            # More is due; yield to requests, then keep going
+            await asyncio.sleep(0)
+            continue
+        next_due = await asyncio.to_thread(get_audio_store().expiry.seconds_until_next)
+        delay = AUDIO_CLEANUP_INTERVAL_SECONDS if next_due is None else min(AUDIO_CLEANUP_INTERVAL_SECONDS, next_due)
+        await asyncio.sleep(max(delay, 1.0))
+
+# Initialize TTS service
+def init_tts():
+    global tts_initialized
+    tts_initialized = initialize_tts_service()
+    if tts_initialized:
+        print("✅ TTS Service ready!")
+    else:
+        print("❌ TTS Service failed to initialize")
+
+# Initialize OpenAI service
+def init_openai():
+    global openai_initialized
+    openai_initialized = initialize_openai_service()
+    if openai_initialized:
+        print("✅ OpenAI Service ready!")
+    else:
+        print("❌ OpenAI Service failed to initialize")
+
+async def warm_up():
+    """
+    Initialize the services, then (depending on STARTUP_WARMUP) pre-open
+    upstream connections and pre-synthesize warm clips, and only then
+    report ready. Every phase is timed for /health/ready.
+    """
+    async def run_phase(name: str, fn):
+        try:
+            with STARTUP.phase(name):
+                await asyncio.to_thread(fn)
+        except Exception as e:
+            print(f"❌ Startup phase {name} failed: {e}")
+
+    await asyncio.gather(run_phase("tts_init", init_tts), run_phase("openai_init", init_openai))
+    set_health_probes()
+
+    if STARTUP.mode != "off":
+        if openai_initialized:
+            await run_phase("openai_sdk_preload", get_openai_service().preload)
+        urls = {"unreal": get_tts_service().base_url, "assemblyai": ASSEMBLYAI_STREAMING_BASE_URL}
+        if openai_initialized:
+            urls["openai"] = str(get_openai_service().client.base_url)
+        connections = int(os.getenv("WARMUP_CONNECTIONS", "2"))
+        for name, result in (await prewarm_http_clients(urls, connections)).items():
+            STARTUP.record(f"connect_{name}", result["seconds"], ok=result["ok"],
+                           detail=result.get("error") or f"HTTP {result.get('status')}")
+
+    if STARTUP.mode == "full" and tts_initialized:
+        # Warm the tiers most clients will get: the default and the one for mobile / Save-Data
+        clips = [(phrase, tier) for phrase in warm_phrases() for tier in sorted({DEFAULT_QUALITY, CONSTRAINED_QUALITY})]
+        start = time.perf_counter()
+        synthesized = 0
+        tts_service = get_tts_service()
+        for phrase, tier in clips:
+            try:
+                if await tts_service.text_to_speech(phrase, tts_service.default_voice, tier):
+                    synthesized += 1
+            except Exception as e:
+                print(f"❌ Warm clip failed: {e}")
+        STARTUP.record("warm_clips", time.perf_counter() - start, ok=synthesized == len(clips),
+                       detail=f"{synthesized}/{len(clips)} clips")
+
+    # Degraded mode should be instant from the first request, unless warm-up is off
+    if tts_initialized and STARTUP.mode != "off":
+        await prepare_fallback_audio()
+
+    if tts_initialized and openai_initialized:
+        STARTUP.mark_ready()
+    else:
+        print("❌ Not ready: a service failed to initialize")
+
+    if tts_initialized and STARTUP.mode == "off":
+        await prepare_fallback_audio()
+
+    # Idle upstreams get a first probe so health isn't "unknown" for long; warm-up doesn't count as traffic
+    for name in ("unreal", "openai", "assemblyai"):
+        get_upstream_health(name).refresh()
+
+def set_health_probes():
+    """Give each upstream a free probe, used only while it has no real traffic."""
+    if tts_initialized:
+        get_upstream_health("unreal").set_probe(http_probe("unreal", get_tts_service().base_url))
+    if openai_initialized:
+        get_upstream_health("openai").set_probe(get_openai_service().health_probe())
+    get_upstream_health("assemblyai").set_probe(http_probe("assemblyai", ASSEMBLYAI_STREAMING_BASE_URL))
+
+async def prepare_fallback_audio():
+    """Pin speech for every fallback reply so degraded mode never waits on Unreal Speech."""
+    voices = fallback_voices(get_tts_service())
+    if not voices:
+        return
+    start = time.perf_counter()
+    try:
+        pinned, failed = await get_fallback_audio().prepare(voices)
+        STARTUP.record("fallback_audio", time.perf_counter() - start, ok=not failed,
+                       detail=f"{pinned}/{pinned + failed} clips in {len(voices)} voices")
+    except Exception as e:
+        STARTUP.record("fallback_audio", time.perf_counter() - start, ok=False, detail=str(e))
+        print(f"❌ Fallback audio failed: {e}")
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup."""
-    global tts_initialized, openai_initialized
+    STARTUP.record("imports", time.perf_counter() - _imports_started)
     print("🚀 Starting Sleep Assistant API...")
     
-    # Initialize TTS service in background
-    def init_tts():
-        global tts_initialized
-        tts_initialized = initialize_tts_service()
-        if tts_initialized:
-            print("✅ TTS Service ready!")
-        else:
-            print("❌ TTS Service failed to initialize")
+    # asyncio.to_thread work runs here, counted for /metrics
+    global thread_pool
+    thread_pool = InstrumentedThreadPoolExecutor(thread_name_prefix="sleep-assistant")
+    asyncio.get_running_loop().set_default_executor(thread_pool)
     
-    # Initialize OpenAI service
-    def init_openai():
-        global openai_initialized
-        openai_initialized = initialize_openai_service()
-        if openai_initialized:
-            print("✅ OpenAI Service ready!")
-        else:
-            print("❌ OpenAI Service failed to initialize")
+    # Pooled upstream clients must exist before the services start using them
+    start_http_clients()
     
-    # Run initialization in background to avoid blocking startup
-    asyncio.create_task(asyncio.to_thread(init_tts))
-    asyncio.create_task(asyncio.to_thread(init_openai))
+    # Initialize and warm up in background; /health/ready reports when it's done
+    asyncio.create_task(warm_up())
     
     # Start periodic cleanup
     asyncio.create_task(periodic_cleanup())
+    
+    # Have a voice token ready before the first client asks
+    asyncio.create_task(assemblyai_token_broker.prefetch())
+    
+    # Write logged breathing sessions to disk in batches, off the request path
+    asyncio.create_task(get_breathing_store().run_flusher())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush buffered breathing sessions and close pooled upstream connections on shutdown."""
+    try:
+        await asyncio.to_thread(get_breathing_store().flush)
+    except Exception as e:
+        print(f"❌ Final breathing session flush failed: {e}")
+    await close_http_clients()
+    print("👋 Sleep Assistant API stopped")
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Health check endpoint."""
+    """
+    Health summary. Always 200; use /health/live and /health/ready for probes.
+    """
     both_ready = tts_initialized and openai_initialized
-    status = "healthy" if both_ready else "initializing"
+    status = "healthy" if STARTUP.ready else "initializing"
     
-    if both_ready:
+    if STARTUP.ready:
         message = "All services are ready"
+    elif both_ready:
+        message = "Services initialized, warming up upstream connections..."
     elif tts_initialized and not openai_initialized:
         message = "TTS ready, OpenAI initializing..."
     elif openai_initialized and not tts_initialized:
@@ -168,15 +392,48 @@ async def health_check():
         status=status,
         tts_initialized=tts_initialized,
         openai_initialized=openai_initialized,
+        ready=STARTUP.ready,
         message=message
     )
 
+@app.get("/health/live")
+async def liveness():
+    """
+    Liveness probe: the process is up and its event loop is answering.
+    """
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """
+    Readiness probe: 200 once the services are initialized and warm-up has
+    finished, 503 until then. Includes how long each startup phase took and
+    the upstream circuit breakers, which don't affect readiness.
+    """
+    report = {
+        **STARTUP.as_dict(),
+        "tts_initialized": tts_initialized,
+        "openai_initialized": openai_initialized,
+        "circuits": breaker_stats(),
+    }
+    return JSONResponse(report, status_code=200 if STARTUP.ready else 503)
+
+@app.get("/health/upstreams")
+async def upstreams_health():
+    """
+    Health of OpenAI, Unreal Speech and AssemblyAI from recent real calls,
+    or from a probe sent while an upstream was idle. Answers from cache
+    without calling any upstream; age_seconds says how old each status is.
+    """
+    return upstream_health()
+
 @app.post("/api/tts", response_model=TTSResponse)
 @limiter.limit("60/minute")
 async def text_to_speech(request: Request, body: TTSRequest):
     """
     Convert text to speech using Unreal Speech.
-    Rate limited to 5 requests per minute per IP.
+    The quality tier comes from the body, or else from the Save-Data, ECT and Sec-CH-UA-Mobile client hints.
+    Rate limited to 60 requests per minute per IP.
     """
     if not tts_initialized:
         raise HTTPException(
@@ -190,14 +447,16 @@ async def text_to_speech(request: Request, body: TTSRequest):
     if len(body.text) > 10000:
         raise HTTPException(status_code=400, detail="Text is too long (max 10000 characters)")
     
+    quality = _negotiate_quality(request, body.quality)
+    
     try:
         # Get TTS service and generate audio
         tts_service = get_tts_service()
-        result = await asyncio.to_thread(
-            tts_service.text_to_speech, 
-            body.text, 
-            body.speaker_name
-        )
+
+        # Serve identical requests straight from the cache before touching upstream
+        result = await tts_service.lookup_cached(body.text, body.speaker_name, quality)
+        if result is None:
+            result = await tts_service.synthesize(body.text, body.speaker_name, quality)
         
         if result is None:
             return TTSResponse(
@@ -214,9 +473,13 @@ async def text_to_speech(request: Request, body: TTSRequest):
             audio_url=audio_url,
             duration=result['duration'],
             generation_time=result['generation_time'],
-            real_time_factor=result['real_time_factor']
+            real_time_factor=result['real_time_factor'],
+            quality=result['quality'],
+            cached=result['cached']
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ TTS API Error: {e}")
         return TTSResponse(
@@ -224,25 +487,175 @@ async def text_to_speech(request: Request, body: TTSRequest):
             error=str(e)
         )
 
+TTS_BATCH_MAX_SEGMENTS = int(os.getenv("TTS_BATCH_MAX_SEGMENTS", "50"))
+TTS_BATCH_MAX_CHARACTERS = int(os.getenv("TTS_BATCH_MAX_CHARACTERS", "50000"))
+TTS_BATCH_PARALLELISM = int(os.getenv("TTS_BATCH_PARALLELISM", "4"))
+# Batches are limited by characters synthesized rather than by request count
+TTS_BATCH_CHARACTER_LIMIT = os.getenv("TTS_BATCH_CHARACTER_LIMIT", "60000/minute")
+
+async def _count_batch_characters(request: Request):
+    """Note the batch's size on the request so the rate limiter can charge per character."""
+    try:
+        payload = await request.json()
+        segments = payload.get("segments") or []
+        request.state.tts_characters = sum(len(text) for text in segments if isinstance(text, str))
+    except Exception:
+        request.state.tts_characters = 0
+
+def _batch_character_cost(request: Request) -> int:
+    return max(1, getattr(request.state, "tts_characters", 1))
+
+@app.post("/api/tts/batch", dependencies=[Depends(_count_batch_characters)])
+@limiter.limit(TTS_BATCH_CHARACTER_LIMIT, cost=_batch_character_cost)
+async def text_to_speech_batch(request: Request, body: TTSBatchRequest):
+    """
+    Synthesize an ordered list of segments in one request.
+    Segments run with bounded parallelism and are reported as they finish,
+    as NDJSON (or Server-Sent Events with Accept: text/event-stream),
+    ending with a "manifest" event listing audio ids and durations in order.
+    Rate limited by characters synthesized per IP.
+    """
+    if not tts_initialized:
+        raise HTTPException(
+            status_code=503, 
+            detail="TTS service is not initialized yet. Please wait and try again."
+        )
+    
+    if not body.segments:
+        raise HTTPException(status_code=400, detail="Segments cannot be empty")
+    
+    if len(body.segments) > TTS_BATCH_MAX_SEGMENTS:
+        raise HTTPException(status_code=400, detail=f"Too many segments (max {TTS_BATCH_MAX_SEGMENTS})")
+    
+    if any(not text.strip() for text in body.segments):
+        raise HTTPException(status_code=400, detail="Segments cannot be empty")
+    
+    if any(len(text) > 10000 for text in body.segments):
+        raise HTTPException(status_code=400, detail="Segment is too long (max 10000 characters)")
+    
+    if sum(len(text) for text in body.segments) > TTS_BATCH_MAX_CHARACTERS:
+        raise HTTPException(status_code=400, detail=f"Batch is too long (max {TTS_BATCH_MAX_CHARACTERS} characters)")
+    
+    quality = _negotiate_quality(request, body.quality)
+    use_sse = "text/event-stream" in request.headers.get("accept", "")
+    events = stream_batch_speech(get_tts_service(), body.segments, body.speaker_name, TTS_BATCH_PARALLELISM, quality)
+    
+    async def event_source():
+        try:
+            async for event in events:
+                if await request.is_disconnected():
+                    print("⚠️ TTS batch client disconnected, cancelling remaining segments")
+                    break
+                yield _sse_event(event) if use_sse else json.dumps(event) + "\n"
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream" if use_sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _stream_tts(request: Request, text: str, speaker_name: Optional[str], save: bool,
+                      quality: Optional[str]) -> StreamingResponse:
+    """Open an Unreal Speech stream and pipe its bytes to the client as they arrive."""
+    if not tts_initialized:
+        raise HTTPException(
+            status_code=503, 
+            detail="TTS service is not initialized yet. Please wait and try again."
+        )
+    
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+    
+    if len(text) > 10000:
+        raise HTTPException(status_code=400, detail="Text is too long (max 10000 characters)")
+    
+    quality = _negotiate_quality(request, quality)
+    tts_service = get_tts_service()
+    opened = await tts_service.open_stream(text, speaker_name, save, quality)
+    if opened is None:
+        raise HTTPException(status_code=502, detail="Failed to start audio stream")
+    
+    audio_id, cached, chunks = opened
+    headers = {
+        "Cache-Control": "no-store",
+        "X-Audio-Id": audio_id,
+        "X-TTS-Cached": "true" if cached else "false",
+        "X-Audio-Quality": quality,
+        # The tier, and so the bytes, can depend on the client hints
+        "Vary": ", ".join(CLIENT_HINTS),
+    }
+    if save or cached:
+        headers["X-Audio-Url"] = f"/api/audio/{audio_id}"
+    
+    return StreamingResponse(_count_served(chunks), media_type="audio/mpeg", headers=headers)
+
+async def _count_served(chunks):
+    """Pass audio chunks through while counting the bytes sent to the client."""
+    source = chunks if hasattr(chunks, "__aiter__") else iterate_in_threadpool(chunks)
+    try:
+        async for chunk in source:
+            AUDIO_BYTES.inc(len(chunk), direction="served")
+            yield chunk
+    finally:
+        if hasattr(chunks, "aclose"):
+            await chunks.aclose()
+
+@app.post("/api/tts/stream")
+@limiter.limit("60/minute")
+async def text_to_speech_stream(request: Request, body: TTSStreamRequest):
+    """
+    Stream synthesized speech as chunked audio/mpeg while Unreal Speech is still generating it.
+    The clip is saved for replay via /api/audio unless save is false.
+    """
+    return await _stream_tts(request, body.text, body.speaker_name, body.save, body.quality)
+
+@app.get("/api/tts/stream")
+@limiter.limit("60/minute")
+async def text_to_speech_stream_get(request: Request, text: str, speaker_name: Optional[str] = "Speaker 1",
+                                    save: bool = True, quality: Optional[str] = None):
+    """
+    GET variant of /api/tts/stream so it can be used directly as an <audio> source.
+    """
+    return await _stream_tts(request, text, speaker_name, save, quality)
+
+@app.get("/api/tts/cache")
+async def tts_cache_stats():
+    """
+    Report hit/miss counters and disk usage of the TTS audio cache.
+    """
+    tts_service = get_tts_service()
+    return {
+        **tts_service.cache.stats(),
+        "single_flight": tts_service.inflight.stats(),
+        "store": get_audio_store().stats(),
+        "fallback_audio": get_fallback_audio().stats(),
+    }
+
 @app.get("/api/audio/{audio_id}")
-async def get_audio(audio_id: str):
+async def get_audio(request: Request, audio_id: str):
     """
-    Serve generated audio files.
+    Serve generated audio, from memory when the clip is hot and from disk otherwise.
+    Responses carry a content-hash ETag and support conditional and byte-range requests.
     """
     try:
-        # Construct file path
-        temp_dir = tempfile.gettempdir()
-        audio_path = os.path.join(temp_dir, f"tts_{audio_id}.mp3")
-        
-        if not os.path.exists(audio_path):
+        store = get_audio_store()
+        # An object-tier hit is copied to disk and tracked for expiry
+        data, audio_path = await asyncio.to_thread(store.locate, audio_id)
+        if data is None and audio_path is None:
             raise HTTPException(status_code=404, detail="Audio file not found")
+
+        # Clips that are still being played stay around for another TTL
+        store.touch(audio_id)
+        etag = await asyncio.to_thread(store.etag, audio_id)
+        if etag is None:
+            raise HTTPException(status_code=404, detail="Audio file not found")
+
+        return await audio_response(request, audio_id, etag, data=data, path=audio_path)
         
-        return FileResponse(
-            audio_path,
-            media_type="audio/mpeg",
-            filename=f"tts_{audio_id}.mp3"
-        )
-        
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Audio serving error: {e}")
         raise HTTPException(status_code=500, detail="Failed to serve audio file")
@@ -253,11 +666,12 @@ async def delete_audio(audio_id: str):
     Delete a generated audio file to free up space.
     """
     try:
-        temp_dir = tempfile.gettempdir()
-        audio_path = os.path.join(temp_dir, f"tts_{audio_id}.mp3")
-        
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
+        # Cached and pinned clips are shared between clients, so leave them to LRU eviction
+        store = get_audio_store()
+        if get_tts_service().cache.contains(audio_id) or await asyncio.to_thread(store.is_pinned, audio_id):
+            return {"success": True, "message": "Audio file is cached and will be evicted automatically"}
+
+        if await asyncio.to_thread(store.delete, audio_id):
             return {"success": True, "message": "Audio file deleted"}
         else:
             return {"success": False, "message": "Audio file not found"}
@@ -295,16 +709,23 @@ async def chat_with_ai(request: Request, body: ChatRequest):
                 for msg in body.conversation_history
             ]
         
-        response_text = await openai_service.generate_response(
+        reply = await openai_service.generate_reply(
             body.message, 
             conversation_history
         )
+        audio = _fallback_audio_for(request, reply["response"], body.speaker_name, body.quality) if reply["fallback"] else {}
         
         return ChatResponse(
             success=True,
-            response=response_text
+            response=reply["response"],
+            prompt_tokens=reply["prompt_tokens"],
+            fallback=reply["fallback"],
+            audio_id=audio.get("audio_id"),
+            audio_url=audio.get("audio_url")
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ OpenAI Chat API Error: {e}")
         return ChatResponse(
@@ -312,12 +733,124 @@ async def chat_with_ai(request: Request, body: ChatRequest):
             error=str(e)
         )
 
+def _fallback_audio_for(request: Request, text: str, speaker_name: Optional[str],
+                        quality: Optional[str]) -> Dict[str, Any]:
+    """Pinned audio for a fallback text in the client's voice and tier, or {} if there is none."""
+    # Not counted as a quality selection: pinned fallback audio never reaches Unreal Speech
+    if not tts_initialized:
+        return {}
+    try:
+        tier = negotiate_quality(quality, request.headers)[0]
+    except ValueError:
+        return {}
+    return get_fallback_audio().lookup(text, speaker_name, tier) or {}
+
+def _sse_event(event: Dict[str, Any]) -> str:
+    """Format a pipeline event as a Server-Sent Events message."""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+def _history_as_dicts(history: Optional[List[ChatMessage]]) -> Optional[List[Dict[str, str]]]:
+    if not history:
+        return None
+    return [{"role": msg.role, "content": msg.content} for msg in history]
+
+@app.post("/api/chat/stream")
+@limiter.limit("10/minute")
+async def chat_with_ai_stream(request: Request, body: ChatRequest):
+    """
+    Stream a chat reply as Server-Sent Events.
+    Emits "token" events as text arrives and a final "done" event with usage and timing.
+    Rate limited to 10 requests per minute per IP.
+    """
+    if not openai_initialized:
+        raise HTTPException(
+            status_code=503, 
+            detail="OpenAI service is not initialized yet. Please wait and try again."
+        )
+    
+    if not body.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    openai_service = get_openai_service()
+    conversation_history = _history_as_dicts(body.conversation_history)
+    # Take the OpenAI slot up front so an overloaded server answers 503 instead of starting a stream
+    ticket = await get_admission("openai").acquire()
+    
+    async def event_source():
+        events = openai_service.stream_response(body.message, conversation_history)
+        try:
+            async for event in events:
+                if await request.is_disconnected():
+                    print("⚠️ Chat stream client disconnected, cancelling upstream request")
+                    break
+                if event.get("fallback") and event["type"] == "token":
+                    event = {**event, **_fallback_audio_for(request, event["content"], body.speaker_name, body.quality)}
+                yield _sse_event(event)
+        finally:
+            # Closing the generator closes the upstream OpenAI stream
+            await events.aclose()
+            ticket.release()
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/chat/speech")
+@limiter.limit("10/minute")
+async def chat_with_ai_speech(request: Request, body: ChatSpeechRequest):
+    """
+    Stream a chat reply together with its speech as Server-Sent Events.
+    Each sentence is synthesized while later tokens are still being generated,
+    and "audio" events arrive in sentence order as soon as they are playable.
+    Rate limited to 10 requests per minute per IP.
+    """
+    if not openai_initialized or not tts_initialized:
+        raise HTTPException(
+            status_code=503, 
+            detail="Chat and TTS services are not initialized yet. Please wait and try again."
+        )
+    
+    if not body.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    quality = _negotiate_quality(request, body.quality)
+    ticket = await get_admission("openai").acquire()
+    events = stream_chat_speech(
+        get_openai_service(),
+        get_tts_service(),
+        body.message,
+        _history_as_dicts(body.conversation_history),
+        body.speaker_name,
+        quality=quality,
+        fallback_audio=get_fallback_audio()
+    )
+    
+    async def event_source():
+        try:
+            async for event in events:
+                if await request.is_disconnected():
+                    print("⚠️ Chat speech client disconnected, cancelling upstream requests")
+                    break
+                yield _sse_event(event)
+        finally:
+            await events.aclose()
+            ticket.release()
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/sleep-routine", response_model=SleepRoutineResponse)
-@limiter.limit("3/minute")
+@limiter.limit("10/minute")
 async def generate_sleep_routine(request: Request, body: SleepRoutineRequest):
     """
     Generate a personalized sleep routine using OpenAI GPT-5 Nano.
-    Rate limited to 3 requests per minute per IP.
+    Routines for similar preferences are served from a rotating cache.
+    Rate limited to 10 requests per minute per IP.
     """
     if not openai_initialized:
         raise HTTPException(
@@ -331,13 +864,19 @@ async def generate_sleep_routine(request: Request, body: SleepRoutineRequest):
     try:
         # Get OpenAI service and generate routine
         openai_service = get_openai_service()
-        routine_text = await openai_service.generate_sleep_routine(body.preferences)
+        reply = await openai_service.generate_routine_reply(body.preferences)
+        audio = _fallback_audio_for(request, reply["routine"], body.speaker_name, body.quality) if reply["fallback"] else {}
         
         return SleepRoutineResponse(
             success=True,
-            routine=routine_text
+            routine=reply["routine"],
+            fallback=reply["fallback"],
+            audio_id=audio.get("audio_id"),
+            audio_url=audio.get("audio_url")
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ OpenAI Sleep Routine API Error: {e}")
         return SleepRoutineResponse(
@@ -345,10 +884,21 @@ async def generate_sleep_routine(request: Request, body: SleepRoutineRequest):
             error=str(e)
         )
 
+@app.get("/api/sleep-routine/cache")
+async def sleep_routine_cache_stats():
+    """
+    Report hit/miss counters of the sleep routine cache.
+    """
+    if not openai_initialized:
+        return {"keys": 0, "variants": 0, "hits": 0, "misses": 0, "hit_rate": 0.0}
+    service = get_openai_service()
+    return {**service.routine_cache.stats(), "single_flight": service.routine_flight.stats()}
+
 @app.get("/api/openai/health")
 async def openai_health_check():
     """
-    Check OpenAI service health.
+    Check OpenAI service health from recent chat traffic, or an idle-time
+    probe. Answers from cache; this never spends tokens.
     """
     if not openai_initialized:
         return {
@@ -358,7 +908,7 @@ async def openai_health_check():
     
     try:
         openai_service = get_openai_service()
-        health_status = await openai_service.check_health()
+        health_status = openai_service.check_health()
         return health_status
     except Exception as e:
         return {
@@ -366,36 +916,35 @@ async def openai_health_check():
             "message": f"Health check failed: {str(e)}"
         }
 
-def cleanup_old_audio_files():
-    """Clean up old audio files (older than 1 hour)."""
-    import time
-    temp_dir = tempfile.gettempdir()
-    current_time = time.time()
-    
-    for filename in os.listdir(temp_dir):
-        if filename.startswith("tts_") and (filename.endswith(".wav") or filename.endswith(".mp3")):
-            file_path = os.path.join(temp_dir, filename)
-            try:
-                file_age = current_time - os.path.getctime(file_path)
-                if file_age > 3600:  # 1 hour
-                    os.remove(file_path)
-                    print(f"🗑️ Cleaned up old audio file: {filename}")
-            except Exception as e:
-                print(f"❌ Failed to clean up {filename}: {e}")
+def cleanup_expired_audio(limit: int = 50) -> int:
+    """
+    Delete up to limit audio clips whose TTL has passed, or that push the
+    local disk over its cap. Clips are taken from the store's expiry index,
+    so this never lists the audio directory.
+
+    Returns:
+        Number of clips taken off the expiry index in this batch
+    """
+    store = get_audio_store()
+    removed, freed = store.expire_due(limit)
+    AUDIO_BYTES.inc(freed, direction="cleaned")
+    if removed:
+        print(f"🗑️ Cleaned up {removed} expired audio files ({freed} bytes)")
+    return removed
 
 @app.post("/api/breathing-session", response_model=BreathingSessionResponse)
 async def log_breathing_session(request: BreathingSessionRequest):
     """
     Log a completed breathing exercise session.
-    Note: Data is stateless and not persisted.
+    The session is buffered in memory and written to disk by the background flusher.
     """
     try:
-        # We don't save data anymore, just log to console
+        get_breathing_store().log(request.client_id, request.model_dump())
         print(f"✅ User completed breathing session: {request.technique_name} - {request.cycles_completed} cycles")
         
         return BreathingSessionResponse(
             success=True,
-            message=f"Session logged successfully (stateless)"
+            message="Session logged successfully"
         )
         
     except Exception as e:
@@ -406,53 +955,242 @@ async def log_breathing_session(request: BreathingSessionRequest):
         )
 
 @app.get("/api/breathing-sessions")
-async def get_breathing_sessions():
+async def get_breathing_sessions(client_id: str = Query(min_length=1, max_length=64), limit: int = 20):
     """
-    Get recent breathing exercise sessions.
-    Note: Always returns empty list as we are stateless.
+    Get a client's most recent breathing exercise sessions, oldest first.
+    total_sessions comes from the per-technique rollups, not a table scan.
     """
+    store = get_breathing_store()
+    limit = max(1, min(limit, 200))
+    sessions, summary = await asyncio.gather(
+        asyncio.to_thread(store.recent, client_id, limit),
+        asyncio.to_thread(store.summary, client_id, 1)
+    )
     return {
         "success": True,
-        "sessions": [],
-        "total_sessions": 0
+        "sessions": sessions,
+        "total_sessions": summary["total_sessions"]
     }
 
-@app.get("/api/assemblyai/token")
-@limiter.limit("5/minute")
-async def get_assemblyai_token(request: Request):
+@app.get("/api/breathing-stats")
+async def get_breathing_stats(client_id: str = Query(min_length=1, max_length=64), days: int = 30):
     """
-    Generate a temporary token for AssemblyAI streaming (v2/v3).
+    Totals and per-technique stats for a client's logged sessions, plus daily
+    stats for the last `days` days, read from incrementally maintained rollups.
     """
-    try:
+    summary = await asyncio.to_thread(get_breathing_store().summary, client_id, max(1, min(days, 366)))
+    return {"success": True, **summary}
+
+ASSEMBLYAI_STREAMING_BASE_URL = os.getenv("ASSEMBLYAI_STREAMING_BASE_URL", "https://streaming.assemblyai.com").rstrip("/")
+
+class AssemblyAITokenBroker:
+    """
+    Shares temporary AssemblyAI streaming tokens between clients.
+
+    Concurrent requests wait on a single in-flight upstream call, a token is
+    handed out to every client while it still has at least min_remaining
+    seconds to live, and once it drops below refresh_margin a replacement is
+    fetched in the background so callers never wait on AssemblyAI. Fetched
+    tokens are published to shared state, so other workers adopt them
+    instead of each asking AssemblyAI for their own.
+    """
+
+    def __init__(self, lifetime: int = 600, min_remaining: int = 120, refresh_margin: int = 300):
+        self.lifetime = lifetime
+        self.min_remaining = min_remaining
+        self.refresh_margin = refresh_margin
+        self._payload: Optional[Dict[str, Any]] = None
+        self._expires_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self.upstream_calls = 0
+        self.served = 0
+
+    def _remaining(self) -> float:
+        return self._expires_at - time.monotonic()
+
+    def _response(self) -> Dict[str, Any]:
+        self.served += 1
+        return {**self._payload, "expires_in_seconds": int(self._remaining())}
+
+    def _adopt_shared(self, shared) -> bool:
+        """Take over a token another worker fetched, if it is fresh enough."""
+        cached = shared.get("assemblyai", "token")
+        if cached is None:
+            return False
+        remaining = cached["expires_at"] - time.time()
+        if remaining < self.refresh_margin:
+            return False
+        self._payload = cached["payload"]
+        self._expires_at = time.monotonic() + remaining
+        return True
+
+    async def _fetch(self) -> None:
         api_key = os.getenv("ASSEMBLYAI_API_KEY")
         if not api_key:
             raise HTTPException(status_code=500, detail="ASSEMBLYAI_API_KEY not set")
 
+        shared = get_shared_state()
+        if shared is not None and self._adopt_shared(shared):
+            return
+
         # Use v3 Streaming API token endpoint as per documentation
         # expires_in_seconds must be between 1 and 600 (10 minutes)
-        response = requests.get(
-            "https://streaming.assemblyai.com/v3/token",
-            headers={"Authorization": api_key},
-            params={"expires_in_seconds": 600}
-        )
+        client = get_http_client("assemblyai")
+        requested_at = time.monotonic()
+        get_breaker("assemblyai").check()
+        self.upstream_calls += 1
+        async with get_admission("assemblyai").slot():
+            response = await client.get(
+                f"{ASSEMBLYAI_STREAMING_BASE_URL}/v3/token",
+                headers={"Authorization": api_key},
+                params={"expires_in_seconds": self.lifetime}
+            )
         
         if response.status_code != 200:
             print(f"❌ AssemblyAI token failed: {response.status_code} - {response.text}")
 
         response.raise_for_status()
-        return response.json()
+        self._payload = response.json()
+        # Count the lifetime from when we asked, so we never overestimate it
+        self._expires_at = requested_at + self.lifetime
+        if shared is not None:
+            await asyncio.to_thread(shared.set, "assemblyai", "token",
+                                    {"payload": self._payload, "expires_at": time.time() + self._remaining()},
+                                    ttl=self._remaining())
+
+    def _refresh(self) -> asyncio.Task:
+        """Start an upstream fetch unless one is already in flight."""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._fetch())
+            self._inflight.add_done_callback(self._log_refresh_error)
+        return self._inflight
+
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ AssemblyAI token refresh failed: {task.exception()}")
+
+    async def get_token(self) -> Dict[str, Any]:
+        """Return a shared token, fetching one only when none is usable."""
+        remaining = self._remaining() if self._payload else 0.0
+        if remaining >= self.min_remaining:
+            if remaining < self.refresh_margin:
+                self._refresh()
+            return self._response()
+
+        try:
+            # Shield so a client disconnecting doesn't cancel the fetch other clients wait on
+            await asyncio.shield(self._refresh())
+        except Exception:
+            # Fall back to a token that is short on time but still valid
+            if self._payload and self._remaining() > 0:
+                return self._response()
+            raise
+        return self._response()
+
+    async def prefetch(self):
+        """Warm the broker so the first voice session doesn't wait on AssemblyAI."""
+        if not os.getenv("ASSEMBLYAI_API_KEY"):
+            return
+        try:
+            await self._refresh()
+            print("✅ AssemblyAI token prefetched")
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "has_token": self._payload is not None,
+            "expires_in_seconds": max(0, int(self._remaining())) if self._payload else 0,
+            "upstream_calls": self.upstream_calls,
+            "tokens_served": self.served,
+        }
+
+assemblyai_token_broker = AssemblyAITokenBroker()
+
+@app.get("/api/assemblyai/token")
+@limiter.limit("30/minute")
+async def get_assemblyai_token(request: Request):
+    """
+    Get a temporary token for AssemblyAI streaming (v2/v3).
+    Tokens are shared between clients and refreshed in the background.
+    """
+    try:
+        return await assemblyai_token_broker.get_token()
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ AssemblyAI token error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Metrics read from existing counters when /metrics is scraped
+def _cache_samples():
+    tts_stats = get_tts_service().cache.stats()
+    yield {"cache": "tts_audio", "result": "hit"}, tts_stats["hits"]
+    yield {"cache": "tts_audio", "result": "miss"}, tts_stats["misses"]
+    if openai_initialized:
+        service = get_openai_service()
+        routine_stats = service.routine_cache.stats()
+        yield {"cache": "sleep_routine", "result": "hit"}, routine_stats["hits"]
+        yield {"cache": "sleep_routine", "result": "miss"}, routine_stats["misses"]
+        yield {"cache": "history_summary", "result": "hit"}, service.history_manager.summary_hits
+        yield {"cache": "history_summary", "result": "miss"}, service.history_manager.summary_misses
+
+def _thread_pool_samples():
+    if thread_pool is None:
+        return
+    yield {"state": "max"}, thread_pool.max_workers
+    yield {"state": "busy"}, thread_pool.running
+
+def _audio_store_samples():
+    store_stats = get_audio_store().stats()
+    yield {"tier": "memory"}, store_stats["memory"]["total_bytes"]
+    yield {"tier": "disk"}, store_stats["expiry"]["total_bytes"]
+
+REGISTRY.collector("sleep_assistant_cache_requests_total",
+                   "Cache lookups by cache and result.", "counter", _cache_samples)
+REGISTRY.collector("sleep_assistant_thread_pool_workers",
+                   "Worker threads of the default executor used by asyncio.to_thread.", "gauge", _thread_pool_samples)
+REGISTRY.collector("sleep_assistant_thread_pool_queue_depth",
+                   "Work items waiting for a free executor thread.", "gauge",
+                   lambda: [({}, thread_pool.queued if thread_pool is not None else 0)])
+REGISTRY.collector("sleep_assistant_event_loop_tasks",
+                   "Tasks currently scheduled on the event loop.", "gauge",
+                   lambda: [({}, len(asyncio.all_tasks()))])
+REGISTRY.collector("sleep_assistant_audio_store_bytes",
+                   "Bytes of audio held locally, by tier.", "gauge", _audio_store_samples)
+REGISTRY.collector("sleep_assistant_breathing_sessions_buffered",
+                   "Logged breathing sessions waiting for the next flush to disk.", "gauge",
+                   lambda: [({}, get_breathing_store().stats()["buffered"])])
+REGISTRY.collector("sleep_assistant_assemblyai_tokens_served_total",
+                   "AssemblyAI streaming tokens handed to clients.", "counter",
+                   lambda: [({}, assemblyai_token_broker.served)])
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Expose request, upstream, audio, cache and rate-limit metrics in the Prometheus text format.
+    """
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
 
 if __name__ == "__main__":
-    print("🎙️ Starting Sleep Assistant TTS Server...")
-    # For production, you should use gunicorn or similar
+    # WEB_CONCURRENCY > 1 runs several worker processes that share rate limits and
+    # caches through the shared state database. It defaults to one because /metrics
+    # is still per process. DEV_RELOAD=true runs the auto-reloading dev server.
+    reload = os.getenv("DEV_RELOAD", "false").lower() in ("1", "true", "yes")
+    workers = 1 if reload else max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    # Workers read it to split the admission limits between them
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    if workers > 1:
+        print("⚠️ /metrics reports only the worker that answers the scrape")
+        if get_shared_state() is None:
+            print("⚠️ SHARED_STATE_PATH is off: each worker keeps its own rate limits and caches")
+    print(f"🎙️ Starting Sleep Assistant TTS Server with {workers} worker(s)...")
     uvicorn.run(
         "main:app",
         host="0.0.0.0", # Updated for potential Docker usage
-        port=8000,
-        reload=True,
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        reload=reload,
         log_level="info"
     )
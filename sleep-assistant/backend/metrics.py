@@ -0,0 +1,319 @@
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterable
+
+import httpx
+
+# Default latency buckets in seconds, from cache hits up to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, one series per label combination."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, such as requests currently in flight."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed observations (usually durations in seconds)."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[LabelValues, List[float]] = {}  # bucket counts..., sum, count
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in items:
+            labels = self._labels(key)
+            for bound, count in zip(self.buckets, series):
+                bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {_format_value(count)}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {_format_value(series[-1])}")
+        return lines
+
+
+class _Collected(_Metric):
+    """Metric whose samples are read from existing state at scrape time."""
+
+    def __init__(self, name: str, documentation: str, metric_type: str, collect: Callable[[], Iterable[Sample]]):
+        super().__init__(name, documentation)
+        self.type = metric_type
+        self.collect = collect
+
+    def _render_samples(self) -> List[str]:
+        try:
+            samples = list(self.collect())
+        except Exception:
+            # A half-initialized service must not break the whole scrape
+            return []
+        return [f"{self.name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples]
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, name: str, documentation: str, metric_type: str,
+                  collect: Callable[[], Iterable[Sample]]):
+        """
+        Register a metric computed at scrape time from (labels, value) samples.
+
+        Registering the same name again replaces the collector: worker processes
+        import main.py twice (as __mp_main__ and as main), and only the copy
+        serving requests should be read.
+        """
+        self._metrics[name] = _Collected(name, documentation, metric_type, collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "sleep_assistant_http_request_duration_seconds",
+    "Time until response headers were sent, by route template, method and status.",
+    ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "sleep_assistant_http_requests_in_flight",
+    "Requests currently being handled.",
+)
+UPSTREAM_REQUEST_DURATION = REGISTRY.histogram(
+    "sleep_assistant_upstream_request_duration_seconds",
+    "Time until upstream response headers arrived, by upstream and status (\"error\" if no response).",
+    ("upstream", "status"),
+)
+UPSTREAM_IN_FLIGHT = REGISTRY.gauge(
+    "sleep_assistant_upstream_requests_in_flight",
+    "Upstream requests waiting for response headers.",
+    ("upstream",),
+)
+AUDIO_BYTES = REGISTRY.counter(
+    "sleep_assistant_audio_bytes_total",
+    "Bytes of MP3 audio generated by the TTS upstream, served to clients, or cleaned up from disk.",
+    ("direction",),
+)
+RATE_LIMITED = REGISTRY.counter(
+    "sleep_assistant_rate_limited_total",
+    "Requests rejected by the per-client rate limiter.",
+    ("route",),
+)
+FALLBACK_RESPONSES = REGISTRY.counter(
+    "sleep_assistant_fallback_responses_total",
+    "Canned responses served because the OpenAI call failed.",
+    ("kind",),
+)
+
+TTS_REAL_TIME_FACTOR = REGISTRY.histogram(
+    "sleep_assistant_tts_real_time_factor",
+    "Synthesis time divided by audio duration for newly generated clips, by voice.",
+    ("voice",),
+    buckets=(0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0),
+)
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Wraps an httpx transport to record latency, status and concurrency per upstream."""
+
+    def __init__(self, upstream: str, transport: httpx.AsyncBaseTransport):
+        self.upstream = upstream
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        UPSTREAM_IN_FLIGHT.inc(upstream=self.upstream)
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = await self.transport.handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            UPSTREAM_IN_FLIGHT.dec(upstream=self.upstream)
+            UPSTREAM_REQUEST_DURATION.observe(time.perf_counter() - start, upstream=self.upstream, status=status)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class InstrumentedThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    Thread pool that counts its own queued and running work items.
+
+    Installed as the event loop's default executor, so everything run with
+    asyncio.to_thread or run_in_executor(None, ...) is counted.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, thread_name_prefix: str = ""):
+        # Same default as ThreadPoolExecutor, kept here so it can be reported
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        super().__init__(max_workers=self.max_workers, thread_name_prefix=thread_name_prefix)
+        self._counts_lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        started = False
+
+        def run():
+            nonlocal started
+            with self._counts_lock:
+                started = True
+                self.queued -= 1
+                self.running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._counts_lock:
+                    self.running -= 1
+
+        def cancelled(future: Future):
+            # Work cancelled while still queued never reaches run()
+            with self._counts_lock:
+                if not started:
+                    self.queued -= 1
+
+        with self._counts_lock:
+            self.queued += 1
+        try:
+            future = super().submit(run)
+        except BaseException:
+            with self._counts_lock:
+                self.queued -= 1
+            raise
+        future.add_done_callback(cancelled)
+        return future
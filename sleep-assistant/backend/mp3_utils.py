@@ -0,0 +1,197 @@
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+
+# Bitrates in kbps indexed by [version_key][layer][bitrate_index]
+_BITRATES = {
+    "1": {
+        1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+        2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+        3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    },
+    "2": {
+        1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+        2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+        3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    },
+}
+
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG 1
+    2: [22050, 24000, 16000],  # MPEG 2
+    0: [11025, 12000, 8000],   # MPEG 2.5
+}
+
+
+def parse_frame_header(data: bytes, offset: int = 0) -> Optional[Dict[str, Any]]:
+    """
+    Parse the 4-byte MPEG audio frame header at offset.
+
+    Returns:
+        Dictionary with version, layer, bitrate, sample_rate, channels,
+        samples and frame_length, or None if there is no valid header there
+    """
+    if offset + 4 > len(data):
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0x03
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    layer = 4 - layer_bits
+    version_key = "1" if version_bits == 3 else "2"
+    bitrate = _BITRATES[version_key][layer][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+
+    if layer == 1:
+        samples = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or version_key == "1":
+        samples = 1152
+        frame_length = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 576
+        frame_length = 72 * bitrate // sample_rate + padding
+
+    return {
+        "version": {3: "1", 2: "2", 0: "2.5"}[version_bits],
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "channels": 1 if (b3 >> 6) == 3 else 2,
+        "samples": samples,
+        "frame_length": frame_length,
+    }
+
+
+def id3v2_size(data: bytes) -> int:
+    """Return the total size of a leading ID3v2 tag, or 0 if there is none."""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = 0
+    for b in data[6:10]:
+        size = (size << 7) | (b & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _side_info_size(header: Dict[str, Any]) -> int:
+    if header["version"] == "1":
+        return 17 if header["channels"] == 1 else 32
+    return 9 if header["channels"] == 1 else 17
+
+
+def is_info_frame(data: bytes, offset: int, header: Dict[str, Any]) -> bool:
+    """Whether the frame at offset is a Xing/Info/VBRI metadata frame rather than audio."""
+    tag_offset = offset + 4 + _side_info_size(header)
+    if data[tag_offset:tag_offset + 4] in (b"Xing", b"Info"):
+        return True
+    return data[offset + 36:offset + 40] == b"VBRI"
+
+
+def iter_frames(data: bytes) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Yield (offset, header) for every MPEG audio frame in data.
+
+    Leading ID3v2 tags are skipped, and the scanner resynchronizes byte by
+    byte over garbage. Scanning stops at a trailing ID3v1 tag or a frame
+    that runs past the end of the data.
+    """
+    offset = id3v2_size(data)
+    end = len(data)
+    if end >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+
+    while offset + 4 <= end:
+        header = parse_frame_header(data, offset)
+        if header is None or header["frame_length"] <= 0:
+            offset += 1
+            continue
+        if offset + header["frame_length"] > end:
+            break
+        yield offset, header
+        offset += header["frame_length"]
+
+
+def audio_frames(data: bytes) -> bytes:
+    """Return only the audio frames of an MP3, without tags or Xing/Info frames."""
+    parts: List[bytes] = []
+    for offset, header in iter_frames(data):
+        if is_info_frame(data, offset, header):
+            continue
+        parts.append(data[offset:offset + header["frame_length"]])
+    return b"".join(parts)
+
+
+def concat_mp3(clips: List[bytes]) -> bytes:
+    """
+    Join MP3 clips into one continuous stream of frames.
+
+    Tags and per-clip Xing/Info frames are dropped, since their frame counts
+    would describe only the first clip and make players stop or mis-seek.
+    The clips are otherwise joined at frame boundaries with no re-encoding.
+    """
+    if len(clips) == 1:
+        return clips[0]
+    return b"".join(audio_frames(clip) for clip in clips)
+
+
+def _info_frame_count(data: bytes, offset: int, header: Dict[str, Any]) -> Optional[int]:
+    """Audio frame count stored in a Xing/Info or VBRI frame, if present."""
+    tag_offset = offset + 4 + _side_info_size(header)
+    if data[tag_offset:tag_offset + 4] in (b"Xing", b"Info"):
+        flags = int.from_bytes(data[tag_offset + 4:tag_offset + 8], "big")
+        if flags & 0x01 and len(data) >= tag_offset + 12:
+            return int.from_bytes(data[tag_offset + 8:tag_offset + 12], "big")
+        return None
+    if data[offset + 36:offset + 40] == b"VBRI" and len(data) >= offset + 54:
+        return int.from_bytes(data[offset + 50:offset + 54], "big")
+    return None
+
+
+def mp3_info(data: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Work out the duration of an MP3 from its frame headers, without decoding.
+
+    A Xing/Info or VBRI frame count is used when the first frame carries
+    one; otherwise every frame header is walked, which is exact for both
+    CBR and VBR streams.
+
+    Returns:
+        Dictionary with duration (seconds), sample_rate, channels, frames
+        and average bitrate (bits per second), or None if no frames are found
+    """
+    frames = 0
+    samples = 0
+    audio_bytes = 0
+    first: Optional[Dict[str, Any]] = None
+    for offset, header in iter_frames(data):
+        if first is None:
+            first = header
+            count = _info_frame_count(data, offset, header)
+            if count is not None:
+                frames = count
+                samples = count * header["samples"]
+                audio_bytes = len(data) - offset - header["frame_length"]
+                break
+            if is_info_frame(data, offset, header):
+                continue
+        frames += 1
+        samples += header["samples"]
+        audio_bytes += header["frame_length"]
+
+    if first is None or frames == 0:
+        return None
+    duration = samples / first["sample_rate"]
+    return {
+        "duration": duration,
+        "sample_rate": first["sample_rate"],
+        "channels": first["channels"],
+        "frames": frames,
+        "bitrate": int(audio_bytes * 8 / duration) if duration > 0 else first["bitrate"],
+    }
@@ -1,10 +1,23 @@
 import os
+import time
+import random
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator, Tuple
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from pathlib import Path
 
+from conversation_history import ConversationHistoryManager
+from http_client import get_http_client
+from routine_cache import RoutineCache, SharedRoutineCache, normalize_preferences
+from shared_state import get_shared_state
+from admission import AdmissionRejected, get_admission
+from metrics import FALLBACK_RESPONSES
+from resilience import CircuitOpen, get_breaker
+from upstream_health import Probe, get_upstream_health, http_probe
+from single_flight import SingleFlight
+
 # Load environment variables
 # Point to the .env file in the parent directory of backend/
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -13,6 +26,27 @@ load_dotenv(dotenv_path=env_path)
 
 logger = logging.getLogger(__name__)
 
+# Canned replies served when OpenAI is unavailable. Their speech is
+# pre-synthesized and pinned (see fallback_audio), so keep edits rare.
+FALLBACK_REPLIES = [
+    "I'm here with you. Take a deep breath and let your body relax. Sometimes the best thing we can do is simply focus on the present moment.",
+    "Let's focus on what we can control right now - your breathing. Try breathing in slowly for 4 counts, then out for 6 counts.",
+    "I understand you're seeking some guidance tonight. Remember that rest is important, and you deserve peaceful sleep. Try to release any tension in your shoulders and jaw.",
+    "Even when things feel uncertain, your body knows how to rest. Let's create a calm space together. What usually helps you feel most relaxed?"
+]
+
+FALLBACK_ROUTINE = """Let's begin your personalized sleep routine. Find a comfortable position and take a deep breath.
+
+First, let's prepare your space. Dim the lights and ensure your room is at a comfortable temperature. Take a moment to put away any devices or distractions.
+
+Now, let's start with some gentle breathing. Breathe in slowly through your nose for four counts. Hold for two counts. Breathe out through your mouth for six counts. Repeat this pattern three more times.
+
+Next, we'll do some progressive muscle relaxation. Starting with your toes, tense them for five seconds, then release. Feel the tension melt away. Move up to your calves, tense and release. Continue this pattern through your thighs, abdomen, hands, arms, shoulders, and face.
+
+Finally, let your mind settle. Imagine yourself in a peaceful place where you feel completely safe and relaxed. Focus on the gentle sounds and sensations of this place. Allow your breathing to become natural and easy.
+
+Rest well tonight. You deserve peaceful, restorative sleep."""
+
 class OpenAIService:
     def __init__(self):
         """Initialize OpenAI service with API key from environment variables."""
@@ -20,9 +54,39 @@ class OpenAIService:
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY environment variable is required")
         
-        self.client = AsyncOpenAI(api_key=self.api_key)
+        # Share the app-wide pooled connection to OpenAI instead of a per-client pool
+        http_client = get_http_client("openai")
+        self.client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            http_client=http_client,
+            timeout=http_client.timeout,
+            # Retries multiply the wait before a fallback; the circuit breaker handles persistent failures
+            max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "1"))
+        )
         self.model = "gpt-4o-mini"  # Using GPT-4o-mini as a reliable fallback/alternative if gpt-5-nano behaves unexpectedly
         
+        # Generated routines are reused across users with similar preferences,
+        # and across workers when shared state is enabled
+        shared = get_shared_state()
+        routine_variants = int(os.getenv("ROUTINE_CACHE_VARIANTS", "3"))
+        routine_ttl = float(os.getenv("ROUTINE_CACHE_TTL_SECONDS", str(6 * 3600)))
+        if shared is not None:
+            self.routine_cache = SharedRoutineCache(shared, max_variants=routine_variants, ttl=routine_ttl)
+        else:
+            self.routine_cache = RoutineCache(max_variants=routine_variants, ttl=routine_ttl)
+        self._variant_tasks: Dict[str, asyncio.Task] = {}
+        # Concurrent requests for the same preferences share one generation
+        self.routine_flight = SingleFlight()
+        
+        # Older turns are folded into a rolling summary to keep prompts within budget
+        self.history_manager = ConversationHistoryManager(
+            self._summarize_history,
+            prompt_token_budget=int(os.getenv("OPENAI_PROMPT_TOKEN_BUDGET", "2000")),
+            summary_token_budget=int(os.getenv("OPENAI_SUMMARY_TOKEN_BUDGET", "250")),
+            shared=shared
+        )
+        
         # Sleep coach system prompt optimized for the sleep assistant
         self.system_prompt = """You are a gentle, empathetic sleep coach and wellness assistant. Your role is to help users relax, unwind, and prepare for restful sleep. You should:
 
@@ -56,6 +120,35 @@ STORYTELLING MODE: When users ask for stories, bedtime stories, or visualization
 
 Remember: Create diverse, unique stories each time. Never repeat the same setting or characters. Make each story a completely different peaceful journey that guides the listener naturally toward sleep."""
 
+    def _build_messages(self, user_message: str, conversation_history: Optional[list] = None) -> Tuple[list, int]:
+        """
+        Build the chat messages array within the prompt-token budget.
+        
+        Returns:
+            Tuple of (messages, prompt token count)
+        """
+        return self.history_manager.build_messages(self.system_prompt, conversation_history, user_message)
+
+    async def _summarize_history(self, previous_summary: str, messages: list) -> str:
+        """Fold older conversation turns into a short rolling summary."""
+        transcript = "\n".join(f"{m.get('role', 'user')}: {m.get('content', '')}" for m in messages)
+        prompt = f"""Update the running summary of a bedtime conversation between a user and a sleep coach.
+
+Current summary: {previous_summary or "None yet."}
+
+New turns:
+{transcript}
+
+Write the updated summary in at most five plain sentences. Keep the user's concerns, preferences and anything the coach promised. Do not retell stories in detail."""
+        get_breaker("openai").check()
+        async with get_admission("openai").slot():
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_completion_tokens=self.history_manager.summary_token_budget
+            )
+        return (response.choices[0].message.content or "").strip()
+
     async def generate_response(self, user_message: str, conversation_history: Optional[list] = None) -> str:
         """
         Generate a response using OpenAI GPT-5-nano-thinking
@@ -67,28 +160,37 @@ Remember: Create diverse, unique stories each time. Never repeat the same settin
         Returns:
             Generated response text
         """
-        try:
-            # Build messages array
-            messages = [{"role": "system", "content": self.system_prompt}]
-            
-            # Add conversation history if provided
-            if conversation_history:
-                # Trim to last few turns to reduce latency and cost
-                max_history = 6
-                messages.extend(conversation_history[-max_history:])
+        reply = await self.generate_reply(user_message, conversation_history)
+        return reply["response"]
 
-            # Add current user message
-            messages.append({"role": "user", "content": user_message})
+    async def generate_reply(self, user_message: str, conversation_history: Optional[list] = None) -> Dict[str, Any]:
+        """
+        Generate a response and report the prompt size it was generated from.
+        
+        Args:
+            user_message: The user's input message
+            conversation_history: Optional list of previous messages for context
+            
+        Returns:
+            Dictionary with the response text, prompt_tokens and whether it is a fallback
+        """
+        prompt_tokens = None
+        try:
+            messages, prompt_tokens = self._build_messages(user_message, conversation_history)
 
-            logger.info(f"Sending request to OpenAI GPT-5 Nano with {len(messages)} messages")
+            logger.info(f"Sending request to OpenAI GPT-5 Nano with {len(messages)} messages ({prompt_tokens} prompt tokens)")
 
             # Make the API call using the standard chat completions API
             # Keep token budget reasonable to improve latency
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_completion_tokens=650
-            )
+            get_breaker("openai").check()
+            async with get_admission("openai").slot():
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_completion_tokens=650
+                )
+            if response.usage:
+                prompt_tokens = response.usage.prompt_tokens
             
             # Extract the response text
             # GPT-5 Nano might return content differently or require checking different fields
@@ -102,16 +204,99 @@ Remember: Create diverse, unique stories each time. Never repeat the same settin
                 response_text = "I'm listening. Please go on."
             
             logger.info(f"Received response from OpenAI: {len(response_text)} characters")
-            return response_text
+            return {"response": response_text, "prompt_tokens": prompt_tokens, "fallback": False}
             
+        except CircuitOpen:
+            # OpenAI is known to be failing: answer from the fallback right away
+            FALLBACK_RESPONSES.inc(kind="chat")
+            return {"response": self._get_fallback_response(), "prompt_tokens": prompt_tokens, "fallback": True}
+        except AdmissionRejected:
+            # Overloaded: tell the client to come back rather than serving a canned reply
+            raise
         except Exception as e:
             logger.error(f"OpenAI API error: {str(e)}")
             print(f"❌ CRITICAL OPENAI ERROR (CHAT): {type(e).__name__}: {str(e)}")
             import traceback
             traceback.print_exc()
             # Return a fallback response
-            return self._get_fallback_response()
+            FALLBACK_RESPONSES.inc(kind="chat")
+            return {"response": self._get_fallback_response(), "prompt_tokens": prompt_tokens, "fallback": True}
     
+    async def stream_response(self, user_message: str,
+                              conversation_history: Optional[list] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a response token by token.
+
+        Yields {"type": "token", "content": ...} events as OpenAI produces
+        them, then one {"type": "done", ...} event carrying token usage,
+        time to first token and total time. If OpenAI fails before any
+        token arrives, a fallback response is streamed instead. Closing the
+        generator (for example when the client disconnects) closes the
+        upstream stream so OpenAI stops generating.
+
+        Args:
+            user_message: The user's input message
+            conversation_history: Optional list of previous messages for context
+        """
+        messages, prompt_tokens = self._build_messages(user_message, conversation_history)
+        start_time = time.perf_counter()
+        first_token_time = None
+        usage = None
+        fallback = False
+        stream = None
+
+        try:
+            get_breaker("openai").check()
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_completion_tokens=650,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            async for chunk in stream:
+                if chunk.usage:
+                    usage = {
+                        "prompt_tokens": chunk.usage.prompt_tokens,
+                        "completion_tokens": chunk.usage.completion_tokens,
+                        "total_tokens": chunk.usage.total_tokens,
+                    }
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter()
+                    yield {"type": "token", "content": content}
+
+        except Exception as e:
+            if not isinstance(e, CircuitOpen):
+                logger.error(f"OpenAI streaming error: {str(e)}")
+                print(f"❌ CRITICAL OPENAI ERROR (CHAT STREAM): {type(e).__name__}: {str(e)}")
+            if first_token_time is not None:
+                # Part of the reply has already been sent; don't splice a fallback onto it
+                yield {"type": "error", "message": "The response was interrupted"}
+            else:
+                fallback = True
+                FALLBACK_RESPONSES.inc(kind="chat_stream")
+                first_token_time = time.perf_counter()
+                yield {"type": "token", "content": self._get_fallback_response(), "fallback": True}
+        finally:
+            if stream is not None:
+                await stream.close()
+
+        end_time = time.perf_counter()
+        yield {
+            "type": "done",
+            "usage": usage,
+            "prompt_tokens": usage["prompt_tokens"] if usage else prompt_tokens,
+            "fallback": fallback,
+            "timing": {
+                "time_to_first_token": (first_token_time - start_time) if first_token_time else None,
+                "total_time": end_time - start_time,
+            },
+        }
+
     async def generate_sleep_routine(self, user_preferences: str) -> str:
         """
         Generate a personalized sleep routine based on user preferences.
@@ -122,8 +307,76 @@ Remember: Create diverse, unique stories each time. Never repeat the same settin
         Returns:
             Generated sleep routine text
         """
+        reply = await self.generate_routine_reply(user_preferences)
+        return reply["routine"]
+
+    async def generate_routine_reply(self, user_preferences: str) -> Dict[str, Any]:
+        """
+        Generate a sleep routine and report whether it is the fallback routine.
+        
+        Routines are cached per normalized preference key. A cached variant
+        is returned immediately, and while a key has fewer than the maximum
+        number of variants another one is generated in the background so
+        repeat requests still get variety.
+        
+        Args:
+            user_preferences: User's preferences and needs for the sleep routine
+            
+        Returns:
+            Dictionary with the routine text and whether it is a fallback
+        """
+        key = normalize_preferences(user_preferences)
+        # The shared cache takes the database write lock; keep that off the event loop
+        cached = await asyncio.to_thread(self.routine_cache.get, key)
+        if cached is not None:
+            if self.routine_cache.wants_variant(key):
+                self._schedule_routine_variant(key, user_preferences)
+            return {"routine": cached, "fallback": False}
+
         try:
-            routine_prompt = f"""Create a deeply relaxing, personalized sleep experience based on these preferences: {user_preferences}
+            routine = await self.routine_flight.do(key, lambda: self._create_cached_routine(key, user_preferences))
+            return {"routine": routine, "fallback": False}
+            
+        except CircuitOpen:
+            FALLBACK_RESPONSES.inc(kind="routine")
+            return {"routine": self._get_fallback_routine(), "fallback": True}
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            logger.error(f"OpenAI API error in sleep routine generation: {str(e)}")
+            print(f"❌ CRITICAL OPENAI ERROR (ROUTINE): {type(e).__name__}: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            FALLBACK_RESPONSES.inc(kind="routine")
+            return {"routine": self._get_fallback_routine(), "fallback": True}
+    
+    def _schedule_routine_variant(self, key: str, user_preferences: str):
+        """Generate one more cached variant for a key in the background, one at a time per key."""
+        task = self._variant_tasks.get(key)
+        if task is not None and not task.done():
+            return
+        if get_admission("openai").saturated:
+            # Extra variants are a nicety; don't queue them behind live requests
+            return
+
+        async def add_variant():
+            try:
+                await self.routine_flight.do(key, lambda: self._create_cached_routine(key, user_preferences))
+            except Exception as e:
+                logger.warning(f"Background routine variant failed: {str(e)}")
+            finally:
+                self._variant_tasks.pop(key, None)
+
+        self._variant_tasks[key] = asyncio.create_task(add_variant())
+    
+    async def _create_cached_routine(self, key: str, user_preferences: str) -> str:
+        routine = await self._create_sleep_routine(user_preferences)
+        await asyncio.to_thread(self.routine_cache.add, key, routine)
+        return routine
+
+    async def _create_sleep_routine(self, user_preferences: str) -> str:
+        """Ask OpenAI for a new sleep routine. Raises on failure."""
+        routine_prompt = f"""Create a deeply relaxing, personalized sleep experience based on these preferences: {user_preferences}
 
 Select the single best format (Story, Meditation, or Affirmations) that matches the user's needs.
 
@@ -147,75 +400,51 @@ CONTENT STRUCTURE:
 3. Deepening: Gradually transition from the experience into a state of heavy, drifting sleepiness.
 4. Drift Off: End with a final, fading suggestion for deep sleep, trailing off gently..."""
 
-            messages = [
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": routine_prompt}
-            ]
-            
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": routine_prompt}
+        ]
+        
+        get_breaker("openai").check()
+        async with get_admission("openai").slot():
             response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 max_completion_tokens=1200
             )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            logger.error(f"OpenAI API error in sleep routine generation: {str(e)}")
-            print(f"❌ CRITICAL OPENAI ERROR (ROUTINE): {type(e).__name__}: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return self._get_fallback_routine()
+        
+        return response.choices[0].message.content.strip()
     
     def _get_fallback_response(self) -> str:
         """Return a fallback response when OpenAI API is unavailable."""
-        fallback_responses = [
-            "I'm here with you. Take a deep breath and let your body relax. Sometimes the best thing we can do is simply focus on the present moment.",
-            "Let's focus on what we can control right now - your breathing. Try breathing in slowly for 4 counts, then out for 6 counts.",
-            "I understand you're seeking some guidance tonight. Remember that rest is important, and you deserve peaceful sleep. Try to release any tension in your shoulders and jaw.",
-            "Even when things feel uncertain, your body knows how to rest. Let's create a calm space together. What usually helps you feel most relaxed?"
-        ]
-        import random
-        return random.choice(fallback_responses)
+        return random.choice(FALLBACK_REPLIES)
     
     def _get_fallback_routine(self) -> str:
         """Return a fallback sleep routine when OpenAI API is unavailable."""
-        return """Let's begin your personalized sleep routine. Find a comfortable position and take a deep breath.
-
-First, let's prepare your space. Dim the lights and ensure your room is at a comfortable temperature. Take a moment to put away any devices or distractions.
-
-Now, let's start with some gentle breathing. Breathe in slowly through your nose for four counts. Hold for two counts. Breathe out through your mouth for six counts. Repeat this pattern three more times.
+        return FALLBACK_ROUTINE
 
-Next, we'll do some progressive muscle relaxation. Starting with your toes, tense them for five seconds, then release. Feel the tension melt away. Move up to your calves, tense and release. Continue this pattern through your thighs, abdomen, hands, arms, shoulders, and face.
+    def preload(self):
+        """Resolve the SDK's lazily imported resources so the first request doesn't pay for them."""
+        self.client.chat.completions
+        self.client.models
 
-Finally, let your mind settle. Imagine yourself in a peaceful place where you feel completely safe and relaxed. Focus on the gentle sounds and sensations of this place. Allow your breathing to become natural and easy.
-
-Rest well tonight. You deserve peaceful, restorative sleep."""
+    def health_probe(self) -> Probe:
+        """A free probe for when there's no traffic: looks up the model, which checks the key without spending tokens."""
+        return http_probe("openai", str(self.client.base_url.join(f"models/{self.model}")),
+                          headers={"Authorization": f"Bearer {self.api_key}"}, ok_below=400)
 
-    async def check_health(self) -> Dict[str, Any]:
-        """Check if the OpenAI service is healthy and accessible."""
-        try:
-            # Make a simple test request
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": "Hello"}],
-                max_completion_tokens=16
-            )
-            
-            return {
-                "status": "healthy",
-                "model": self.model,
-                "api_accessible": True,
-                "message": "OpenAI service is operational"
-            }
-        except Exception as e:
-            logger.error(f"OpenAI health check failed: {str(e)}")
-            return {
-                "status": "error",
-                "model": self.model,
-                "api_accessible": False,
-                "message": f"OpenAI service error: {str(e)}"
-            }
+    def check_health(self) -> Dict[str, Any]:
+        """OpenAI's health as seen by recent real calls, or the last idle-time probe. Never calls OpenAI."""
+        health = get_upstream_health("openai").status()
+        accessible = health["status"] in ("healthy", "degraded")
+        return {
+            **health,
+            "model": self.model,
+            "api_accessible": accessible,
+            "message": "OpenAI service is operational" if accessible else
+                       f"OpenAI service error: {health['error']}" if health["error"] else
+                       "OpenAI service has not been checked yet",
+        }
 
 # Global instance
 openai_service = None
@@ -0,0 +1,318 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Deque, Tuple, Callable, Awaitable, TypeVar
+
+import httpx
+
+from admission import AdmissionRejected
+from metrics import REGISTRY
+
+T = TypeVar("T")
+
+CIRCUIT_REJECTED = REGISTRY.counter(
+    "sleep_assistant_circuit_rejected_total",
+    "Upstream calls skipped because the upstream's circuit breaker was open.",
+    ("upstream",),
+)
+CIRCUIT_OPENED = REGISTRY.counter(
+    "sleep_assistant_circuit_opened_total",
+    "Times an upstream's circuit breaker opened, by reason (errors or latency).",
+    ("upstream", "reason"),
+)
+HEDGED_REQUESTS = REGISTRY.counter(
+    "sleep_assistant_hedged_requests_total",
+    "Second attempts fired after the observed p95 latency, by which attempt won (primary, hedge or neither).",
+    ("upstream", "winner"),
+)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(AdmissionRejected):
+    """Raised instead of calling an upstream whose breaker is open; served as 503 with Retry-After."""
+
+    def __init__(self, upstream: str, retry_after: int):
+        super().__init__(upstream, "circuit_open", retry_after)
+        self.detail = f"The {upstream} service is failing, please retry in {retry_after}s"
+
+
+class CircuitBreaker:
+    """
+    Fails fast when an upstream is erroring or slow.
+
+    Outcomes of real calls (status, or exception, and time to response
+    headers) are kept for the last window seconds. Once at least
+    min_requests are in the window and either the error rate reaches
+    error_rate or the p95 latency reaches slow_seconds, the breaker opens
+    and check() raises CircuitOpen for open_seconds, so callers go straight
+    to their fallback instead of each waiting out a timeout. After that one
+    trial call is let through every open_seconds (half-open); a fast success
+    closes the breaker, anything else keeps it open.
+    """
+
+    def __init__(self, name: str, error_rate: float = 0.5, slow_seconds: float = 10.0,
+                 min_requests: int = 10, window: float = 60.0, open_seconds: float = 15.0,
+                 enabled: bool = True, max_samples: int = 500):
+        self.name = name
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.min_requests = min_requests
+        self.window = window
+        self.open_seconds = open_seconds
+        self.enabled = enabled
+        self._samples: Deque[Tuple[float, bool, float]] = deque(maxlen=max_samples)  # (time, ok, seconds)
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._last_trial = 0.0
+        self.rejected = 0
+        self.opened = 0
+        # The most recent call, for passive health reporting
+        self.last_call_at: Optional[float] = None
+        self.last_ok: Optional[bool] = None
+        self.last_error: Optional[str] = None
+        # Set while the upstream is rejecting our credentials, cleared by the next success
+        self.auth_failed_at: Optional[float] = None
+
+    def _prune_locked(self, now: float):
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
+
+    @staticmethod
+    def _percentile(values, fraction: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(math.ceil(fraction * len(ordered))) - 1)]
+
+    def check(self):
+        """
+        Let a call through, or raise CircuitOpen if the upstream should be skipped.
+
+        Raises:
+            CircuitOpen: while the breaker is open, or half-open with a trial already under way
+        """
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and now - self._last_trial >= self.open_seconds:
+                # One trial at a time; a trial that never reports back frees the slot after open_seconds
+                self._last_trial = now
+                return
+            self.rejected += 1
+            retry_after = max(1, math.ceil(max(self._opened_at, self._last_trial) + self.open_seconds - now))
+        CIRCUIT_REJECTED.inc(upstream=self.name)
+        raise CircuitOpen(self.name, min(retry_after, 60))
+
+    def record(self, ok: bool, seconds: float, error: Optional[str] = None):
+        """Record the outcome of one upstream call, with a short description of the error if it failed."""
+        now = time.monotonic()
+        with self._lock:
+            self.last_call_at = now
+            self.last_ok = ok
+            if ok:
+                self.auth_failed_at = None
+            else:
+                self.last_error = error
+            if self.state == OPEN:
+                # Calls started before the breaker opened don't get a say
+                return
+            if self.state == HALF_OPEN:
+                if ok and seconds < self.slow_seconds:
+                    self.state = CLOSED
+                    self._samples.clear()
+                    print(f"✅ {self.name} circuit closed")
+                else:
+                    self.state = OPEN
+                    self._opened_at = now
+                return
+
+            self._samples.append((now, ok, seconds))
+            self._prune_locked(now)
+            if len(self._samples) < self.min_requests:
+                return
+            failures = sum(1 for _, sample_ok, _ in self._samples if not sample_ok)
+            if failures / len(self._samples) >= self.error_rate:
+                reason = "errors"
+            elif self._percentile([s for _, _, s in self._samples], 0.95) >= self.slow_seconds:
+                reason = "latency"
+            else:
+                return
+            self.state = OPEN
+            self._opened_at = now
+            self.opened += 1
+        CIRCUIT_OPENED.inc(upstream=self.name, reason=reason)
+        print(f"⚡ {self.name} circuit opened ({reason}); failing fast for {self.open_seconds:.0f}s")
+
+    def record_auth_failure(self, error: str):
+        """
+        Record a call the upstream rejected for its credentials (401 or 403).
+
+        It counts against the upstream's health but not towards opening the
+        breaker: the upstream answered promptly, and failing fast wouldn't
+        stop every later call from being rejected the same way.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.last_call_at = now
+            self.last_ok = False
+            self.last_error = error
+            self.auth_failed_at = now
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._prune_locked(time.monotonic())
+            samples = list(self._samples)
+        failures = sum(1 for _, ok, _ in samples if not ok)
+        p95 = self._percentile([seconds for _, _, seconds in samples], 0.95)
+        return {
+            "state": self.state,
+            "window_requests": len(samples),
+            "error_rate": round(failures / len(samples), 3) if samples else 0.0,
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class LatencyTracker:
+    """The last max_samples durations of a kind of call, for picking a hedge delay."""
+
+    def __init__(self, max_samples: int = 200):
+        self._samples: Deque[float] = deque(maxlen=max_samples)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float, min_samples: int = 20) -> Optional[float]:
+        """Percentile of the recorded durations, or None with fewer than min_samples."""
+        samples = list(self._samples)
+        if len(samples) < min_samples:
+            return None
+        return CircuitBreaker._percentile(samples, fraction)
+
+
+class BreakerTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps an httpx transport to feed every upstream call's outcome to a circuit breaker.
+
+    429s, 5xx and transport errors count as failures; 401s and 403s are
+    recorded as credential failures, which mark the upstream unhealthy
+    without tripping the breaker; other statuses mean the upstream
+    answered. Cancelled calls (a client that left, a losing hedge), health
+    probes and connection warm-ups (requests with the "health_probe"
+    extension) are not counted either way.
+    """
+
+    def __init__(self, breaker: CircuitBreaker, transport: httpx.AsyncBaseTransport):
+        self.breaker = breaker
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.extensions.get("health_probe"):
+            return await self.transport.handle_async_request(request)
+        start = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception as e:
+            self.breaker.record(False, time.perf_counter() - start, error=type(e).__name__)
+            raise
+        if response.status_code in (401, 403):
+            self.breaker.record_auth_failure(f"HTTP {response.status_code}")
+            return response
+        ok = response.status_code != 429 and response.status_code < 500
+        self.breaker.record(ok, time.perf_counter() - start, error=None if ok else f"HTTP {response.status_code}")
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+async def hedged(upstream: str, attempt: Callable[[], Awaitable[T]], delay: Optional[float],
+                 can_hedge: Callable[[], bool] = lambda: True) -> T:
+    """
+    Run an idempotent call, racing a second copy if the first is slow.
+
+    If attempt() hasn't finished after delay seconds (and can_hedge() still
+    allows it), a second attempt is started; whichever succeeds first wins
+    and the other is cancelled. Only use this for calls that are safe to
+    make twice.
+
+    Args:
+        upstream: Upstream name for metrics
+        attempt: Starts one attempt
+        delay: Seconds to wait before hedging; None to never hedge
+
+    Raises:
+        The last attempt's exception if every attempt failed
+    """
+    if delay is None:
+        return await attempt()
+
+    primary = asyncio.ensure_future(attempt())
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or not can_hedge():
+            return await primary
+
+        hedge = asyncio.ensure_future(attempt())
+        tasks.append(hedge)
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    HEDGED_REQUESTS.inc(upstream=upstream, winner="primary" if task is primary else "hedge")
+                    return task.result()
+                error = task.exception()
+        HEDGED_REQUESTS.inc(upstream=upstream, winner="neither")
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _breaker(name: str, prefix: str, slow_seconds: float) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        error_rate=float(os.getenv(f"{prefix}_BREAKER_ERROR_RATE", "0.5")),
+        slow_seconds=float(os.getenv(f"{prefix}_BREAKER_SLOW_SECONDS", str(slow_seconds))),
+        min_requests=int(os.getenv(f"{prefix}_BREAKER_MIN_REQUESTS", "10")),
+        window=float(os.getenv(f"{prefix}_BREAKER_WINDOW_SECONDS", "60")),
+        open_seconds=float(os.getenv(f"{prefix}_BREAKER_OPEN_SECONDS", "15")),
+        enabled=os.getenv("CIRCUIT_BREAKERS_ENABLED", "true").lower() not in ("0", "false", "no"),
+    )
+
+
+# One breaker per upstream; p95 above slow_seconds counts as failing even without errors
+_breakers: Dict[str, CircuitBreaker] = {
+    "unreal": _breaker("unreal", "UNREAL", 10.0),
+    "openai": _breaker("openai", "OPENAI", 20.0),
+    "assemblyai": _breaker("assemblyai", "ASSEMBLYAI", 5.0),
+}
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get the circuit breaker for an upstream ("unreal", "openai" or "assemblyai")."""
+    return _breakers[name]
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: breaker.stats() for name, breaker in _breakers.items()}
+
+
+REGISTRY.collector("sleep_assistant_circuit_state",
+                   "Circuit breaker state per upstream: 0 closed, 1 half-open, 2 open.", "gauge",
+                   lambda: [({"upstream": name}, _STATE_VALUES[breaker.state]) for name, breaker in _breakers.items()])
@@ -0,0 +1,174 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from shared_state import SharedState
+
+# Words that don't change what kind of routine gets generated
+STOPWORDS = {
+    "a", "an", "and", "the", "of", "to", "for", "with", "in", "on", "at", "by", "or",
+    "i", "im", "i'm", "me", "my", "we", "us", "our", "you", "your", "it", "its",
+    "is", "am", "are", "be", "been", "was", "feel", "feeling", "some", "something",
+    "want", "like", "would", "please", "just", "really", "very", "so", "that", "this",
+    "help", "need", "sleep", "routine", "tonight", "about", "into", "from",
+}
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def normalize_preferences(preferences: str) -> str:
+    """
+    Reduce a free-text preference string to a canonical cache key.
+
+    Case, word order, punctuation, duplicates, stopwords and simple plurals
+    are ignored, so "Rain, forest, anxious" and "anxious about rain in the
+    forest" map to the same key. Text made up only of stopwords and
+    punctuation keys on its lowercased form instead, so unrelated inputs
+    like "and the" and "?!" don't all share one entry.
+    """
+    words = set()
+    for word in _WORD.findall(preferences.lower()):
+        word = word.strip("'")
+        if not word or word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+            word = word[:-1]
+        words.add(word)
+    if not words:
+        return " ".join(preferences.lower().split())
+    return " ".join(sorted(words))
+
+
+class RoutineCache:
+    """
+    Small rotating cache of generated sleep routines.
+
+    Each normalized preference key holds up to max_variants routines that
+    expire after ttl seconds. Lookups rotate through the fresh variants so
+    repeat visitors still hear something different. Keys are evicted LRU
+    once max_keys is exceeded.
+    """
+
+    def __init__(self, max_variants: int = 3, ttl: float = 6 * 3600, max_keys: int = 256):
+        self.max_variants = max_variants
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh_variants(self, key: str) -> List[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return []
+        cutoff = time.time() - self.ttl
+        entry["variants"] = [v for v in entry["variants"] if v["created_at"] > cutoff]
+        if not entry["variants"]:
+            del self._entries[key]
+            return []
+        return entry["variants"]
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the next cached variant for a key, or None on a miss."""
+        with self._lock:
+            variants = self._fresh_variants(key)
+            if not variants:
+                self.misses += 1
+                return None
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+            routine = variants[entry["next"] % len(variants)]["routine"]
+            entry["next"] += 1
+            self.hits += 1
+            return routine
+
+    def wants_variant(self, key: str) -> bool:
+        """Whether the key still has room for another distinct variant."""
+        with self._lock:
+            return len(self._fresh_variants(key)) < self.max_variants
+
+    def add(self, key: str, routine: str):
+        """Store a newly generated routine, replacing the oldest variant if full."""
+        with self._lock:
+            variants = self._fresh_variants(key)
+            entry = self._entries.setdefault(key, {"variants": variants, "next": 0})
+            entry["variants"].append({"routine": routine, "created_at": time.time()})
+            del entry["variants"][:-self.max_variants]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "keys": len(self._entries),
+                "variants": sum(len(e["variants"]) for e in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+class SharedRoutineCache(RoutineCache):
+    """
+    RoutineCache kept in the shared state database, so every worker reuses
+    and rotates the same variants. Hit and miss counts stay per process.
+    """
+
+    def __init__(self, shared: "SharedState", max_variants: int = 3, ttl: float = 6 * 3600):
+        super().__init__(max_variants=max_variants, ttl=ttl)
+        self.shared = shared
+
+    def _fresh(self, entry: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if entry is None:
+            return None
+        cutoff = time.time() - self.ttl
+        entry["variants"] = [v for v in entry["variants"] if v["created_at"] > cutoff]
+        return entry if entry["variants"] else None
+
+    def get(self, key: str) -> Optional[str]:
+        def rotate(entry):
+            entry = self._fresh(entry)
+            if entry is None:
+                return None, None
+            variants = entry["variants"]
+            routine = variants[entry["next"] % len(variants)]["routine"]
+            entry["next"] += 1
+            return entry, routine
+
+        routine = self.shared.update("routine", key, rotate, ttl=self.ttl)
+        with self._lock:
+            if routine is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return routine
+
+    def wants_variant(self, key: str) -> bool:
+        entry = self._fresh(self.shared.get("routine", key))
+        return entry is None or len(entry["variants"]) < self.max_variants
+
+    def add(self, key: str, routine: str):
+        def append(entry):
+            entry = self._fresh(entry) or {"variants": [], "next": 0}
+            entry["variants"].append({"routine": routine, "created_at": time.time()})
+            del entry["variants"][:-self.max_variants]
+            return entry, None
+
+        self.shared.update("routine", key, append, ttl=self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "keys": self.shared.count("routine"),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "shared": True,
+            }
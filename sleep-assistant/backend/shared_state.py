@@ -0,0 +1,270 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable, Tuple
+
+from limits.storage import Storage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS counters (
+    key TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS audio_expiry (
+    audio_id TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS audio_expiry_by_time ON audio_expiry (expires_at);
+"""
+
+
+class SharedState:
+    """
+    Small SQLite database shared by every worker process on this machine.
+
+    Runs in WAL mode so readers never block the single writer, and every
+    thread gets its own connection. Holds JSON values with an optional TTL
+    (response caches, audio metadata, tokens), rate-limit counters and the
+    audio expiry index, so running several uvicorn workers doesn't multiply
+    rate limits or split caches per process.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Workers starting together race to create the schema; the loser just waits,
+        # for at least a few seconds even when busy_timeout is short
+        conn = self.connection()
+        conn.execute(f"PRAGMA busy_timeout = {int(max(busy_timeout, 5.0) * 1000)}")
+        with self.transaction() as conn:
+            for statement in _SCHEMA.strip().split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+        conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; multi-statement updates use transaction()
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run a block as one write transaction, taking the write lock up front."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # JSON values
+
+    @staticmethod
+    def _load(row: Optional[Tuple[str, Optional[float]]], now: float) -> Optional[Any]:
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= now:
+            return None
+        return json.loads(value)
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Return a stored value, or None if it is missing or expired."""
+        row = self.connection().execute(
+            "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return self._load(row, time.time())
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a JSON-serializable value, replacing any previous one."""
+        expires_at = time.time() + ttl if ttl is not None else None
+        self.connection().execute(
+            "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), expires_at)
+        )
+
+    def delete(self, namespace: str, key: str):
+        self.connection().execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def update(self, namespace: str, key: str, update: Callable[[Optional[Any]], Tuple[Optional[Any], Any]],
+               ttl: Optional[float] = None) -> Any:
+        """
+        Atomically read-modify-write one value across processes.
+
+        Args:
+            update: called with the current value (None if missing or expired);
+                returns (new value, result). A new value of None deletes the key.
+
+        Returns:
+            The result returned by update
+        """
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            new_value, result = update(self._load(row, time.time()))
+            if new_value is None:
+                conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+            else:
+                expires_at = time.time() + ttl if ttl is not None else None
+                conn.execute(
+                    "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (namespace, key, json.dumps(new_value), expires_at)
+                )
+        return result
+
+    def count(self, namespace: str) -> int:
+        """Number of live values in a namespace."""
+        return self.connection().execute(
+            "SELECT COUNT(*) FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, time.time())
+        ).fetchone()[0]
+
+    # Rate-limit counters
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        """Add to a fixed-window counter, starting a new window if the old one has expired."""
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO counters (key, count, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "count = CASE WHEN expires_at <= ? THEN excluded.count ELSE count + excluded.count END, "
+                "expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END",
+                (key, amount, now + expiry, now, now)
+            )
+            return conn.execute("SELECT count FROM counters WHERE key = ?", (key,)).fetchone()[0]
+
+    def counter(self, key: str) -> Tuple[int, float]:
+        """Current (count, expires_at) of a counter; (0, now) if it has expired."""
+        now = time.time()
+        row = self.connection().execute("SELECT count, expires_at FROM counters WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= now:
+            return 0, now
+        return row[0], row[1]
+
+    def clear_counter(self, key: str):
+        self.connection().execute("DELETE FROM counters WHERE key = ?", (key,))
+
+    def clear_counters(self) -> int:
+        return self.connection().execute("DELETE FROM counters").rowcount
+
+    # Housekeeping
+
+    def purge_expired(self) -> int:
+        """Delete expired values and counters. Returns the number of rows removed."""
+        now = time.time()
+        with self.transaction() as conn:
+            removed = conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)).rowcount
+            removed += conn.execute("DELETE FROM counters WHERE expires_at <= ?", (now,)).rowcount
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self.connection()
+        namespaces = dict(conn.execute("SELECT namespace, COUNT(*) FROM kv GROUP BY namespace").fetchall())
+        return {
+            "path": self.path,
+            "values": namespaces,
+            "counters": conn.execute("SELECT COUNT(*) FROM counters").fetchone()[0],
+            "audio_expiry": conn.execute("SELECT COUNT(*) FROM audio_expiry").fetchone()[0],
+        }
+
+
+class SQLiteLimitStorage(Storage):
+    """
+    Rate-limit storage for slowapi/limits kept in the shared SQLite file.
+
+    Registered for sqlite:///path/to/state.sqlite3 URIs, so every worker
+    counts against the same fixed windows. It has its own connections so
+    busy_timeout can be kept short: limits are checked on the event loop,
+    and a locked database should fail fast rather than stall it.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: Optional[str] = None, wrap_exceptions: bool = False,
+                 busy_timeout: float = 5.0, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        path = urllib.parse.urlparse(uri).path if uri else ""
+        self.state = SharedState(path, busy_timeout=float(busy_timeout))
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        return self.state.incr(key, expiry, amount)
+
+    def get(self, key: str) -> int:
+        return self.state.counter(key)[0]
+
+    def get_expiry(self, key: str) -> float:
+        return self.state.counter(key)[1]
+
+    def check(self) -> bool:
+        try:
+            self.state.connection().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        return self.state.clear_counters()
+
+    def clear(self, key: str) -> None:
+        self.state.clear_counter(key)
+
+
+# Global shared state instance
+_shared_state: Optional[SharedState] = None
+_shared_state_lock = threading.Lock()
+
+def shared_state_path() -> Optional[str]:
+    """Database path from SHARED_STATE_PATH, or None if shared state is turned off."""
+    path = os.getenv("SHARED_STATE_PATH", os.path.join(tempfile.gettempdir(), "sleep-assistant-state.sqlite3"))
+    if path.lower() in ("", "off", "none", "false", "0"):
+        return None
+    return os.path.abspath(path)
+
+def get_shared_state() -> Optional[SharedState]:
+    """Get the process-wide handle on the shared state database, or None if it is disabled."""
+    global _shared_state
+    if _shared_state is None:
+        path = shared_state_path()
+        if path is None:
+            return None
+        with _shared_state_lock:
+            if _shared_state is None:
+                _shared_state = SharedState(path)
+    return _shared_state
+
+def rate_limit_storage_uri() -> str:
+    """Storage URI for the rate limiter: the shared database, or per-process memory if disabled."""
+    path = shared_state_path()
+    return f"sqlite://{path}" if path is not None else "memory://"
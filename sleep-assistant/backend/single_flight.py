@@ -0,0 +1,63 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("task",)
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it runs await the same task and get the same result or exception.
+    The key is released as soon as the task finishes, so a failed call is
+    retried by the next caller rather than cached.
+
+    A waiter being cancelled (a client disconnecting) never cancels the work
+    for the others. Even when every waiter has gone the work runs to
+    completion, which is what callers that cache the result want, since the
+    retry will find it.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        call = self._calls.get(key)
+        return call is not None and not call.task.done()
+
+    def _release(self, key: Hashable, call: _Call, task: asyncio.Task):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Nobody may be left to observe a failure; retrieve it so asyncio doesn't warn
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn() for key, or wait for the identical call that is already running."""
+        call = self._calls.get(key)
+        if call is None or call.task.done():
+            call = _Call(asyncio.get_running_loop().create_task(fn()))
+            call.task.add_done_callback(lambda task, key=key, call=call: self._release(key, call, task))
+            self._calls[key] = call
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(call.task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": sum(1 for call in self._calls.values() if not call.task.done()),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
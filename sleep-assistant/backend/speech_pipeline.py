@@ -0,0 +1,245 @@
+import asyncio
+import time
+from typing import Optional, Dict, Any, AsyncIterator, List
+
+from admission import AdmissionRejected
+from text_chunker import SentenceSegmenter
+
+
+async def stream_chat_speech(openai_service, tts_service, user_message: str,
+                             conversation_history: Optional[list] = None,
+                             speaker_name: str = "Speaker 1",
+                             max_parallel: int = 3,
+                             quality: Optional[str] = None,
+                             fallback_audio=None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream a chat reply and its speech, sentence by sentence.
+
+    The LLM output is cut into sentences as it streams in and each sentence
+    is sent to Unreal Speech immediately, so synthesis of early sentences
+    overlaps with generation of later ones. Token events are passed through
+    as they arrive; "audio" events are delivered strictly in sentence order,
+    each as soon as it and all earlier sentences are ready. A fallback reply
+    with pre-synthesized audio is delivered as one clip without calling
+    Unreal Speech.
+
+    Args:
+        openai_service: Service providing stream_response()
+        tts_service: Service providing synthesize()
+        user_message: The user's input message
+        conversation_history: Optional list of previous messages for context
+        speaker_name: Voice for the synthesized audio
+        max_parallel: Maximum number of sentences synthesized at once
+        quality: Audio quality tier for every sentence
+        fallback_audio: Optional index of pinned clips providing lookup()
+
+    Yields:
+        "token", "audio", "audio_error" and "error" events, then one "done" event
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    pending: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max_parallel)
+    synth_tasks = []
+    llm_done: Dict[str, Any] = {}
+    start_time = time.perf_counter()
+    first_audio_time = None
+
+    async def synthesize(text: str):
+        async with semaphore:
+            return await tts_service.synthesize(text, speaker_name, quality)
+
+    def schedule(index: int, text: str):
+        task = asyncio.create_task(synthesize(text))
+        synth_tasks.append(task)
+        pending.put_nowait((index, text, task))
+
+    def schedule_ready(index: int, text: str, result: Dict[str, Any]):
+        ready = asyncio.get_running_loop().create_future()
+        ready.set_result(result)
+        pending.put_nowait((index, text, ready))
+
+    def pinned_fallback(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not event.get("fallback") or fallback_audio is None:
+            return None
+        audio = fallback_audio.lookup(event["content"], speaker_name, quality)
+        return {**audio, "cached": True} if audio is not None else None
+
+    async def produce():
+        """Read the LLM stream, forwarding tokens and scheduling sentences for synthesis."""
+        segmenter = SentenceSegmenter()
+        index = 0
+        stream = openai_service.stream_response(user_message, conversation_history)
+        try:
+            async for event in stream:
+                pinned = pinned_fallback(event) if event["type"] == "token" else None
+                if pinned is not None:
+                    await events.put(event)
+                    schedule_ready(index, event["content"], pinned)
+                    index += 1
+                    sentences = []
+                elif event["type"] == "token":
+                    await events.put(event)
+                    sentences = segmenter.feed(event["content"])
+                elif event["type"] == "done":
+                    llm_done.update(event)
+                    sentences = segmenter.flush()
+                else:
+                    await events.put(event)
+                    sentences = []
+                for sentence in sentences:
+                    schedule(index, sentence)
+                    index += 1
+        except Exception as e:
+            print(f"❌ Chat speech pipeline error: {e}")
+            await events.put({"type": "error", "message": str(e)})
+        finally:
+            await stream.aclose()
+            pending.put_nowait(None)
+
+    async def deliver():
+        """Emit synthesized sentences in order, waiting on each in turn."""
+        nonlocal first_audio_time
+        segments = []
+        while True:
+            item = await pending.get()
+            if item is None:
+                break
+            index, text, task = item
+            try:
+                result = await task
+            except Exception as e:
+                print(f"❌ Sentence synthesis failed: {e}")
+                result = None
+            if result is None:
+                await events.put({"type": "audio_error", "index": index, "text": text})
+                continue
+            if first_audio_time is None:
+                first_audio_time = time.perf_counter()
+            segment = {
+                "index": index,
+                "text": text,
+                "audio_id": result["audio_id"],
+                "audio_url": f"/api/audio/{result['audio_id']}",
+                "duration": result["duration"],
+                "cached": result["cached"],
+            }
+            segments.append(segment)
+            await events.put({"type": "audio", **segment})
+
+        await events.put({
+            "type": "done",
+            "segments": len(segments),
+            "usage": llm_done.get("usage"),
+            "prompt_tokens": llm_done.get("prompt_tokens"),
+            "fallback": llm_done.get("fallback", False),
+            "timing": {
+                **(llm_done.get("timing") or {}),
+                "time_to_first_audio": (first_audio_time - start_time) if first_audio_time else None,
+                "total_time": time.perf_counter() - start_time,
+            },
+        })
+
+    producer = asyncio.create_task(produce())
+    deliverer = asyncio.create_task(deliver())
+    try:
+        while True:
+            event = await events.get()
+            yield event
+            if event["type"] == "done":
+                break
+    finally:
+        # Stop generating and synthesizing once the consumer goes away
+        for task in (producer, deliverer, *synth_tasks):
+            task.cancel()
+        await asyncio.gather(producer, deliverer, *synth_tasks, return_exceptions=True)
+
+
+async def stream_batch_speech(tts_service, segments: List[str], speaker_name: str = "Speaker 1",
+                              max_parallel: int = 4,
+                              quality: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Synthesize an ordered list of text segments, reporting each as it finishes.
+
+    Cached segments are reported straight away; the rest are synthesized with
+    at most max_parallel in flight, and "audio" events are emitted in
+    completion order (each carries its index) so the client can start
+    fetching whichever clip is ready. The closing "manifest" event lists
+    every segment in request order.
+
+    Args:
+        tts_service: Service providing lookup_cached() and synthesize()
+        segments: Texts to synthesize, in playback order
+        speaker_name: Voice for the synthesized audio
+        max_parallel: Maximum number of segments synthesized at once
+        quality: Audio quality tier for every segment
+
+    Yields:
+        "audio" and "audio_error" events, then one "manifest" event
+    """
+    semaphore = asyncio.Semaphore(max_parallel)
+    start_time = time.perf_counter()
+    manifest: List[Optional[Dict[str, Any]]] = [None] * len(segments)
+
+    def audio_event(index: int, result: Dict[str, Any]) -> Dict[str, Any]:
+        segment = {
+            "index": index,
+            "audio_id": result["audio_id"],
+            "audio_url": f"/api/audio/{result['audio_id']}",
+            "duration": result["duration"],
+            "cached": result["cached"],
+            "generation_time": result["generation_time"],
+        }
+        manifest[index] = segment
+        return {"type": "audio", **segment}
+
+    def error_event(index: int, message: str, retry_after: Optional[int] = None) -> Dict[str, Any]:
+        segment = {"index": index, "error": message}
+        if retry_after is not None:
+            segment["retry_after"] = retry_after
+        manifest[index] = segment
+        return {"type": "audio_error", **segment}
+
+    async def synthesize(index: int, text: str):
+        async with semaphore:
+            try:
+                return index, await tts_service.synthesize(text, speaker_name, quality), None
+            except AdmissionRejected as e:
+                return index, None, e
+            except Exception as e:
+                print(f"❌ Batch segment synthesis failed: {e}")
+                return index, None, None
+
+    tasks = []
+    try:
+        for index, text in enumerate(segments):
+            cached = await tts_service.lookup_cached(text, speaker_name, quality)
+            if cached is not None:
+                yield audio_event(index, cached)
+            else:
+                tasks.append(asyncio.create_task(synthesize(index, text)))
+
+        for next_done in asyncio.as_completed(tasks):
+            index, result, rejected = await next_done
+            if rejected is not None:
+                yield error_event(index, rejected.detail, rejected.retry_after)
+            elif result is None:
+                yield error_event(index, "Failed to generate audio")
+            else:
+                yield audio_event(index, result)
+    finally:
+        # Stop synthesizing once the consumer goes away
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    ready = [segment for segment in manifest if segment is not None and "audio_id" in segment]
+    yield {
+        "type": "manifest",
+        "segments": manifest,
+        "completed": len(ready),
+        "failed": len(segments) - len(ready),
+        "total_duration": sum(segment["duration"] or 0 for segment in ready),
+        "characters": sum(len(text) for text in segments),
+        "quality": quality,
+        "total_time": time.perf_counter() - start_time,
+    }
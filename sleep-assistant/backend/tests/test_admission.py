@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def controller(max_concurrency=1, max_queue=2, max_wait=1.0):
+    return AdmissionController("test", max_concurrency=max_concurrency, max_queue=max_queue, max_wait=max_wait)
+
+
+def test_admits_up_to_max_concurrency_without_queueing():
+    async def scenario():
+        admission = controller(max_concurrency=2)
+        first, second = await admission.acquire(), await admission.acquire()
+        assert admission.active == 2 and admission.saturated
+        first.release()
+        first.release()  # idempotent
+        assert admission.active == 1
+        second.release()
+        assert admission.active == 0 and admission.admitted == 2
+
+    asyncio.run(scenario())
+
+
+def test_waiters_are_admitted_in_fifo_order():
+    async def scenario():
+        admission = controller(max_queue=3)
+        holder = await admission.acquire()
+        order = []
+
+        async def wait(name):
+            ticket = await admission.acquire()
+            order.append(name)
+            return ticket
+
+        waiters = [asyncio.create_task(wait(name)) for name in "abc"]
+        await asyncio.sleep(0)
+        assert admission.queued == 3
+
+        holder.release()
+        for waiter in waiters:
+            (await waiter).release()
+        assert order == ["a", "b", "c"]
+        assert admission.active == 0 and admission.queued == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_shed_with_retry_after():
+    async def scenario():
+        admission = controller(max_queue=1)
+        holder = await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire()
+        assert rejected.value.status_code == 503
+        assert rejected.value.reason == "queue_full"
+        assert rejected.value.headers["Retry-After"] == str(rejected.value.retry_after)
+        assert rejected.value.retry_after >= 1
+        assert admission.rejected == 1
+
+        holder.release()
+        (await waiter).release()
+
+    asyncio.run(scenario())
+
+
+def test_wait_timeout_is_shed_and_leaves_no_waiter():
+    async def scenario():
+        admission = controller()
+        holder = await admission.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire(max_wait=0.01)
+        assert rejected.value.reason == "timeout"
+        assert admission.queued == 0
+
+        # The slot goes back to the pool rather than to the timed-out waiter
+        holder.release()
+        assert admission.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_take_a_slot():
+    async def scenario():
+        admission = controller()
+        holder = await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        holder.release()
+        assert admission.active == 0
+        async with admission.slot():
+            assert admission.active == 1
+        assert admission.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_grows_with_queue_and_hold_time():
+    async def scenario():
+        admission = controller(max_queue=10)
+        holder = await admission.acquire()
+        admission._avg_hold = 4.0
+        waiters = [asyncio.create_task(admission.acquire()) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert admission.retry_after() == 16
+
+        holder.release()
+        for waiter in waiters:
+            (await waiter).release()
+
+    asyncio.run(scenario())
@@ -0,0 +1,129 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import main
+from main import AssemblyAITokenBroker
+from shared_state import SharedState
+
+
+class Upstream:
+    """Fake AssemblyAI token endpoint handing out numbered tokens."""
+
+    def __init__(self):
+        self.calls = 0
+        self.status = 200
+        self.gate = None  # an asyncio.Event holding requests until set
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.status != 200:
+            return httpx.Response(self.status, json={"error": "unavailable"})
+        return httpx.Response(200, json={"token": f"token-{self.calls}"})
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    upstream = Upstream()
+    monkeypatch.setenv("ASSEMBLYAI_API_KEY", "test-key")
+    monkeypatch.setattr(main, "get_shared_state", lambda: None)
+    monkeypatch.setattr(main, "get_http_client",
+                        lambda name: httpx.AsyncClient(transport=httpx.MockTransport(upstream.handler)))
+    return upstream
+
+
+def age(broker, seconds_left):
+    """Pretend the held token now has seconds_left to live."""
+    broker._expires_at = main.time.monotonic() + seconds_left
+
+
+def test_concurrent_requests_share_one_fetch(upstream):
+    async def scenario():
+        broker = AssemblyAITokenBroker()
+        upstream.gate = asyncio.Event()
+        requests = [asyncio.create_task(broker.get_token()) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        upstream.gate.set()
+        return broker, await asyncio.gather(*requests)
+
+    broker, tokens = asyncio.run(scenario())
+    assert upstream.calls == 1
+    assert {token["token"] for token in tokens} == {"token-1"}
+    assert all(token["expires_in_seconds"] > broker.refresh_margin for token in tokens)
+    assert broker.stats()["tokens_served"] == 5
+
+
+def test_fresh_token_is_reused_without_upstream_call(upstream):
+    async def scenario():
+        broker = AssemblyAITokenBroker()
+        await broker.get_token()
+        return await broker.get_token()
+
+    assert asyncio.run(scenario())["token"] == "token-1"
+    assert upstream.calls == 1
+
+
+def test_token_near_refresh_margin_is_served_while_refreshing(upstream):
+    async def scenario():
+        broker = AssemblyAITokenBroker()
+        await broker.get_token()
+        age(broker, broker.refresh_margin - 10)
+        served = await broker.get_token()
+        await broker._inflight
+        return served, await broker.get_token()
+
+    served, refreshed = asyncio.run(scenario())
+    assert served["token"] == "token-1"
+    assert refreshed["token"] == "token-2"
+    assert upstream.calls == 2
+
+
+def test_expiring_token_waits_for_a_new_one(upstream):
+    async def scenario():
+        broker = AssemblyAITokenBroker()
+        await broker.get_token()
+        age(broker, broker.min_remaining - 10)
+        return await broker.get_token()
+
+    assert asyncio.run(scenario())["token"] == "token-2"
+
+
+def test_failed_refresh_falls_back_to_a_still_valid_token(upstream):
+    async def scenario():
+        broker = AssemblyAITokenBroker()
+        await broker.get_token()
+        upstream.status = 503
+        age(broker, broker.min_remaining - 10)
+        short = await broker.get_token()
+        age(broker, -1)
+        with pytest.raises(httpx.HTTPStatusError):
+            await broker.get_token()
+        return short
+
+    assert asyncio.run(scenario())["token"] == "token-1"
+
+
+def test_missing_api_key_is_a_server_error(upstream, monkeypatch):
+    monkeypatch.delenv("ASSEMBLYAI_API_KEY")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(AssemblyAITokenBroker().get_token())
+    assert error.value.status_code == 500
+    assert upstream.calls == 0
+
+
+def test_workers_adopt_a_shared_token(upstream, monkeypatch, tmp_path):
+    shared = SharedState(str(tmp_path / "shared.sqlite3"))
+    monkeypatch.setattr(main, "get_shared_state", lambda: shared)
+
+    async def scenario():
+        first = await AssemblyAITokenBroker().get_token()
+        second = await AssemblyAITokenBroker().get_token()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first["token"] == second["token"] == "token-1"
+    assert upstream.calls == 1
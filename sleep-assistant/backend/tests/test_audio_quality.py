@@ -0,0 +1,56 @@
+import pytest
+from starlette.datastructures import Headers
+
+from audio_quality import CONSTRAINED_QUALITY, DEFAULT_QUALITY, bitrate_for, negotiate_quality, parse_quality
+
+
+def negotiate(requested=None, **hints):
+    return negotiate_quality(requested, Headers({name.replace("_", "-"): value for name, value in hints.items()}))
+
+
+def test_parse_quality_accepts_tiers_and_bitrates():
+    assert parse_quality(" LOW ") == "low"
+    assert parse_quality("192k") == "high"
+    assert parse_quality("128k") is None
+    assert parse_quality("") is None
+
+
+def test_explicit_tier_wins_over_hints():
+    assert negotiate("high", Save_Data="on", ECT="2g", Sec_CH_UA_Mobile="?1") == ("high", "request")
+    assert negotiate("64k") == ("standard", "request")
+
+
+def test_unknown_tier_is_rejected():
+    with pytest.raises(ValueError, match="Unknown quality"):
+        negotiate("lossless")
+
+
+@pytest.mark.parametrize("hints, source", [
+    ({"Save_Data": "on"}, "save_data"),
+    ({"ECT": "3g"}, "ect"),
+    ({"ECT": "slow-2g"}, "ect"),
+    ({"Sec_CH_UA_Mobile": "?1"}, "mobile"),
+    ({"Save_Data": "on", "ECT": "2g", "Sec_CH_UA_Mobile": "?1"}, "save_data"),
+    ({"ECT": "2g", "Sec_CH_UA_Mobile": "?1"}, "ect"),
+])
+def test_constrained_clients_get_the_mobile_tier(hints, source):
+    assert negotiate(**hints) == (CONSTRAINED_QUALITY, source)
+
+
+@pytest.mark.parametrize("hints", [
+    {},
+    {"Save_Data": "off"},
+    {"ECT": "4g"},
+    {"Sec_CH_UA_Mobile": "?0"},
+])
+def test_everyone_else_gets_the_default_tier(hints):
+    assert negotiate(**hints) == (DEFAULT_QUALITY, "default")
+
+
+def test_client_hint_names_are_case_insensitive():
+    assert negotiate_quality(None, Headers({"SAVE-DATA": "On"})) == (CONSTRAINED_QUALITY, "save_data")
+
+
+def test_bitrate_for_falls_back_to_default_tier():
+    assert bitrate_for("low") == "32k"
+    assert bitrate_for(None) == bitrate_for(DEFAULT_QUALITY)
@@ -0,0 +1,84 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from audio_response import IMMUTABLE_CACHE_CONTROL, audio_response
+
+AUDIO_ID = "0123456789abcdef0123456789abcdef"
+ETAG = '"clip-etag"'
+CLIP = bytes(range(256)) * 4  # 1024 bytes
+
+
+@pytest.fixture(params=["memory", "disk"])
+def client(request, tmp_path):
+    path = tmp_path / "clip.mp3"
+    path.write_bytes(CLIP)
+    app = FastAPI()
+
+    @app.get("/audio")
+    async def serve(req: Request):
+        if request.param == "memory":
+            return await audio_response(req, AUDIO_ID, ETAG, data=CLIP)
+        return await audio_response(req, AUDIO_ID, ETAG, path=str(path))
+
+    return TestClient(app)
+
+
+def test_full_clip_carries_etag(client):
+    response = client.get("/audio")
+    assert response.status_code == 200
+    assert response.content == CLIP
+    assert response.headers["etag"] == ETAG
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+
+@pytest.mark.parametrize("header", [ETAG, f'"other", {ETAG}', f"W/{ETAG}", "*"])
+def test_matching_if_none_match_is_not_modified(client, header):
+    response = client.get("/audio", headers={"If-None-Match": header})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == ETAG
+
+
+def test_other_if_none_match_sends_clip(client):
+    response = client.get("/audio", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == CLIP
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-99", 0, 99),
+    ("bytes=-100", 924, 1023),
+    ("bytes=500-", 500, 1023),
+    ("bytes=1000-5000", 1000, 1023),
+    ("bytes=-5000", 0, 1023),
+])
+def test_byte_range(client, header, start, end):
+    response = client.get("/audio", headers={"Range": header})
+    assert response.status_code == 206
+    assert response.content == CLIP[start:end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(CLIP)}"
+    assert response.headers["content-length"] == str(end - start + 1)
+
+
+@pytest.mark.parametrize("header", ["bytes=0-9,20-29", "bytes=1024-", "bytes=5000-6000", "bytes=-0", "bytes=10-5"])
+def test_unsatisfiable_range(client, header):
+    response = client.get("/audio", headers={"Range": header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CLIP)}"
+
+
+def test_malformed_range_sends_clip(client):
+    response = client.get("/audio", headers={"Range": "lines=0-9"})
+    assert response.status_code == 200
+    assert response.content == CLIP
+
+
+def test_if_range_with_stale_etag_sends_clip(client):
+    response = client.get("/audio", headers={"Range": "bytes=0-99", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == CLIP
+
+    response = client.get("/audio", headers={"Range": "bytes=0-99", "If-Range": ETAG})
+    assert response.status_code == 206
@@ -0,0 +1,59 @@
+import pytest
+
+from audio_expiry import SharedAudioExpiryIndex
+from audio_store import LocalDiskAudioStore, MemoryAudioStore, TieredAudioStore
+from shared_state import SharedState
+
+CLIP = b"\xff\xfb" + b"\x00" * 62
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SharedState(str(tmp_path / "shared.sqlite3"))
+
+
+def worker(tmp_path, shared):
+    """One worker's store over the audio directory and state every worker shares; clips expire at once."""
+    return TieredAudioStore(
+        MemoryAudioStore(max_bytes=1024 * 1024, max_item_bytes=1024 * 1024),
+        LocalDiskAudioStore(str(tmp_path / "audio")),
+        expiry=SharedAudioExpiryIndex(shared, default_ttl=0, max_bytes=1024 * 1024),
+        shared=shared,
+    )
+
+
+def test_pin_is_seen_by_other_workers(tmp_path, shared):
+    pinning, other = worker(tmp_path, shared), worker(tmp_path, shared)
+    pinning.put("fallback", CLIP)
+    assert pinning.pin("fallback")
+
+    # Another worker writing the same clip must not start its expiry clock
+    other.put("fallback", CLIP)
+    assert other.is_pinned("fallback")
+    assert other.expire_due(10) == (0, 0)
+    assert not other.evict_local("fallback")
+    assert not other.delete("fallback")
+    assert other.local_path("fallback") is not None
+    assert other.stats()["pinned"] == 1
+
+
+def test_unpin_lets_clip_expire_everywhere(tmp_path, shared):
+    pinning, other = worker(tmp_path, shared), worker(tmp_path, shared)
+    pinning.put("fallback", CLIP)
+    pinning.pin("fallback")
+    pinning.unpin("fallback")
+
+    assert not other.is_pinned("fallback")
+    assert other.expire_due(10) == (1, len(CLIP))
+    assert other.local_path("fallback") is None
+
+
+def test_clip_tracked_before_pin_is_not_cleaned_up(tmp_path, shared):
+    pinning, other = worker(tmp_path, shared), worker(tmp_path, shared)
+    other.put("fallback", CLIP)
+    pinning.pin("fallback")
+    # A worker that looked the pin up just before it was written
+    other.expiry.track("fallback", len(CLIP))
+
+    assert other.expire_due(10) == (0, 0)
+    assert pinning.local_path("fallback") is not None
@@ -0,0 +1,117 @@
+import sqlite3
+
+import pytest
+
+from breathing_store import BreathingSessionStore, session_day
+
+
+def session(technique_id="box", cycles=4, seconds=64.0, date="2026-10-16T22:30:00+00:00"):
+    return {
+        "technique_id": technique_id,
+        "technique_name": technique_id.title(),
+        "cycles_completed": cycles,
+        "total_duration_seconds": seconds,
+        "session_date": date,
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BreathingSessionStore(str(tmp_path / "breathing.sqlite3"), max_batch=2)
+
+
+def test_session_day_is_utc():
+    assert session_day("2026-10-16T23:30:00-02:00", 0) == "2026-10-17"
+    assert session_day("2026-10-16", 0) == "2026-10-16"
+    assert session_day("not a date", 86400 * 2) == "1970-01-03"
+
+
+def test_rollups_match_sessions_before_and_after_flush(store):
+    store.log("alice", session("box", 4, 60.0))
+    store.log("alice", session("box", 2, 30.0))
+    store.log("alice", session("478", 3, 57.0, date="2026-10-15T10:00:00+00:00"))
+
+    before = store.summary("alice", days=3650)
+    assert store.flush() == 3
+    after = store.summary("alice", days=3650)
+    assert before == after
+
+    assert after["total_sessions"] == 3
+    assert after["total_cycles"] == 9
+    assert after["total_seconds"] == 147.0
+    box = next(t for t in after["techniques"] if t["technique_id"] == "box")
+    assert (box["sessions"], box["cycles"], box["seconds"]) == (2, 6, 90.0)
+    assert [(d["day"], d["sessions"]) for d in after["daily"]] == [("2026-10-15", 1), ("2026-10-16", 2)]
+
+
+def test_rollups_accumulate_across_flushes(store):
+    for _ in range(5):
+        store.log("alice", session(cycles=1, seconds=10.0))
+        store.flush()
+    summary = store.summary("alice", days=3650)
+    assert (summary["total_sessions"], summary["total_cycles"], summary["total_seconds"]) == (5, 5, 50.0)
+
+
+def test_clients_are_kept_apart(store):
+    store.log("alice", session(cycles=4))
+    store.flush()
+    store.log("bob", session(cycles=1))
+
+    assert [s["cycles_completed"] for s in store.recent("alice")] == [4]
+    assert [s["cycles_completed"] for s in store.recent("bob")] == [1]
+    assert store.summary("alice", days=3650)["total_cycles"] == 4
+    assert store.summary("bob", days=3650)["total_cycles"] == 1
+    assert store.summary("carol")["total_sessions"] == 0
+
+
+def test_recent_merges_buffered_sessions_in_order(store):
+    for cycles in range(1, 4):
+        store.log("alice", session(cycles=cycles))
+    store.flush()
+    store.log("alice", session(cycles=4))
+    assert [s["cycles_completed"] for s in store.recent("alice", limit=3)] == [2, 3, 4]
+
+
+def test_shed_sessions_leave_pending_totals(tmp_path):
+    store = BreathingSessionStore(str(tmp_path / "breathing.sqlite3"), max_buffer=2)
+    store.log("alice", session("box", 4, 60.0, date="2026-10-16T22:30:00+00:00"))
+    store.log("alice", session("box", 2, 30.0, date="2026-10-15T22:30:00+00:00"))
+    store.log("bob", session("box", 1, 10.0))
+
+    summary = store.summary("alice", days=3650)
+    assert (summary["total_sessions"], summary["total_cycles"], summary["total_seconds"]) == (1, 2, 30.0)
+    assert summary["techniques"][0]["last_session_date"] == "2026-10-15T22:30:00+00:00"
+    assert [day["day"] for day in summary["daily"]] == ["2026-10-15"]
+    assert store.stats()["dropped"] == 1
+
+    store.flush()
+    assert store.summary("alice", days=3650) == summary
+    assert store.summary("bob", days=3650)["total_cycles"] == 1
+
+
+def test_daily_window(store):
+    store.log("alice", session(date="2000-01-01T00:00:00+00:00"))
+    summary = store.summary("alice", days=30)
+    assert summary["total_sessions"] == 1
+    assert summary["daily"] == []
+
+
+def test_migrates_global_history(tmp_path):
+    path = str(tmp_path / "breathing.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, technique_id TEXT NOT NULL,
+            technique_name TEXT NOT NULL, cycles_completed INTEGER NOT NULL, total_duration_seconds REAL NOT NULL,
+            session_date TEXT NOT NULL, day TEXT NOT NULL, logged_at REAL NOT NULL);
+        CREATE TABLE technique_rollup (technique_id TEXT PRIMARY KEY, technique_name TEXT NOT NULL,
+            sessions INTEGER NOT NULL, cycles INTEGER NOT NULL, seconds REAL NOT NULL,
+            last_session_date TEXT NOT NULL) WITHOUT ROWID;
+        INSERT INTO sessions VALUES (NULL, 'box', 'Box', 3, 60, '2026-10-01', '2026-10-01', 0);
+    """)
+    conn.close()
+
+    store = BreathingSessionStore(path)
+    assert store.recent("alice") == []
+    store.log("alice", session())
+    store.flush()
+    assert store.summary("alice", days=3650)["total_sessions"] == 1
@@ -0,0 +1,110 @@
+import asyncio
+
+from conversation_history import ConversationHistoryManager, count_message_tokens, count_tokens
+from shared_state import SharedState
+
+SYSTEM = "You are a calm sleep assistant."
+
+
+def turns(count, words=40):
+    """Alternating user/assistant turns, each a sentence of about `words` words tagged with its index."""
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"Turn {i} says " + "sleep " * words + "now."}
+        for i in range(count)
+    ]
+
+
+class Summarizer:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, previous_summary, messages):
+        self.calls.append((previous_summary, [m["content"].split(" says")[0] for m in messages]))
+        return f"summary of {len(messages)} turns"
+
+
+def manager(summarize=None, budget=400, **options):
+    return ConversationHistoryManager(summarize or Summarizer(), prompt_token_budget=budget,
+                                      summary_token_budget=60, **options)
+
+
+def test_short_history_is_kept_verbatim():
+    history = turns(4, words=5)
+    messages, tokens = manager().build_messages(SYSTEM, history, "Goodnight")
+    assert messages == [{"role": "system", "content": SYSTEM}, *history, {"role": "user", "content": "Goodnight"}]
+    assert tokens == count_message_tokens(messages)
+
+
+def test_long_history_keeps_newest_turns_within_budget():
+    history = turns(20)
+    history_manager = manager()
+    messages, tokens = history_manager.build_messages(SYSTEM, history, "Goodnight")
+
+    assert tokens <= history_manager.prompt_token_budget
+    assert messages[1]["content"].startswith("Summary of the earlier conversation: ")
+    kept = messages[2:-1]
+    assert kept == history[-len(kept):]
+    assert 0 < len(kept) < len(history)
+    assert count_tokens(messages[1]["content"]) <= history_manager.summary_token_budget + 10
+
+
+def test_extractive_summary_without_event_loop():
+    summarize = Summarizer()
+    history_manager = manager(summarize)
+    messages, _ = history_manager.build_messages(SYSTEM, turns(20), "Goodnight")
+    assert "Turn" in messages[1]["content"]
+    assert summarize.calls == []
+    assert history_manager.summary_misses == 1
+
+
+def test_llm_summary_is_cached_by_prefix():
+    summarize = Summarizer()
+    history_manager = manager(summarize)
+    history = turns(20)
+
+    async def scenario():
+        first, _ = history_manager.build_messages(SYSTEM, history, "Goodnight")
+        await asyncio.sleep(0.01)  # let the background summary land
+        second, _ = history_manager.build_messages(SYSTEM, history, "Goodnight")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    dropped = len(history) - (len(first) - 3)
+    assert summarize.calls == [("", [f"Turn {i}" for i in range(dropped)])]
+    assert second[1]["content"] == f"Summary of the earlier conversation: summary of {dropped} turns"
+    assert (history_manager.summary_misses, history_manager.summary_hits) == (1, 1)
+
+
+def test_only_newly_dropped_turns_are_folded_in():
+    summarize = Summarizer()
+    history_manager = manager(summarize)
+    history = turns(20)
+
+    async def scenario():
+        first, _ = history_manager.build_messages(SYSTEM, history, "Goodnight")
+        await asyncio.sleep(0.01)
+        history_manager.build_messages(SYSTEM, history + turns(22)[20:], "Goodnight")
+        await asyncio.sleep(0.01)
+        return first
+
+    first = asyncio.run(scenario())
+    dropped = len(history) - (len(first) - 3)
+    previous, folded = summarize.calls[1]
+    assert previous == f"summary of {dropped} turns"
+    assert folded == [f"Turn {i}" for i in range(dropped, dropped + len(folded))]
+    assert 0 < len(folded) <= 2
+
+
+def test_summaries_are_shared_between_workers(tmp_path):
+    shared = SharedState(str(tmp_path / "shared.sqlite3"))
+    writer, reader = manager(shared=shared), manager(shared=shared)
+    history = turns(20)
+
+    async def scenario():
+        writer.build_messages(SYSTEM, history, "Goodnight")
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    messages, _ = reader.build_messages(SYSTEM, history, "Goodnight")
+    assert messages[1]["content"].endswith("turns")
+    assert reader.summary_hits == 1
@@ -0,0 +1,72 @@
+from mp3_utils import audio_frames, concat_mp3, id3v2_size, mp3_info, parse_frame_header
+
+# MPEG-1 Layer III, 64 kbps, 44.1 kHz, no padding: 208-byte frames of 1152 samples
+FRAME_LENGTH = 144 * 64000 // 44100
+
+
+def frame(fill: int = 0) -> bytes:
+    return bytes([0xFF, 0xFB, 0x50, 0x00]) + bytes([fill]) * (FRAME_LENGTH - 4)
+
+
+def info_frame(frames: int) -> bytes:
+    # Stereo MPEG-1 side info is 32 bytes; the Xing/Info tag follows it
+    body = bytearray(FRAME_LENGTH - 4)
+    body[32:36] = b"Info"
+    body[36:40] = (1).to_bytes(4, "big")  # frame count present
+    body[40:44] = frames.to_bytes(4, "big")
+    return bytes([0xFF, 0xFB, 0x50, 0x00]) + bytes(body)
+
+
+def id3v2(payload: bytes = b"\x00" * 20) -> bytes:
+    size = len(payload)
+    synchsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x04\x00\x00" + synchsafe + payload
+
+
+def test_parse_frame_header():
+    header = parse_frame_header(frame())
+    assert header["version"] == "1"
+    assert header["layer"] == 3
+    assert header["bitrate"] == 64000
+    assert header["sample_rate"] == 44100
+    assert header["samples"] == 1152
+    assert header["frame_length"] == FRAME_LENGTH
+    assert parse_frame_header(b"\x00\x00\x00\x00") is None
+
+
+def test_id3v2_size():
+    assert id3v2_size(id3v2() + frame()) == 30
+    assert id3v2_size(frame()) == 0
+
+
+def test_audio_frames_drops_tags_and_info_frame():
+    clip = id3v2() + info_frame(2) + frame(1) + frame(2)
+    assert audio_frames(clip) == frame(1) + frame(2)
+
+
+def test_concat_mp3_joins_frames_only():
+    first = id3v2() + info_frame(1) + frame(1)
+    second = info_frame(2) + frame(2) + frame(3)
+    assert concat_mp3([first, second]) == frame(1) + frame(2) + frame(3)
+
+
+def test_concat_mp3_single_clip_unchanged():
+    clip = id3v2() + frame(1)
+    assert concat_mp3([clip]) == clip
+
+
+def test_mp3_info_walks_frames():
+    info = mp3_info(frame() * 10)
+    assert info["frames"] == 10
+    assert info["sample_rate"] == 44100
+    assert abs(info["duration"] - 10 * 1152 / 44100) < 1e-9
+
+
+def test_mp3_info_uses_info_frame_count():
+    info = mp3_info(info_frame(100) + frame() * 3)
+    assert info["frames"] == 100
+    assert abs(info["duration"] - 100 * 1152 / 44100) < 1e-9
+
+
+def test_mp3_info_without_frames():
+    assert mp3_info(b"not an mp3") is None
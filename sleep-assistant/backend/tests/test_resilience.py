@@ -0,0 +1,184 @@
+import asyncio
+
+import pytest
+
+import resilience
+from admission import AdmissionRejected
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, hedged
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+
+def breaker(**options):
+    return CircuitBreaker("test", **{"min_requests": 4, "open_seconds": 10.0, "slow_seconds": 2.0, **options})
+
+
+def trip(circuit):
+    for _ in range(circuit.min_requests):
+        circuit.record(False, 0.1, error="HTTP 500")
+
+
+def test_opens_on_error_rate_and_fails_fast(clock):
+    circuit = breaker()
+    circuit.record(True, 0.1)
+    circuit.record(False, 0.1)
+    circuit.record(True, 0.1)
+    assert circuit.state == CLOSED
+    circuit.record(False, 0.1)
+    assert circuit.state == OPEN and circuit.opened == 1
+
+    clock.now += 4
+    with pytest.raises(CircuitOpen) as rejected:
+        circuit.check()
+    assert isinstance(rejected.value, AdmissionRejected)
+    assert rejected.value.status_code == 503
+    assert rejected.value.retry_after == 6
+    assert rejected.value.headers["Retry-After"] == "6"
+    assert circuit.rejected == 1
+
+
+def test_opens_on_slow_p95(clock):
+    circuit = breaker()
+    for _ in range(4):
+        circuit.record(True, 3.0)
+    assert circuit.state == OPEN
+
+
+def test_half_open_allows_one_trial_and_closes_on_fast_success(clock):
+    circuit = breaker()
+    trip(circuit)
+
+    clock.now += 10
+    circuit.check()
+    assert circuit.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        circuit.check()
+
+    circuit.record(True, 0.1)
+    assert circuit.state == CLOSED
+    assert circuit.stats()["window_requests"] == 0
+    circuit.check()
+
+
+def test_failed_trial_reopens(clock):
+    circuit = breaker()
+    trip(circuit)
+    clock.now += 10
+    circuit.check()
+    circuit.record(True, 5.0)  # answered, but too slowly
+    assert circuit.state == OPEN
+
+    with pytest.raises(CircuitOpen):
+        circuit.check()
+    clock.now += 10
+    circuit.check()
+    assert circuit.state == HALF_OPEN
+
+
+def test_calls_started_before_opening_are_ignored(clock):
+    circuit = breaker()
+    trip(circuit)
+    circuit.record(True, 0.1)
+    assert circuit.state == OPEN
+
+
+def test_auth_failures_mark_unhealthy_without_opening(clock):
+    circuit = breaker()
+    for _ in range(10):
+        circuit.record_auth_failure("HTTP 401")
+    assert circuit.state == CLOSED
+    assert circuit.last_ok is False and circuit.last_error == "HTTP 401"
+    assert circuit.auth_failed_at == clock.now
+    assert circuit.stats()["window_requests"] == 0
+
+    circuit.record(True, 0.1)
+    assert circuit.auth_failed_at is None
+
+
+def test_disabled_breaker_never_rejects(clock):
+    circuit = breaker(enabled=False)
+    trip(circuit)
+    circuit.check()
+
+
+def test_hedged_without_delay_makes_one_attempt():
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        return "ok"
+
+    assert asyncio.run(hedged("test", attempt, None)) == "ok"
+    assert len(calls) == 1
+
+
+def test_hedge_wins_and_cancels_slow_primary():
+    cancelled = []
+    started = []
+
+    async def attempt():
+        started.append(len(started))
+        try:
+            await asyncio.sleep(1.0 if len(started) == 1 else 0.0)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "hedge" if len(started) == 2 else "primary"
+
+    assert asyncio.run(hedged("test", attempt, 0.01)) == "hedge"
+    assert len(started) == 2 and cancelled == [True]
+
+
+def test_no_hedge_when_not_allowed():
+    started = []
+
+    async def attempt():
+        started.append(1)
+        await asyncio.sleep(0.02)
+        return "primary"
+
+    assert asyncio.run(hedged("test", attempt, 0.001, can_hedge=lambda: False)) == "primary"
+    assert len(started) == 1
+
+
+def test_hedged_raises_when_every_attempt_fails():
+    async def attempt():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError, match="upstream down"):
+        asyncio.run(hedged("test", attempt, 0.001))
+
+
+def test_cancelling_caller_cancels_both_attempts():
+    cancelled = []
+
+    async def attempt():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def scenario():
+        call = asyncio.create_task(hedged("test", attempt, 0.001))
+        await asyncio.sleep(0.05)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+    asyncio.run(scenario())
+    assert cancelled == [True, True]
@@ -0,0 +1,56 @@
+from routine_cache import RoutineCache, SharedRoutineCache, normalize_preferences
+from shared_state import SharedState
+
+
+def test_normalization_ignores_order_case_punctuation_and_stopwords():
+    key = normalize_preferences("Rain, forest, anxious")
+    assert key == "anxious forest rain"
+    assert normalize_preferences("anxious about rain in the forest") == key
+    assert normalize_preferences("I'm ANXIOUS; the rain... and the forest!") == key
+
+
+def test_normalization_folds_simple_plurals_and_duplicates():
+    assert normalize_preferences("waves waves wave") == "wave"
+    # Words ending in ss, us or is keep their s
+    assert normalize_preferences("stress focus") == "focus stress"
+
+
+def test_stopword_only_preferences_keep_distinct_keys():
+    assert normalize_preferences("and the") == "and the"
+    assert normalize_preferences("  The   AND ") == "the and"
+    assert normalize_preferences("?!") == "?!"
+    assert len({normalize_preferences(p) for p in ("and the", "for me", "?!", "...")}) == 4
+
+
+def test_cache_rotates_variants():
+    cache = RoutineCache(max_variants=2)
+    assert cache.get("rain") is None
+    cache.add("rain", "first")
+    assert cache.wants_variant("rain")
+    cache.add("rain", "second")
+    assert not cache.wants_variant("rain")
+    assert [cache.get("rain") for _ in range(3)] == ["first", "second", "first"]
+
+    cache.add("rain", "third")
+    assert set(cache.get("rain") for _ in range(2)) == {"second", "third"}
+
+
+def test_cache_expires_and_evicts():
+    cache = RoutineCache(ttl=0)
+    cache.add("rain", "routine")
+    assert cache.get("rain") is None
+
+    cache = RoutineCache(max_keys=2)
+    for key in ("a", "b", "c"):
+        cache.add(key, key)
+    assert cache.get("a") is None
+    assert cache.get("c") == "c"
+
+
+def test_shared_cache_is_seen_by_other_instances(tmp_path):
+    state = SharedState(str(tmp_path / "state.sqlite3"))
+    first, second = SharedRoutineCache(state, max_variants=2), SharedRoutineCache(state, max_variants=2)
+    first.add("rain", "one")
+    second.add("rain", "two")
+    assert [first.get("rain"), second.get("rain"), first.get("rain")] == ["one", "two", "one"]
+    assert not second.wants_variant("rain")
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "clip"
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        assert results == ["clip"] * 5
+        assert len(calls) == 1
+        assert flight.stats() == {"in_flight": 0, "executions": 1, "coalesced": 4}
+
+    asyncio.run(scenario())
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def work(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        assert await asyncio.gather(flight.do("a", lambda: work("a")), flight.do("b", lambda: work("b"))) == ["a", "b"]
+        assert flight.executions == 2
+
+    asyncio.run(scenario())
+
+
+def test_exception_reaches_every_waiter_and_is_not_cached():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(*(flight.do("key", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert len(calls) == 1
+        assert not flight.in_flight("key")
+
+        async def working():
+            return "clip"
+
+        assert await flight.do("key", working) == "clip"
+        assert flight.executions == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_cancel_the_work():
+    async def scenario():
+        flight = SingleFlight()
+        finished = asyncio.Event()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            finished.set()
+            return "clip"
+
+        leaving = asyncio.create_task(flight.do("key", work))
+        staying = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        assert flight.in_flight("key")
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+
+        assert await staying == "clip"
+        assert finished.is_set()
+
+    asyncio.run(scenario())
+
+
+def test_work_finishes_after_every_waiter_left():
+    async def scenario():
+        flight = SingleFlight()
+        finished = asyncio.Event()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            finished.set()
+
+        waiter = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.wait_for(finished.wait(), 1.0)
+        await asyncio.sleep(0)
+        assert not flight.in_flight("key")
+
+    asyncio.run(scenario())
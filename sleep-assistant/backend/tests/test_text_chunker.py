@@ -0,0 +1,50 @@
+from text_chunker import SentenceSegmenter, split_into_chunks, split_sentences
+
+
+def test_split_sentences_keeps_punctuation():
+    text = 'Breathe in.  Hold it!\nBreathe out? "Relax." Rest'
+    assert split_sentences(text) == ["Breathe in.", "Hold it!", "Breathe out?", '"Relax."', "Rest"]
+
+
+def test_chunks_end_on_sentence_boundaries():
+    sentence = "This is a calm sentence for sleep."
+    chunks = split_into_chunks(" ".join([sentence] * 40), max_chars=100)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert " ".join(chunks) == " ".join([sentence] * 40)
+
+
+def test_short_text_is_one_chunk():
+    assert split_into_chunks("Sleep well.", max_chars=100) == ["Sleep well."]
+    assert split_into_chunks("   ", max_chars=100) == []
+
+
+def test_oversized_sentence_splits_at_clauses_then_words():
+    clauses = ", ".join(["soft rain falling on the leaves"] * 6) + "."
+    chunks = split_into_chunks(clauses, max_chars=80)
+    assert all(len(chunk) <= 80 for chunk in chunks)
+    assert " ".join(chunks).split() == clauses.split()
+
+    words = " ".join(["drift"] * 50)
+    chunks = split_into_chunks(words, max_chars=30)
+    assert all(len(chunk) <= 30 for chunk in chunks)
+    assert " ".join(chunks) == words
+
+
+def test_overlong_word_is_hard_split():
+    chunks = split_into_chunks("a" * 25, max_chars=10)
+    assert chunks == ["a" * 10, "a" * 10, "a" * 5]
+
+
+def test_segmenter_emits_sentences_as_they_complete():
+    segmenter = SentenceSegmenter(min_chars=15)
+    assert segmenter.feed("Let's slow down together") == []
+    assert segmenter.feed(". Breathe ") == ["Let's slow down together."]
+    assert segmenter.feed("in. Now rest") == []
+    assert segmenter.flush() == ["Breathe in. Now rest"]
+    assert segmenter.flush() == []
+
+
+def test_segmenter_joins_short_fragments():
+    segmenter = SentenceSegmenter(min_chars=20)
+    assert segmenter.feed("Hi. Ok. Let's begin the exercise now. ") == ["Hi. Ok. Let's begin the exercise now."]
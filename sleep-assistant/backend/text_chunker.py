@@ -0,0 +1,115 @@
+import re
+from typing import List
+
+# Sentence ends at terminal punctuation (optionally followed by a closing quote/bracket) and whitespace;
+# the closer stays with its sentence
+_SENTENCE_BOUNDARY = re.compile(r'(?:(?<=[.!?…])|(?<=[.!?…]["\')\]]))\s+')
+# Softer boundaries used when a single sentence is longer than a chunk
+_CLAUSE_BOUNDARY = re.compile(r'(?<=[,;:])\s+')
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, keeping their terminal punctuation."""
+    text = " ".join(text.split())
+    if not text:
+        return []
+    return [s for s in _SENTENCE_BOUNDARY.split(text) if s.strip()]
+
+
+def _split_oversized(sentence: str, max_chars: int) -> List[str]:
+    """Break a sentence that does not fit in one chunk at clauses, then at words."""
+    pieces: List[str] = []
+    for clause in _CLAUSE_BOUNDARY.split(sentence):
+        if len(clause) <= max_chars:
+            pieces.append(clause)
+            continue
+        current = ""
+        for word in clause.split(" "):
+            # A single word longer than a chunk is hard-split as a last resort
+            while len(word) > max_chars:
+                if current:
+                    pieces.append(current)
+                    current = ""
+                pieces.append(word[:max_chars])
+                word = word[max_chars:]
+            candidate = f"{current} {word}" if current else word
+            if len(candidate) <= max_chars:
+                current = candidate
+            else:
+                pieces.append(current)
+                current = word
+        if current:
+            pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(text: str, max_chars: int = 1000) -> List[str]:
+    """
+    Pack sentences into chunks of at most max_chars characters.
+
+    Chunks always end on a sentence boundary unless a single sentence is
+    longer than max_chars, in which case it is split at clause and then
+    word boundaries.
+
+    Args:
+        text: The text to split
+        max_chars: Maximum length of a single chunk
+
+    Returns:
+        Ordered list of non-empty chunks
+    """
+    chunks: List[str] = []
+    current = ""
+    for sentence in split_sentences(text):
+        parts = [sentence] if len(sentence) <= max_chars else _split_oversized(sentence, max_chars)
+        for part in parts:
+            candidate = f"{current} {part}" if current else part
+            if len(candidate) <= max_chars:
+                current = candidate
+            else:
+                chunks.append(current)
+                current = part
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class SentenceSegmenter:
+    """
+    Incrementally cut streamed text into sentences.
+
+    Feed text as it arrives; complete sentences are returned as soon as the
+    whitespace after their terminal punctuation has been seen. Sentences
+    shorter than min_chars are held back and joined with the next one so
+    very short fragments don't each cost a synthesis round trip.
+    """
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self._buffer = ""
+        self._pending = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text and return any sentences it completed."""
+        self._buffer += text
+        last_end = None
+        for match in _SENTENCE_BOUNDARY.finditer(self._buffer):
+            last_end = match.end()
+        if last_end is None:
+            return []
+
+        complete, self._buffer = self._buffer[:last_end], self._buffer[last_end:]
+        sentences = []
+        for sentence in split_sentences(complete):
+            self._pending = f"{self._pending} {sentence}" if self._pending else sentence
+            if len(self._pending) >= self.min_chars:
+                sentences.append(self._pending)
+                self._pending = ""
+        return sentences
+
+    def flush(self) -> List[str]:
+        """Return whatever text remains once the stream has ended."""
+        remainder = " ".join(f"{self._pending} {self._buffer}".split())
+        self._buffer = ""
+        self._pending = ""
+        return [remainder] if remainder else []
@@ -1,11 +1,19 @@
 import os
 import time
-import tempfile
-import uuid
-import json
-import requests
-import certifi
-from typing import Optional, Dict, Any
+import asyncio
+import httpx
+from typing import Optional, Dict, Any, Iterator, AsyncIterator, List, Tuple, Union
+
+from admission import AdmissionRejected, AdmissionTicket, get_admission
+from audio_cache import TTSAudioCache
+from audio_quality import bitrate_for, parse_quality, DEFAULT_QUALITY
+from audio_store import get_audio_store
+from http_client import get_http_client
+from metrics import AUDIO_BYTES, TTS_REAL_TIME_FACTOR
+from mp3_utils import concat_mp3
+from resilience import LatencyTracker, get_breaker, hedged
+from single_flight import SingleFlight
+from text_chunker import split_into_chunks
 
 # Load environment variables if available
 try:
@@ -19,6 +27,23 @@ try:
 except Exception:
     pass
 
+# Supported Unreal Speech voices
+SUPPORTED_VOICES = {
+    "Autumn", "Melody", "Hannah", "Emily", "Ivy", "Kaitlyn", "Luna", "Willow", "Lauren", "Sierra",
+    "Noah", "Jasper", "Caleb", "Ronan", "Ethan", "Daniel", "Zane",
+    "Mei", "Lian", "Ting", "Jing",
+    "Wei", "Jian", "Hao", "Sheng",
+    "Lucía",
+    "Mateo", "Javier",
+    "Élodie",
+    "Ananya", "Priya",
+    "Arjun", "Rohan",
+    "Giulia",
+    "Luca",
+    "Camila",
+    "Thiago", "Rafael"
+}
+
 class UnrealTTSService:
     """
     Text-to-Speech service using Unreal Speech API.
@@ -29,7 +54,25 @@ class UnrealTTSService:
         self.api_key = None
         self.is_initialized = False
         self.default_voice = "Emily"  # Use Emily as requested
-        self.endpoint = "https://api.v8.unrealspeech.com/stream"
+        # Overridable so benchmarks can point at a local stand-in
+        self.base_url = os.getenv("UNREAL_SPEECH_BASE_URL", "https://api.v8.unrealspeech.com").rstrip("/")
+        self.endpoint = f"{self.base_url}/stream"
+        self.store = get_audio_store()
+        self.cache = TTSAudioCache(
+            self.store,
+            max_bytes=int(os.getenv("TTS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+        )
+        self.store.add_expiry_listener(self.cache.forget)
+        # Identical syntheses that overlap share one upstream request
+        self.inflight = SingleFlight()
+        # Unreal Speech's /stream endpoint accepts up to 1000 characters per request
+        self.max_chunk_chars = 1000
+        self.max_parallel_chunks = int(os.getenv("TTS_MAX_PARALLEL_CHUNKS", "4"))
+        # Clips are content-addressed, so a slow synthesis can safely be raced by a second one
+        self.hedge = os.getenv("TTS_HEDGE", "false").lower() in ("1", "true", "yes")
+        self.hedge_percentile = float(os.getenv("TTS_HEDGE_PERCENTILE", "0.95"))
+        self.hedge_min_delay = float(os.getenv("TTS_HEDGE_MIN_DELAY_SECONDS", "0.25"))
+        self.fetch_latency = LatencyTracker()
 
     def initialize(self) -> bool:
         """
@@ -50,13 +93,100 @@ class UnrealTTSService:
             print(f"❌ Failed to initialize Unreal Speech TTS Service: {e}")
             return False
 
-    def text_to_speech(self, text: str, speaker_name: str = "Speaker 1") -> Optional[Dict[str, Any]]:
+    def resolve_voice(self, speaker_name: Optional[str]) -> str:
+        """Map a requested speaker name onto a supported voice, falling back to the default."""
+        if speaker_name and isinstance(speaker_name, str):
+            candidate = speaker_name.strip()
+            if candidate in SUPPORTED_VOICES:
+                return candidate
+        return self.default_voice
+
+    def build_payload(self, text: str, speaker_name: Optional[str] = None,
+                      quality: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build the normalized Unreal Speech request payload for a piece of text.
+
+        The bitrate comes from the quality tier, so each tier of the same text
+        is cached and served as its own clip.
+        """
+        return {
+            "Text": TTSAudioCache.normalize_text(text),
+            "VoiceId": self.resolve_voice(speaker_name),
+            "Bitrate": bitrate_for(quality),
+            "Pitch": 1.0,
+            "Speed": 0.0,
+        }
+
+    def _build_result(self, audio_id: str, text: str, voice_id: str, quality: Optional[str],
+                      generation_time: float, cached: bool) -> Dict[str, Any]:
+        # Duration comes from the MP3 frame headers, read once when the clip was stored
+        metadata = self.store.metadata(audio_id) or {}
+        duration = metadata.get("duration")
+        real_time_factor = None
+        if not cached and duration:
+            real_time_factor = generation_time / duration
+        return {
+            "audio_path": self.store.local_path(audio_id),
+            "audio_id": audio_id,
+            "duration": duration,
+            "generation_time": generation_time,
+            "real_time_factor": real_time_factor,
+            "sample_rate": metadata.get("sample_rate"),
+            "text": text,
+            "speaker": voice_id,
+            "quality": parse_quality(quality) or DEFAULT_QUALITY,
+            "cached": cached,
+        }
+
+    def _cached_result(self, audio_id: str, text: str, voice_id: str, quality: Optional[str],
+                       record_miss: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        The result for a cached clip, or None on a miss.
+
+        A hit can evict other clips, adopt one from object storage or publish
+        metadata to shared state, all of which touch disk or SQLite, so this
+        is run in a worker thread.
+        """
+        if not self.cache.lookup(audio_id, record_miss=record_miss):
+            return None
+        return self._build_result(audio_id, text, voice_id, quality, 0.0, cached=True)
+
+    def _locate_cached(self, audio_id: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """Where a cached clip can be served from, or (None, None) on a miss. Run in a worker thread."""
+        if not self.cache.lookup(audio_id):
+            return None, None
+        return self.store.locate(audio_id)
+
+    async def lookup_cached(self, text: str, speaker_name: str = "Speaker 1",
+                            quality: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return the result for an already synthesized clip without calling Unreal Speech."""
+        if not text or not text.strip():
+            return None
+
+        payload = self.build_payload(text, speaker_name, quality)
+        audio_id = TTSAudioCache.make_key(payload)
+        return await asyncio.to_thread(self._cached_result, audio_id, text, payload["VoiceId"], quality,
+                                       record_miss=False)
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    async def text_to_speech(self, text: str, speaker_name: str = "Speaker 1",
+                             quality: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Convert text to speech using Unreal Speech.
 
+        Identical payloads are served from the content-addressed cache instead
+        of being synthesized again. Text longer than max_chunk_chars is handed
+        to synthesize_long_text rather than cut short.
+
         Args:
-            text: The text to convert to speech (up to 1000 characters recommended for stream endpoint)
-            speaker_name: Unused here; kept for API compatibility
+            text: The text to convert to speech
+            speaker_name: Voice to use if it is a supported Unreal Speech voice
+            quality: Quality tier ("low", "standard" or "high"); the default tier if None
 
         Returns:
             Dictionary with audio file path and metadata, or None if failed
@@ -70,76 +200,288 @@ class UnrealTTSService:
             return None
 
         try:
-            # Supported Unreal Speech voices
-            supported_voices = {
-                "Autumn", "Melody", "Hannah", "Emily", "Ivy", "Kaitlyn", "Luna", "Willow", "Lauren", "Sierra",
-                "Noah", "Jasper", "Caleb", "Ronan", "Ethan", "Daniel", "Zane",
-                "Mei", "Lian", "Ting", "Jing",
-                "Wei", "Jian", "Hao", "Sheng",
-                "Lucía",
-                "Mateo", "Javier",
-                "Élodie",
-                "Ananya", "Priya",
-                "Arjun", "Rohan",
-                "Giulia",
-                "Luca",
-                "Camila",
-                "Thiago", "Rafael"
-            }
-
-            voice_id = self.default_voice
-            if speaker_name and isinstance(speaker_name, str):
-                # Trim and capitalize appropriately
-                candidate = speaker_name.strip()
-                if candidate in supported_voices:
-                    voice_id = candidate
-
             # Prepare request payload
-            payload = {
-                "Text": text[:1000],
-                "VoiceId": voice_id,
-                "Bitrate": "192k",
-                "Pitch": 1.0,
-                "Speed": 0.0,
-            }
-
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
-
-            start_time = time.time()
-            resp = requests.post(self.endpoint, headers=headers, json=payload, timeout=30, verify=certifi.where())
-            resp.raise_for_status()
-            audio_bytes = resp.content
-            generation_time = time.time() - start_time
-
-            # Save MP3 to temporary file
-            audio_id = str(uuid.uuid4())
-            temp_dir = tempfile.gettempdir()
-            output_path = os.path.join(temp_dir, f"tts_{audio_id}.mp3")
-            with open(output_path, "wb") as f:
-                f.write(audio_bytes)
-
-            result = {
-                "audio_path": output_path,
-                "audio_id": audio_id,
-                "duration": None,  # Duration unknown without decoding MP3
-                "generation_time": generation_time,
-                "real_time_factor": None,
-                "sample_rate": None,
-                "text": text,
-                "speaker": self.default_voice,
-            }
-
-            print("✅ Unreal Speech audio generated successfully!")
-            print(f"   Saved to: {output_path}")
-            return result
+            payload = self.build_payload(text, speaker_name, quality)
+            if len(payload["Text"]) > self.max_chunk_chars:
+                # Too long for one request; its chunks are short enough to come back here
+                return await self.synthesize_long_text(text, speaker_name, quality)
+            audio_id = TTSAudioCache.make_key(payload)
+
+            cached = await asyncio.to_thread(self._cached_result, audio_id, text, payload["VoiceId"], quality)
+            if cached is not None:
+                return cached
+
+            generation_time = await self.inflight.do(audio_id, lambda: self._generate(audio_id, payload))
+            return await asyncio.to_thread(self._build_result, audio_id, text, payload["VoiceId"], quality,
+                                           generation_time, False)
 
+        except AdmissionRejected:
+            raise
         except Exception as e:
             print(f"❌ Failed to generate speech via Unreal Speech: {e}")
             return None
 
+    async def _generate(self, audio_id: str, payload: Dict[str, Any]) -> float:
+        """Fetch one clip from Unreal Speech and cache it. Returns the generation time; raises on failure."""
+        # A call that finished just before this one was started may already have stored the clip
+        if self.cache.contains(audio_id):
+            return 0.0
+
+        get_breaker("unreal").check()
+        start_time = time.time()
+        client = get_http_client("unreal")
+
+        async def fetch() -> bytes:
+            async with get_admission("unreal").slot():
+                attempt_start = time.perf_counter()
+                resp = await client.post(self.endpoint, headers=self._headers(), json=payload)
+            resp.raise_for_status()
+            self.fetch_latency.observe(time.perf_counter() - attempt_start)
+            return resp.content
+
+        # Hedges must not queue behind live requests for a slot
+        audio_bytes = await hedged("unreal", fetch, self._hedge_delay(),
+                                   can_hedge=lambda: not get_admission("unreal").saturated)
+        generation_time = time.time() - start_time
+        AUDIO_BYTES.inc(len(audio_bytes), direction="generated")
+
+        # Save MP3 under its content address
+        await asyncio.to_thread(self.cache.put, audio_id, audio_bytes)
+
+        await asyncio.to_thread(self._record_speed, audio_id, payload["VoiceId"], generation_time)
+        print("✅ Unreal Speech audio generated successfully!")
+        print(f"   Saved as: {audio_id}")
+        return generation_time
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds after which a synthesis is raced by a second one, or None to not hedge."""
+        if not self.hedge:
+            return None
+        percentile = self.fetch_latency.percentile(self.hedge_percentile)
+        return max(percentile, self.hedge_min_delay) if percentile is not None else None
+
+    def _record_speed(self, audio_id: str, voice_id: str, generation_time: float):
+        duration = (self.store.metadata(audio_id) or {}).get("duration")
+        if duration:
+            TTS_REAL_TIME_FACTOR.observe(generation_time / duration, voice=voice_id)
+
+    async def synthesize(self, text: str, speaker_name: str = "Speaker 1",
+                         quality: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Synthesize text of any supported length.
+
+        Text that fits in one Unreal Speech request goes through text_to_speech;
+        longer text is handed to synthesize_long_text.
+        """
+        if len(TTSAudioCache.normalize_text(text)) <= self.max_chunk_chars:
+            return await self.text_to_speech(text, speaker_name, quality)
+        return await self.synthesize_long_text(text, speaker_name, quality)
+
+    async def synthesize_long_text(self, text: str, speaker_name: str = "Speaker 1",
+                                   quality: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Synthesize long text as one clip by fanning out sentence-aligned chunks.
+
+        Chunks are synthesized concurrently (at most max_parallel_chunks at a
+        time) and individually cached, then their MP3 frames are joined in
+        order into a single clip cached under the address of the full text.
+        Wall time is roughly that of the slowest chunk rather than their sum.
+
+        Args:
+            text: The text to convert to speech
+            speaker_name: Voice to use if it is a supported Unreal Speech voice
+            quality: Quality tier for the chunks and the stitched clip
+
+        Returns:
+            Dictionary with audio file path and metadata, or None if any chunk failed
+        """
+        if not self.is_initialized:
+            print("❌ TTS Service not initialized. Call initialize() first.")
+            return None
+
+        payload = self.build_payload(text, speaker_name, quality)
+        audio_id = TTSAudioCache.make_key(payload)
+        cached = await asyncio.to_thread(self._cached_result, audio_id, text, payload["VoiceId"], quality)
+        if cached is not None:
+            return cached
+
+        try:
+            generation_time = await self.inflight.do(
+                audio_id, lambda: self._generate_long(audio_id, payload, quality)
+            )
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            print(f"❌ Long-text synthesis failed: {e}")
+            return None
+        return await asyncio.to_thread(self._build_result, audio_id, text, payload["VoiceId"], quality,
+                                       generation_time, False)
+
+    async def _generate_long(self, audio_id: str, payload: Dict[str, Any], quality: Optional[str]) -> float:
+        """Synthesize and stitch the chunks of a long text. Returns the generation time; raises on failure."""
+        if self.cache.contains(audio_id):
+            return 0.0
+
+        chunks = split_into_chunks(payload["Text"], self.max_chunk_chars)
+        semaphore = asyncio.Semaphore(self.max_parallel_chunks)
+
+        async def synthesize_chunk(chunk: str) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                # Chunks share the tier so their frames can be joined into one stream
+                return await self.text_to_speech(chunk, payload["VoiceId"], quality)
+
+        start_time = time.time()
+        results = await asyncio.gather(*(synthesize_chunk(chunk) for chunk in chunks))
+        if any(result is None for result in results):
+            raise RuntimeError(f"{sum(r is None for r in results)} of {len(chunks)} chunks failed")
+
+        def stitch():
+            clips = []
+            for result in results:
+                clip = self.store.get(result["audio_id"])
+                if clip is None:
+                    raise RuntimeError(f"chunk {result['audio_id']} was evicted before stitching")
+                clips.append(clip)
+            self.cache.put(audio_id, concat_mp3(clips))
+
+        await asyncio.to_thread(stitch)
+        generation_time = time.time() - start_time
+        await asyncio.to_thread(self._record_speed, audio_id, payload["VoiceId"], generation_time)
+
+        print(f"✅ Stitched {len(chunks)} chunks into one clip in {generation_time:.2f}s")
+        return generation_time
+
+    async def open_stream(self, text: str, speaker_name: str = "Speaker 1", save: bool = True,
+                          quality: Optional[str] = None) -> Optional[Tuple[str, bool, Union[Iterator[bytes], AsyncIterator[bytes]]]]:
+        """
+        Start a synthesis and return an iterator over the MP3 bytes as Unreal Speech sends them.
+
+        The upstream request is made before returning so HTTP errors surface
+        before any response has been started. Text longer than one Unreal
+        Speech request is split into sentence-aligned chunks that are streamed
+        one after another. When save is True the bytes are teed into a buffer
+        and the finished clip is added to the cache for replay via /api/audio.
+        Cached clips are streamed straight from the audio store.
+
+        Args:
+            text: The text to convert to speech
+            speaker_name: Voice to use if it is a supported Unreal Speech voice
+            save: Whether to keep a copy of the streamed audio for later replay
+            quality: Quality tier ("low", "standard" or "high"); the default tier if None
+
+        Returns:
+            Tuple of (audio_id, cached, chunk iterator), or None if failed
+        """
+        if not self.is_initialized:
+            print("❌ TTS Service not initialized. Call initialize() first.")
+            return None
+
+        if not text or not text.strip():
+            print("❌ Empty text provided to TTS")
+            return None
+
+        payload = self.build_payload(text, speaker_name, quality)
+        audio_id = TTSAudioCache.make_key(payload)
+
+        data, path = await asyncio.to_thread(self._locate_cached, audio_id)
+        if data is not None:
+            return audio_id, True, iter([data])
+        if path is not None:
+            return audio_id, True, self._iter_file(path)
+
+        if len(payload["Text"]) > self.max_chunk_chars:
+            chunks = split_into_chunks(payload["Text"], self.max_chunk_chars)
+            generate = lambda: self._generate_long(audio_id, payload, quality)
+        else:
+            chunks = [payload["Text"]]
+            generate = lambda: self._generate(audio_id, payload)
+
+        if self.inflight.in_flight(audio_id):
+            # The same clip is already being synthesized; wait for it instead of a second upstream call
+            try:
+                await self.inflight.do(audio_id, generate)
+                data, path = await asyncio.to_thread(self.store.locate, audio_id)
+                if data is not None:
+                    return audio_id, True, iter([data])
+                if path is not None:
+                    return audio_id, True, self._iter_file(path)
+            except Exception as e:
+                print(f"⚠️ Shared synthesis failed, streaming directly: {e}")
+
+        chunk_payloads = [{**payload, "Text": chunk} for chunk in chunks]
+        # Rejection surfaces as a 503 before any bytes are sent
+        try:
+            resp, ticket = await self._open_upstream(chunk_payloads[0])
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            print(f"❌ Failed to start Unreal Speech stream: {e}")
+            return None
+
+        return audio_id, False, self._iter_upstream(resp, ticket, chunk_payloads[1:], audio_id, save)
+
+    async def _open_upstream(self, payload: Dict[str, Any]) -> Tuple[httpx.Response, AdmissionTicket]:
+        """Open a streaming Unreal Speech request. The admission slot is held until the response is closed."""
+        get_breaker("unreal").check()
+        ticket = await get_admission("unreal").acquire()
+        resp = None
+        try:
+            client = get_http_client("unreal")
+            request = client.build_request("POST", self.endpoint, headers=self._headers(), json=payload)
+            resp = await client.send(request, stream=True)
+            resp.raise_for_status()
+        except BaseException:
+            ticket.release()
+            if resp is not None:
+                await resp.aclose()
+            raise
+        return resp, ticket
+
+    def _iter_file(self, path: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def _iter_upstream(self, resp: httpx.Response, ticket: AdmissionTicket,
+                             remaining: List[Dict[str, Any]], audio_id: str, save: bool) -> AsyncIterator[bytes]:
+        """
+        Forward upstream chunks as they arrive, teeing them to a buffer if requested.
+
+        Each payload in remaining is opened once the previous response has
+        been fully forwarded, so at most one admission slot is held at a time.
+        """
+        clips = [] if save else None
+        start_time = time.time()
+        for index in range(len(remaining) + 1):
+            if index > 0:
+                try:
+                    resp, ticket = await self._open_upstream(remaining[index - 1])
+                except Exception as e:
+                    print(f"❌ Unreal Speech stream failed at chunk {index + 1} of {len(remaining) + 1}: {e}")
+                    raise
+            tee = []
+            try:
+                async for chunk in resp.aiter_bytes():
+                    if not chunk:
+                        continue
+                    AUDIO_BYTES.inc(len(chunk), direction="generated")
+                    if clips is not None:
+                        tee.append(chunk)
+                    yield chunk
+            finally:
+                ticket.release()
+                await resp.aclose()
+            if clips is not None:
+                clips.append(b"".join(tee))
+
+        # Only reached when every chunk completed; a client that went away or an
+        # upstream failure mid-stream never leaves a truncated clip in the cache
+        if clips is not None:
+            await asyncio.to_thread(lambda: self.cache.put(audio_id, concat_mp3(clips)))
+            print(f"✅ Unreal Speech audio streamed in {time.time() - start_time:.2f}s and saved as {audio_id}")
 
 # Global TTS service instance
 _tts_service = None
@@ -0,0 +1,173 @@
+import asyncio
+import os
+import time
+from typing import Optional, Dict, Any, Callable, Awaitable
+
+from http_client import get_http_client
+from metrics import REGISTRY
+from resilience import CLOSED, CircuitBreaker, get_breaker
+
+HEALTH_PROBES = REGISTRY.counter(
+    "sleep_assistant_health_probes_total",
+    "Active upstream health probes, sent only while an upstream has no real traffic, by result.",
+    ("upstream", "result"),
+)
+
+Probe = Callable[[], Awaitable[None]]
+
+
+def http_probe(upstream: str, url: str, headers: Optional[Dict[str, str]] = None,
+               ok_below: int = 500) -> Probe:
+    """
+    A probe that GETs url through the upstream's pooled client.
+
+    The request is tagged so the circuit breaker doesn't count it as
+    traffic. Any status below ok_below counts as healthy: 500 for a bare
+    reachability check, 400 when the request is authenticated and a
+    rejected key should count as a failure.
+    """
+    async def probe():
+        response = await get_http_client(upstream).get(url, headers=headers, extensions={"health_probe": True})
+        if response.status_code >= ok_below:
+            raise RuntimeError(f"HTTP {response.status_code}")
+    return probe
+
+
+class UpstreamHealth:
+    """
+    Health of one upstream, judged from the calls real requests already make.
+
+    Every call is recorded by the upstream's circuit breaker, so the current
+    status comes from its rolling error rate, p95 latency and state at no
+    extra cost. Only when no real call has been made for idle_seconds, and
+    the last probe is more than probe_interval old, is a cheap probe sent,
+    in the background. Reads never wait on the network: they return the
+    latest evidence, where it came from and how old it is.
+    """
+
+    def __init__(self, name: str, breaker: CircuitBreaker, idle_seconds: float = 60.0,
+                 probe_interval: float = 300.0, probe_timeout: float = 10.0):
+        self.name = name
+        self.breaker = breaker
+        self.idle_seconds = idle_seconds
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.probe: Optional[Probe] = None
+        self._probe_task: Optional[asyncio.Task] = None
+        self._probe_started: Optional[float] = None
+        self.probed_at: Optional[float] = None
+        self.probe_ok: Optional[bool] = None
+        self.probe_error: Optional[str] = None
+        self.probe_seconds: Optional[float] = None
+        self.probes = 0
+
+    def set_probe(self, probe: Optional[Probe]):
+        self.probe = probe
+
+    def _idle(self, now: float) -> bool:
+        last_call = self.breaker.last_call_at
+        return last_call is None or now - last_call >= self.idle_seconds
+
+    def refresh(self) -> bool:
+        """
+        Start a background probe if the upstream is idle and the last probe is stale.
+
+        Returns:
+            True if a probe was started
+        """
+        if self.probe is None or (self._probe_task is not None and not self._probe_task.done()):
+            return False
+        now = time.monotonic()
+        if not self._idle(now):
+            return False
+        if self._probe_started is not None and now - self._probe_started < self.probe_interval:
+            return False
+        self._probe_started = now
+        self._probe_task = asyncio.create_task(self._run_probe())
+        return True
+
+    async def _run_probe(self):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.probe(), self.probe_timeout)
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e) or type(e).__name__
+        self.probe_seconds = time.perf_counter() - start
+        self.probed_at = time.monotonic()
+        self.probe_ok = ok
+        self.probe_error = error
+        self.probes += 1
+        HEALTH_PROBES.inc(upstream=self.name, result="ok" if ok else "error")
+        if not ok:
+            print(f"⚠️ {self.name} health probe failed: {error}")
+
+    def status(self) -> Dict[str, Any]:
+        """
+        The current health from cached evidence, starting a probe if it is stale.
+
+        status is "healthy", "degraded" (errors or slow responses, but the
+        circuit is closed), "error" or "unknown" (no traffic or probe yet).
+        source says whether it comes from real traffic, a probe or the open
+        circuit breaker, and age_seconds how old that evidence is.
+        """
+        self.refresh()
+        now = time.monotonic()
+        circuit = self.breaker.stats()
+        last_call = self.breaker.last_call_at
+
+        if self.breaker.state != CLOSED:
+            status, source, observed_at = "error", "circuit", last_call
+            error = self.breaker.last_error
+        elif last_call is not None and (self.probed_at is None or last_call >= self.probed_at):
+            source, observed_at = "traffic", last_call
+            if self.breaker.auth_failed_at is not None:
+                # Rejected credentials fail every call without ever tripping the breaker
+                status = "error"
+            elif circuit["window_requests"] == 0:
+                # Older than the breaker's window: all we know is how the last call went
+                status = "healthy" if self.breaker.last_ok else "error"
+            elif circuit["error_rate"] > 0 or (circuit["p95_seconds"] or 0) >= self.breaker.slow_seconds / 2:
+                status = "degraded"
+            else:
+                status = "healthy"
+            error = None if status == "healthy" else self.breaker.last_error
+        elif self.probed_at is not None:
+            status, source, observed_at = ("healthy" if self.probe_ok else "error"), "probe", self.probed_at
+            error = self.probe_error
+        else:
+            status, source, observed_at, error = "unknown", None, None, None
+
+        return {
+            "status": status,
+            "source": source,
+            "age_seconds": round(now - observed_at, 1) if observed_at is not None else None,
+            "error": error,
+            "circuit": circuit["state"],
+            "window_requests": circuit["window_requests"],
+            "error_rate": circuit["error_rate"],
+            "p95_seconds": circuit["p95_seconds"],
+            "probing": self._probe_task is not None and not self._probe_task.done(),
+            "probes": self.probes,
+        }
+
+
+def _health(name: str) -> UpstreamHealth:
+    return UpstreamHealth(
+        name,
+        get_breaker(name),
+        idle_seconds=float(os.getenv("HEALTH_IDLE_SECONDS", "60")),
+        probe_interval=float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "300")),
+    )
+
+
+# One health model per upstream, fed by its circuit breaker
+_health_models: Dict[str, UpstreamHealth] = {name: _health(name) for name in ("unreal", "openai", "assemblyai")}
+
+def get_upstream_health(name: str) -> UpstreamHealth:
+    """Get the health model for an upstream ("unreal", "openai" or "assemblyai")."""
+    return _health_models[name]
+
+def upstream_health() -> Dict[str, Dict[str, Any]]:
+    """Cached health of every upstream; never waits on the network."""
+    return {name: health.status() for name, health in _health_models.items()}
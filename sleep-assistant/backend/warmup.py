@@ -0,0 +1,71 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List
+
+# How much work to do before reporting ready:
+#   off          - initialize services only
+#   connections  - also open pooled connections (DNS, TCP, TLS) to every upstream
+#   full         - also synthesize the WARMUP_TTS_PHRASES clips into the cache
+WARMUP_MODES = ("off", "connections", "full")
+
+
+def warmup_mode() -> str:
+    mode = os.getenv("STARTUP_WARMUP", "connections").lower()
+    return mode if mode in WARMUP_MODES else "connections"
+
+
+def warm_phrases() -> List[str]:
+    """Phrases to pre-synthesize in full mode, separated by "|" in WARMUP_TTS_PHRASES."""
+    return [phrase.strip() for phrase in os.getenv("WARMUP_TTS_PHRASES", "").split("|") if phrase.strip()]
+
+
+class StartupReport:
+    """
+    Timings of each startup phase and whether the app is ready for traffic.
+
+    Liveness only needs the process to answer; readiness waits until every
+    phase has finished, so a load balancer doesn't send the first real
+    request to a worker that still has to import SDKs or open connections.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.mode = warmup_mode()
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.ready = False
+        self.ready_after: Optional[float] = None
+
+    def record(self, name: str, seconds: float, ok: bool = True, detail: Optional[str] = None):
+        phase = {"seconds": round(seconds, 3), "ok": ok}
+        if detail:
+            phase["detail"] = detail
+        self.phases[name] = phase
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block as a startup phase; a failure is recorded and re-raised."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(name, time.perf_counter() - start, ok=False, detail=str(e))
+            raise
+        self.record(name, time.perf_counter() - start)
+
+    def mark_ready(self):
+        self.ready = True
+        self.ready_after = time.monotonic() - self.started
+        print(f"✅ Ready for traffic after {self.ready_after:.2f}s ({self.mode} warmup)")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "warmup_mode": self.mode,
+            "ready_after_seconds": round(self.ready_after, 3) if self.ready_after is not None else None,
+            "uptime_seconds": round(time.monotonic() - self.started, 3),
+            "phases": self.phases,
+        }
+
+
+STARTUP = StartupReport()
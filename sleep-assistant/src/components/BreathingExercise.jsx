@@ -1,6 +1,7 @@
 import { useMemo, useState, useEffect, useRef } from 'react'
 import { Play, Pause, RotateCcw, Wind, Heart, Zap, Settings, Volume2, VolumeX, Waves, Moon, Sun } from 'lucide-react'
 import { getApiBaseUrl } from '../services/apiBaseUrl'
+import { getClientId } from '../services/clientId'
 import './BreathingExercise.css'
 
 const BreathingExercise = () => {
@@ -26,7 +27,7 @@ const BreathingExercise = () => {
   const loadRecentSessions = async () => {
     try {
       const baseURL = getApiBaseUrl()
-      const response = await fetch(`${baseURL}/api/breathing-sessions`)
+      const response = await fetch(`${baseURL}/api/breathing-sessions?client_id=${encodeURIComponent(getClientId())}`)
       const data = await response.json()
       if (data.success) {
         setRecentSessions(data.sessions || [])
@@ -45,6 +46,7 @@ const BreathingExercise = () => {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
+          client_id: getClientId(),
           technique_id: technique.id,
           technique_name: technique.name,
           cycles_completed: cycles,
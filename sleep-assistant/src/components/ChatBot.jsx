@@ -38,23 +38,35 @@ const ChatBot = () => {
 
   // Fetch AssemblyAI token on mount
   useEffect(() => {
+    let timer = null
+    let cancelled = false
+
     const fetchToken = async () => {
+      let refreshInMs = 60 * 1000
       try {
         const baseURL = getApiBaseUrl()
         const response = await fetch(`${baseURL}/api/assemblyai/token`)
         const data = await response.json()
         if (data.token) {
           setAssemblyToken(data.token)
+          // Tokens are shared by the backend, so refresh a minute before this one expires
+          if (data.expires_in_seconds) {
+            refreshInMs = Math.max(30, data.expires_in_seconds - 60) * 1000
+          }
         }
       } catch (error) {
         console.error('Error fetching AssemblyAI token:', error)
       }
+      if (!cancelled) {
+        timer = setTimeout(fetchToken, refreshInMs)
+      }
     }
     fetchToken()
     
-    // Refresh token every 9 minutes (token expires in 10 mins)
-    const interval = setInterval(fetchToken, 9 * 60 * 1000)
-    return () => clearInterval(interval)
+    return () => {
+      cancelled = true
+      clearTimeout(timer)
+    }
   }, [])
 
   useEffect(() => {
@@ -134,7 +134,8 @@ Rest well tonight. You deserve peaceful, restorative sleep.`
       
       if (response.ok) {
         const health = await response.json()
-        return health.status === 'healthy'
+        // Cached on the backend: "degraded" still answers, "unknown" just hasn't been checked yet
+        return ['healthy', 'degraded', 'unknown'].includes(health.status)
       } else {
         console.warn('OpenAI backend responded but not OK:', response.status)
         return false
@@ -200,67 +200,14 @@ class TTSService {
   }
 
   /**
-   * Split long text into chunks for TTS
-   */
-  splitTextIntoChunks(text, maxLength = 1800) {
-    if (text.length <= maxLength) {
-      return [text]
-    }
-
-    const chunks = []
-    const sentences = text.split(/[.!?]+/).filter(s => s.trim().length > 0)
-    let currentChunk = ''
-
-    for (const sentence of sentences) {
-      const trimmedSentence = sentence.trim()
-      if (!trimmedSentence) continue
-
-      const potentialChunk = currentChunk + (currentChunk ? '. ' : '') + trimmedSentence
-
-      if (potentialChunk.length <= maxLength) {
-        currentChunk = potentialChunk
-      } else {
-        if (currentChunk) {
-          chunks.push(currentChunk + '.')
-          currentChunk = trimmedSentence
-        } else {
-          // Single sentence is too long, split by words
-          const words = trimmedSentence.split(' ')
-          let wordChunk = ''
-          for (const word of words) {
-            if ((wordChunk + ' ' + word).length <= maxLength) {
-              wordChunk += (wordChunk ? ' ' : '') + word
-            } else {
-              if (wordChunk) chunks.push(wordChunk)
-              wordChunk = word
-            }
-          }
-          if (wordChunk) currentChunk = wordChunk
-        }
-      }
-    }
-
-    if (currentChunk) {
-      chunks.push(currentChunk + '.')
-    }
-
-    return chunks
-  }
-
-  /**
-   * Convert text to speech with streaming for real-time playback
+   * Convert text to speech and play it
    */
   async speakText(text, speakerName = 'Speaker 1', onEnd = null, onError = null) {
     try {
-      // For any text longer than 1000 chars, use streaming approach
-      if (text.length > 1000) {
-        return await this.streamingTTS(text, speakerName, onEnd, onError)
-      } else {
-        // Short text - process normally
-        const result = await this.textToSpeech(text, speakerName)
-        await this.playAudio(result.audioUrl, onEnd, onError)
-        return result
-      }
+      // The backend chunks long text itself and returns one stitched clip
+      const result = await this.textToSpeech(text, speakerName)
+      await this.playAudio(result.audioUrl, onEnd, onError)
+      return result
     } catch (error) {
       console.error('🔴 Speak text error:', error)
       if (onError) onError(error)
@@ -268,124 +215,6 @@ class TTSService {
     }
   }
 
-  /**
-   * Streaming TTS for real-time playback of long text
-   */
-  async streamingTTS(text, speakerName, onEnd, onError) {
-    try {
-      // Split into smaller, optimal chunks for faster processing
-      const chunks = this.splitTextIntoChunks(text, 800) // Smaller chunks for faster TTS
-      
-      let hasStartedPlaying = false
-      const audioQueue = Array.from({ length: chunks.length })
-      
-      const concurrency = 2
-      let nextIndex = 0
-
-      const worker = async () => {
-        while (nextIndex < chunks.length) {
-          const index = nextIndex
-          nextIndex += 1
-          const chunk = chunks[index]
-          try {
-            const result = await this.textToSpeech(chunk, speakerName)
-            audioQueue[index] = {
-              audioUrl: result.audioUrl,
-              audioId: result.audioId,
-              index,
-              ready: true
-            }
-
-            if (!hasStartedPlaying && index === 0) {
-              hasStartedPlaying = true
-              this.playStreamingQueue(audioQueue, chunks.length, onEnd, onError)
-            }
-          } catch (error) {
-            console.error(`Chunk ${index + 1} failed:`, error)
-            audioQueue[index] = { error, index, ready: false }
-            if (index === 0) {
-              throw error
-            }
-          }
-        }
-      }
-
-      const workers = Array.from({ length: concurrency }, () => worker())
-      await Promise.all(workers)
-
-      if (!hasStartedPlaying && audioQueue[0] && audioQueue[0].ready) {
-        hasStartedPlaying = true
-        this.playStreamingQueue(audioQueue, chunks.length, onEnd, onError)
-      }
-      
-      return { 
-        streaming: true, 
-        chunkCount: chunks.length,
-        totalLength: text.length
-      }
-      
-    } catch (error) {
-      console.error('Streaming TTS error:', error)
-      if (onError) onError(error)
-      throw error
-    }
-  }
-
-  /**
-   * Play streaming audio queue in order
-   */
-  async playStreamingQueue(audioQueue, totalChunks, onEnd, onError) {
-    let currentIndex = 0
-    
-    const playNext = () => {
-      // Find next ready chunk
-      while (currentIndex < totalChunks) {
-        const chunk = audioQueue[currentIndex]
-        
-        if (chunk && chunk.ready && chunk.audioUrl) {
-          console.log(`🔊 Playing streaming chunk ${currentIndex + 1}/${totalChunks}`)
-          
-          const isLast = currentIndex === totalChunks - 1
-          this.playAudio(
-            chunk.audioUrl,
-            () => {
-              // Clean up this chunk
-              if (chunk.audioId) {
-                this.deleteAudio(chunk.audioId)
-              }
-              
-              currentIndex++
-              
-              if (isLast) {
-                if (onEnd) onEnd()
-              } else {
-                // Play next chunk
-                setTimeout(playNext, 100) // Small gap between chunks
-              }
-            },
-            (error) => {
-              console.error(`Streaming playback error on chunk ${currentIndex + 1}:`, error)
-              currentIndex++
-              if (onError) onError(error)
-              // Continue with next chunk
-              setTimeout(playNext, 100)
-            }
-          )
-          break
-        } else if (chunk && chunk.error) {
-          // Skip failed chunks
-          currentIndex++
-        } else {
-          // Wait for chunk to be ready
-          setTimeout(playNext, 200)
-          break
-        }
-      }
-    }
-    
-    playNext()
-  }
-
   /**
    * Convert text to speech and add to queue
    */
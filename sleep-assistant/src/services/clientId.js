@@ -0,0 +1,24 @@
+const STORAGE_KEY = 'sleepAssistantClientId'
+
+function generateClientId() {
+  if (typeof crypto !== 'undefined' && typeof crypto.randomUUID === 'function') {
+    return crypto.randomUUID()
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`
+}
+
+// Anonymous id for this browser, so per-user data like breathing history stays separate
+export function getClientId() {
+  try {
+    let clientId = localStorage.getItem(STORAGE_KEY)
+    if (!clientId) {
+      clientId = generateClientId()
+      localStorage.setItem(STORAGE_KEY, clientId)
+    }
+    return clientId
+  } catch {
+    // Storage blocked (private mode); keep one id for this page load
+    if (!getClientId.fallback) getClientId.fallback = generateClientId()
+    return getClientId.fallback
+  }
+}